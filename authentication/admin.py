@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.utils.translation import ugettext_lazy as _
 
+from reviews_api.admin import EstimatedCountPaginator
+
 from .models import User
 
 
@@ -20,8 +22,11 @@ class UserAdmin(DjangoUserAdmin):
         }),
     )
     list_display = ('email', 'first_name', 'last_name', 'is_staff')
-    search_fields = ('email', 'first_name', 'last_name')
+    # email prefix, UPPER(email) LIKE 'TERM%' is backed by authentication_user_upper_email_idx on Postgres
+    search_fields = ('^email',)
     ordering = ('email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,61 @@
+import jwt
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import ugettext as _
+
+from rest_framework import exceptions
+
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+from rest_framework_jwt.settings import api_settings
+
+from .cache import get_token_payload, get_user_snapshot, set_token_payload, set_user_snapshot
+
+jwt_decode_handler = api_settings.JWT_DECODE_HANDLER
+jwt_get_username_from_payload = api_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    JSON Web Token authentication that caches the verified payload of each
+    token, until it expires, and a snapshot of the user it identifies, until
+    the user is saved or deleted. Repeated requests with the same token are
+    authenticated without decoding it again or querying the user table.
+    """
+
+    def authenticate(self, request):
+        jwt_value = self.get_jwt_value(request)
+        if jwt_value is None:
+            return None
+
+        payload = get_token_payload(jwt_value)
+        if payload is None:
+            payload = self.decode(jwt_value)
+            set_token_payload(jwt_value, payload)
+
+        return (self.authenticate_credentials(payload), jwt_value)
+
+    def decode(self, jwt_value):
+        try:
+            return jwt_decode_handler(jwt_value)
+        except jwt.ExpiredSignature:
+            raise exceptions.AuthenticationFailed(_('Signature has expired.'))
+        except jwt.DecodeError:
+            raise exceptions.AuthenticationFailed(_('Error decoding signature.'))
+        except jwt.InvalidTokenError:
+            raise exceptions.AuthenticationFailed()
+
+    def authenticate_credentials(self, payload):
+        user_id = payload.get('user_id')
+        snapshot = get_user_snapshot(user_id) if user_id is not None else None
+        if snapshot is None:
+            user = super().authenticate_credentials(payload)
+            set_user_snapshot(user)
+            return user
+
+        User = get_user_model()
+        # the token must still match the user, as the lookup by username would
+        if snapshot[User.USERNAME_FIELD] != jwt_get_username_from_payload(payload):
+            raise exceptions.AuthenticationFailed(_('Invalid signature.'))
+        if not snapshot['is_active']:
+            raise exceptions.AuthenticationFailed(_('User account is disabled.'))
+        return User.from_db(User.objects.db, list(snapshot), list(snapshot.values()))
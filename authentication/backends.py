@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import get_password_hasher
+
+
+class PooledPasswordBackend(ModelBackend):
+    """
+    ModelBackend that checks passwords holding one of the host's password
+    hashing slots.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        hasher = get_password_hasher()
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown users take as long to reject as wrong passwords
+            hasher.make_password(password)
+            return None
+
+        valid, must_update = hasher.check_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hasher.make_password(password)
+            user.save(update_fields=['password'])
+        return user
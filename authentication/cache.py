@@ -0,0 +1,60 @@
+from hashlib import sha256
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from reviews_api.caches import is_process_local
+
+TOKEN_PAYLOAD_KEY = 'auth:token:{}'
+USER_SNAPSHOT_KEY = 'auth:user:{}'
+
+# the password hash is left out of the snapshot, it is loaded on access
+SNAPSHOT_EXCLUDE = ('password',)
+
+
+def auth_cache():
+    return caches[settings.AUTH_USER_CACHE]
+
+
+def get_token_payload(token):
+    return auth_cache().get(_token_key(token))
+
+
+def set_token_payload(token, payload):
+    """Cache a verified payload until the token expires."""
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    if 'exp' in payload:
+        timeout = min(timeout, int(payload['exp'] - time()))
+    if timeout > 0:
+        auth_cache().set(_token_key(token), payload, timeout)
+
+
+def snapshots_enabled():
+    # a user deactivated through another process must be dropped from the cache of every process
+    return not is_process_local(settings.AUTH_USER_CACHE)
+
+
+def get_user_snapshot(user_id):
+    if not snapshots_enabled():
+        return None
+    return auth_cache().get(USER_SNAPSHOT_KEY.format(user_id))
+
+
+def set_user_snapshot(user):
+    if not snapshots_enabled():
+        return
+    fields = [field for field in type(user)._meta.concrete_fields if field.attname not in SNAPSHOT_EXCLUDE]
+    snapshot = {field.attname: getattr(user, field.attname) for field in fields}
+    # add, so a request that read the row before a concurrent save doesn't overwrite the invalidation
+    auth_cache().add(USER_SNAPSHOT_KEY.format(user.pk), snapshot, settings.AUTH_USER_CACHE_TIMEOUT)
+
+
+def invalidate_user_snapshot(user_id):
+    auth_cache().delete(USER_SNAPSHOT_KEY.format(user_id))
+
+
+def _token_key(token):
+    if isinstance(token, str):
+        token = token.encode()
+    return TOKEN_PAYLOAD_KEY.format(sha256(token).hexdigest())
@@ -0,0 +1,98 @@
+"""
+Password hashing limited to a number of concurrent hashes per host.
+
+Hashing a password takes the hasher's full work factor of CPU time. Every
+hash holds one of PASSWORD_HASHING_SLOTS slots, file locks shared by all the
+processes of the host, so a sign-up or login spike takes at most that many
+CPUs from the rest of the API, whatever the number of server workers. A hash
+that waits PASSWORD_HASHING_WAIT seconds without getting a slot fails fast
+with a 503 instead of adding to the backlog.
+"""
+import fcntl
+import os
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+SLOT_FILE = 'reviews-api-password-hashing-{}.lock'
+
+
+class PasswordHashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many sign-ins and logins in progress, try again later.')
+    default_code = 'password_hashing_unavailable'
+
+
+class PasswordHashingSlots:
+    """
+    Runs `make_password` and `check_password` holding an exclusive lock on one
+    of `slots` files in `directory`, waiting up to `wait` seconds for one to
+    be free. The lock is released when its file is closed, also when the
+    process dies. With no slots the calls aren't limited.
+    """
+
+    poll_interval = 0.01
+
+    def __init__(self, slots, directory, wait):
+        self.slots = slots
+        self.directory = directory
+        self.wait = wait
+
+    def make_password(self, password):
+        with self.slot():
+            return hashers.make_password(password)
+
+    def check_password(self, password, encoded):
+        """Return whether the password matches and whether it must be rehashed."""
+        rehash = []
+        with self.slot():
+            valid = hashers.check_password(password, encoded, setter=rehash.append)
+        return valid, bool(rehash)
+
+    @contextmanager
+    def slot(self):
+        if not self.slots:
+            yield
+            return
+        descriptor = self._acquire()
+        try:
+            yield
+        finally:
+            os.close(descriptor)
+
+    def _acquire(self):
+        deadline = monotonic() + self.wait
+        while True:
+            for index in range(self.slots):
+                path = os.path.join(self.directory, SLOT_FILE.format(index))
+                descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(descriptor)
+                else:
+                    return descriptor
+            if monotonic() >= deadline:
+                raise PasswordHashingUnavailable()
+            sleep(self.poll_interval)
+
+
+_password_hasher = None
+_password_hasher_lock = Lock()
+
+
+def get_password_hasher():
+    global _password_hasher
+    with _password_hasher_lock:
+        if _password_hasher is None:
+            _password_hasher = PasswordHashingSlots(settings.PASSWORD_HASHING_SLOTS,
+                                                    settings.PASSWORD_HASHING_LOCK_DIR,
+                                                    settings.PASSWORD_HASHING_WAIT)
+        return _password_hasher
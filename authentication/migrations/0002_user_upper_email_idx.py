@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# case insensitive email prefix searches of the admin, Postgres only
+CREATE_INDEX = (
+    'CREATE INDEX authentication_user_upper_email_idx '
+    'ON authentication_user (UPPER(email::text) text_pattern_ops)'
+)
+DROP_INDEX = 'DROP INDEX IF EXISTS authentication_user_upper_email_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -3,10 +3,12 @@ import django.contrib.auth.password_validation as validators
 
 from rest_framework import serializers
 
+from authentication.hashing import get_password_hasher
 from authentication.models import User
+from reviews_api.metrics import SerializationMetricsMixin
 
 
-class UserSignInSerializer(serializers.ModelSerializer):
+class UserSignInSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
     password = serializers.CharField(style={'input_type': 'password'}, write_only=True)
     confirm_password = serializers.CharField(style={'input_type': 'password'}, write_only=True)
 
@@ -24,11 +26,9 @@ class UserSignInSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        password = validated_data.pop('password')
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        # hashed before the insert, so the user is created with one write
+        validated_data['password'] = get_password_hasher().make_password(validated_data['password'])
+        return User.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
         raise Exception(_('You can\'t edit a user here!'))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user_snapshot
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user_snapshot(instance.pk)
+    # again once committed, in case a request cached the row before the commit
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.pk))
@@ -1,11 +1,26 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from threading import Timer
+from time import monotonic
+from unittest import mock
+
 import pytest
 
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
 from django.utils.translation import ugettext_lazy as _
 
 from parameterized import parameterized
 
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.reverse import reverse_lazy
+from rest_framework.test import APIRequestFactory
+
+from rest_framework_jwt.settings import api_settings
 
+from authentication.authentication import CachedJSONWebTokenAuthentication
+from authentication.hashing import PasswordHashingSlots, PasswordHashingUnavailable
 from authentication.models import User
 from authentication.serializers import UserSignInSerializer
 from reviews_api.tests import BaseTestCase
@@ -207,6 +222,13 @@ class SignInTestCase(BaseTestCase):
         response = self.client.post(self.URL, data)
         self.assertFalse(401 is response.status_code)
 
+    def test_user_is_created_with_one_write(self):
+        data = self._default_signin_data()
+        # the unique email check and the insert
+        with self.assertNumQueries(2):
+            self.client.post(self.URL, data)
+        self.assertTrue(User.objects.get(email=data['email']).check_password(data['password']))
+
 
 class UserObjectManagerTestCase(BaseTestCase):
 
@@ -241,3 +263,180 @@ class UserObjectManagerTestCase(BaseTestCase):
         with pytest.raises(Exception) as excinfo:
             User.objects.create_superuser('test@test.com', '1234qwert', is_superuser=False)
             self.assertEquals(excinfo.msg, _('Superuser must have is_superuser=True.'))
+
+
+@mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+class CachedJSONWebTokenAuthenticationTestCase(BaseTestCase):
+
+    def _token(self, user, **payload):
+        payload = dict(api_settings.JWT_PAYLOAD_HANDLER(user), **payload)
+        return api_settings.JWT_ENCODE_HANDLER(payload)
+
+    def _authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='JWT {}'.format(token))
+        return CachedJSONWebTokenAuthentication().authenticate(request)
+
+    def test_second_request_with_the_same_token_doesnt_query_the_user(self):
+        token = self._token(self.auth_user)
+        with self.assertNumQueries(1):
+            self._authenticate(token)
+        with self.assertNumQueries(0):
+            user, _token = self._authenticate(token)
+        self.assertEquals(self.auth_user.pk, user.pk)
+        self.assertEquals(self.auth_user.email, user.email)
+        self.assertEquals(self.auth_user.first_name, user.first_name)
+        self.assertTrue(user.is_authenticated)
+
+    def test_other_tokens_of_a_cached_user_dont_query_the_user(self):
+        self._authenticate(self._token(self.auth_user))
+        with self.assertNumQueries(0):
+            self._authenticate(self._token(self.auth_user, orig_iat=1))
+
+    def test_saving_the_user_refreshes_the_cached_user(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        self.auth_user.first_name = 'Renamed'
+        self.auth_user.save()
+        with self.assertNumQueries(1):
+            user, _token = self._authenticate(token)
+        self.assertEquals('Renamed', user.first_name)
+
+    def test_deactivated_user_is_rejected(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        self.auth_user.is_active = False
+        self.auth_user.save()
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(token)
+        # also when the deactivated user is the cached one
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_deleted_user_is_rejected(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        self.auth_user.delete()
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(token)
+
+    @override_settings(AUTH_USER_CACHE='default')
+    def test_user_is_read_every_time_with_a_process_local_cache(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        # deactivated by another process, whose invalidation this process doesn't see
+        User.objects.filter(pk=self.auth_user.pk).update(is_active=False)
+        with self.assertNumQueries(1):
+            with pytest.raises(AuthenticationFailed):
+                self._authenticate(token)
+
+    def test_token_of_a_previous_email_is_rejected(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        self.auth_user.email = 'changed@test.com'
+        self.auth_user.save()
+        self._authenticate(self._token(self.auth_user))
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_password_hash_is_not_cached(self):
+        token = self._token(self.auth_user)
+        self._authenticate(token)
+        user, _token = self._authenticate(token)
+        with self.assertNumQueries(1):
+            self.assertEquals(self.auth_user.password, user.password)
+
+    def test_expired_token_is_rejected(self):
+        token = self._token(self.auth_user, exp=datetime.utcnow() - timedelta(seconds=1))
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(token)
+
+    def test_invalid_token_is_rejected(self):
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(self._token(self.auth_user) + 'x')
+
+    def test_review_list_is_authenticated_with_the_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='JWT {}'.format(self._token(self.auth_user)))
+        self.assertEquals(200, self.client.get(reverse_lazy('reviews')).status_code)
+        with self.assertNumQueries(1):
+            self.assertEquals(200, self.client.get(reverse_lazy('reviews'), {'page_size': 10}).status_code)
+
+
+class PasswordHashingTestCase(BaseTestCase):
+    LOGIN_URL = reverse_lazy('user_login')
+    SIGN_IN_URL = reverse_lazy('user_sign_in')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.hasher = PasswordHashingSlots(1, directory.name, wait=0)
+        # another process of the host, flock locks of separate opens exclude each other
+        self.other_process = PasswordHashingSlots(1, directory.name, wait=0)
+
+    def test_hashing_holds_a_slot(self):
+        encoded = self.hasher.make_password('1234qwert')
+        self.assertEquals((True, False), self.hasher.check_password('1234qwert', encoded))
+        self.assertEquals((False, False), self.hasher.check_password('incorrect', encoded))
+        # released after each hash
+        with self.other_process.slot():
+            pass
+
+    def test_hashing_waits_for_a_slot_to_be_freed(self):
+        self.hasher.wait = 5
+        descriptor = self.other_process._acquire()
+        Timer(0.1, os.close, [descriptor]).start()
+        self.assertTrue(self.hasher.make_password('1234qwert'))
+
+    def test_hashing_gives_up_after_the_wait(self):
+        self.hasher.wait = 0.1
+        with self.other_process.slot():
+            started = monotonic()
+            with pytest.raises(PasswordHashingUnavailable):
+                self.hasher.make_password('1234qwert')
+        self.assertGreaterEqual(monotonic() - started, 0.1)
+
+    def test_busy_slots_return_503_on_login(self):
+        User.objects.create_user('test@test.com', '1234qwert')
+        with mock.patch('authentication.backends.get_password_hasher', lambda: self.hasher):
+            with self.other_process.slot():
+                response = self.client.post(self.LOGIN_URL, {'email': 'test@test.com', 'password': '1234qwert'})
+            self.assertEquals(503, response.status_code)
+            response = self.client.post(self.LOGIN_URL, {'email': 'test@test.com', 'password': '1234qwert'})
+            self.assertEquals(200, response.status_code)
+
+    def test_busy_slots_return_503_on_sign_in(self):
+        password = self.faker.password()
+        data = {'email': 'test@test.com', 'first_name': 'Test', 'password': password, 'confirm_password': password}
+        with mock.patch('authentication.serializers.get_password_hasher', lambda: self.hasher):
+            with self.other_process.slot():
+                response = self.client.post(self.SIGN_IN_URL, data)
+        self.assertEquals(503, response.status_code)
+        self.assertFalse(User.objects.filter(email='test@test.com').exists())
+
+    def test_login_rehashes_password_of_outdated_hasher(self):
+        user = User.objects.create_user('test@test.com')
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            user.password = make_password('1234qwert')
+        user.save()
+        response = self.client.post(self.LOGIN_URL, {'email': 'test@test.com', 'password': '1234qwert'})
+        self.assertEquals(200, response.status_code)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_login_of_inactive_user_fails(self):
+        User.objects.create_user('test@test.com', '1234qwert', is_active=False)
+        response = self.client.post(self.LOGIN_URL, {'email': 'test@test.com', 'password': '1234qwert'})
+        self.assertEquals(400, response.status_code)
+
+
+class UserAdminTestCase(BaseTestCase):
+
+    def test_search_by_email_prefix(self):
+        admin = self._user_recipe.make(email='admin@example.com', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        user = self._user_recipe.make(email='Zxq.maria@example.com')
+        # a prefix no generated email has
+        response = self.client.get(reverse_lazy('admin:authentication_user_changelist'), {'q': 'zxq.'})
+        self.assertEquals([user], list(response.context['cl'].result_list))
+        response = self.client.get(reverse_lazy('admin:authentication_user_changelist'), {'q': 'example.com'})
+        self.assertEquals([], list(response.context['cl'].result_list))
@@ -0,0 +1,92 @@
+"""
+Benchmark the API in-process against a throwaway database.
+
+    python -m benchmarks --users 100 --companies 500 --reviews 50000 \
+        --requests 5000 --mix review_get=80,review_post=15,login=4,sign_in=1 \
+        --output benchmark.json
+
+The database is created from the settings in DJANGO_SETTINGS_MODULE (the
+test settings by default) the same way the test runner does, and destroyed
+at the end. Results are written as JSON so runs can be compared over time.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from time import perf_counter
+
+
+def parse_args(argv):
+    from .workload import DEFAULT_MIX, parse_mix
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--companies', type=int, default=500)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100, help='requests run before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weights of sign_in, login, review_post and review_get')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    return parser.parse_args(argv)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reviews_api.settings.test')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+
+    from .seed import seed
+    from .workload import Workload
+
+    args = parse_args(argv)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        started = perf_counter()
+        emails = seed(args.users, args.companies, args.reviews, seed=args.seed)
+        seed_seconds = perf_counter() - started
+
+        application = get_wsgi_application()
+        Workload(application, emails, args.mix, seed=args.seed + 1).run(args.warmup)
+        results = Workload(application, emails, args.mix, seed=args.seed + 2).run(args.requests)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    results['meta'] = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'settings': os.environ['DJANGO_SETTINGS_MODULE'],
+        'database': settings.DATABASES['default']['ENGINE'],
+        'dataset': {'users': args.users, 'companies': args.companies, 'reviews': args.reviews},
+        'seed_seconds': round(seed_seconds, 2),
+        'mix': args.mix,
+        'seed': args.seed,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+
+    for operation, summary in sorted(results['operations'].items()) + [('total', results['total'])]:
+        print('{:<12} {requests:>7} req {requests_per_second:>9} req/s  p50 {p50_ms} ms  p95 {p95_ms} ms  '
+              'p99 {p99_ms} ms  {queries_per_request} queries/req'.format(operation, **summary))
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
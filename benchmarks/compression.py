@@ -0,0 +1,151 @@
+"""
+Benchmark the compression of review summaries on a seeded dataset.
+
+    python -m benchmarks.compression --reviews 50000 --output compression.json
+
+Seeds a throwaway database like `python -m benchmarks`, then measures the
+size of the review table and how fast reviews are read, once with the
+summaries compressed as the application writes them and once with all of
+them rewritten uncompressed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from time import perf_counter
+
+POSTGRES_TABLE_SIZE = """
+    SELECT pg_total_relation_size(%s::regclass) + coalesce(sum(pg_total_relation_size(inhrelid)), 0)
+    FROM pg_inherits WHERE inhparent = %s::regclass
+"""
+
+SQLITE_TABLE_SIZE = "SELECT sum(pgsize) FROM dbstat WHERE name = %s"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compression', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--companies', type=int, default=500)
+    parser.add_argument('--reviews', type=int, default=20000)
+    parser.add_argument('--passes', type=int, default=3, help='full reads of the table measured')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='compression.json')
+    return parser.parse_args(argv)
+
+
+def vacuum(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('VACUUM FULL ANALYZE review_review')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+
+
+def table_size(connection, table='review_review'):
+    """Bytes of the table with its indexes, None when the backend can't tell."""
+    if connection.vendor == 'postgresql':
+        sql, params = POSTGRES_TABLE_SIZE, [table, table]
+    elif connection.vendor == 'sqlite':
+        sql, params = SQLITE_TABLE_SIZE, [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+    except Exception:
+        # SQLite built without the dbstat table
+        return None
+
+
+def rewrite_summaries(connection, encode, batch_size=2000):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT id, summary FROM review_review')
+        rows = cursor.fetchall()
+        params = [(encode(summary), pk) for pk, summary in rows]
+        for start in range(0, len(params), batch_size):
+            cursor.executemany('UPDATE review_review SET summary = %s WHERE id = %s', params[start:start + batch_size])
+
+
+def measure(connection, passes):
+    from review.fields import is_compressed
+    from review.models import Review
+
+    vacuum(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT summary FROM review_review')
+        stored = [row[0] for row in cursor.fetchall()]
+
+    reads = {}
+    for name, read in (
+        ('summaries', lambda: Review.objects.values_list('summary', flat=True).iterator()),
+        ('reviews', lambda: Review.objects.all().iterator()),
+    ):
+        timings = []
+        for _ in range(passes):
+            started = perf_counter()
+            rows = sum(1 for _ in read())
+            timings.append(perf_counter() - started)
+        reads[name] = {'rows': rows, 'rows_per_second': round(rows / min(timings), 1)}
+
+    return {
+        'table_bytes': table_size(connection),
+        'summary_bytes': sum(len(summary.encode('utf-8')) for summary in stored),
+        'compressed_summaries': sum(1 for summary in stored if is_compressed(summary)),
+        'reads': reads,
+    }
+
+
+def main(argv=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reviews_api.settings.test')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+
+    from review.fields import decompress
+
+    from . import __main__ as benchmarks
+    from .seed import seed
+
+    args = parse_args(argv)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(args.users, args.companies, args.reviews, seed=args.seed)
+        results = {'compressed': measure(connection, args.passes)}
+        rewrite_summaries(connection, decompress)
+        results['uncompressed'] = measure(connection, args.passes)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    results['meta'] = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': benchmarks.git_revision(),
+        'python': platform.python_version(),
+        'settings': os.environ['DJANGO_SETTINGS_MODULE'],
+        'database': settings.DATABASES['default']['ENGINE'],
+        'dataset': {'users': args.users, 'companies': args.companies, 'reviews': args.reviews},
+        'passes': args.passes,
+        'seed': args.seed,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+
+    for state in ('compressed', 'uncompressed'):
+        result = results[state]
+        print('{:<13} table {table_bytes} bytes  summaries {summary_bytes} bytes ({compressed_summaries} compressed)  '
+              '{summaries} summaries/s  {reviews} reviews/s'.format(
+                  state,
+                  summaries=result['reads']['summaries']['rows_per_second'],
+                  reviews=result['reads']['reviews']['rows_per_second'],
+                  **result
+              ))
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
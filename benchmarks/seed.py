@@ -0,0 +1,72 @@
+"""
+Seeds a benchmark dataset with a realistic skew: a few users write most of
+the reviews and a few companies receive most of them.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+
+from authentication.models import User
+from review.models import Company, CompanyStats, Review
+
+PASSWORD = 'bench-password-1234'
+
+WORDS = (
+    'good bad great terrible service food coffee price staff delivery fast slow friendly rude clean '
+    'place product quality support order refund recommend never again always wait time value'
+).split()
+
+
+def zipf_weights(size, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, size + 1)]
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed(users, companies, reviews, seed=0, batch_size=2000):
+    """Create the dataset and return the emails of the users."""
+    rng = random.Random(seed)
+    # hashing is the slow part of creating users, all of them share one password
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        User(email='bench{}@example.com'.format(i), first_name='Bench', last_name=str(i), password=password)
+        for i in range(users)
+    )
+    Company.objects.bulk_create(
+        Company(name='Company {}'.format(i), company_id=i, website='https://company{}.example.com'.format(i))
+        for i in range(companies)
+    )
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    company_ids = list(Company.objects.order_by('id').values_list('id', flat=True))
+    user_weights = zipf_weights(len(user_ids))
+    company_weights = zipf_weights(len(company_ids))
+
+    today = date.today()
+    for start in range(0, reviews, batch_size):
+        size = min(batch_size, reviews - start)
+        batch = [
+            Review(
+                rating=rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 2, 4, 6))[0],
+                title=sentence(rng, 5)[:64],
+                summary=sentence(rng, rng.randint(10, 300)),
+                ip_address='10.0.{}.{}'.format(rng.randint(0, 255), rng.randint(1, 254)),
+                company_id=company_id,
+                reviewer_id=reviewer_id,
+            )
+            for reviewer_id, company_id in zip(
+                rng.choices(user_ids, weights=user_weights, k=size),
+                rng.choices(company_ids, weights=company_weights, k=size),
+            )
+        ]
+        Review.objects.bulk_create(batch)
+
+    # bulk_create sets submission_date to today, spread it over the last two years, oldest ids first
+    first_id = Review.objects.order_by('id').values_list('id', flat=True).first() or 0
+    for days in range(0, 730, 30):
+        last_id = first_id + reviews * (730 - days) // 730
+        Review.objects.filter(id__lte=last_id).update(submission_date=today - timedelta(days=days))
+    CompanyStats.objects.rebuild()
+    return list(User.objects.order_by('id').values_list('email', flat=True))
@@ -0,0 +1,161 @@
+"""
+Replays a mix of requests against the WSGI application in-process and
+collects latency and query counts per operation.
+"""
+import json
+import random
+from io import BytesIO
+from time import perf_counter
+from wsgiref.util import setup_testing_defaults
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework_jwt.settings import api_settings
+
+from authentication.models import User
+
+from .seed import PASSWORD, sentence
+
+DEFAULT_MIX = {'sign_in': 1, 'login': 4, 'review_post': 15, 'review_get': 80}
+
+
+def parse_mix(value):
+    """Parse a mix like 'review_get=80,review_post=20' into a dict of weights."""
+    mix = {}
+    for item in value.split(','):
+        operation, weight = item.split('=')
+        if operation not in DEFAULT_MIX:
+            raise ValueError('Unknown operation {}'.format(operation))
+        mix[operation] = float(weight)
+    return mix
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Workload:
+
+    def __init__(self, application, emails, mix=None, seed=0):
+        self.application = application
+        self.emails = emails
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+        self.tokens = {}
+        self.signed_in = 0
+        # pages each user has seen, so GETs also follow next links
+        self.next_pages = {}
+
+    def run(self, requests):
+        operations = list(self.mix)
+        weights = [self.mix[operation] for operation in operations]
+        samples = {operation: [] for operation in operations}
+        started = perf_counter()
+        for operation in self.rng.choices(operations, weights=weights, k=requests):
+            samples[operation].append(getattr(self, operation)())
+        elapsed = perf_counter() - started
+        return self.report(samples, elapsed)
+
+    def sign_in(self):
+        self.signed_in += 1
+        return self.request('POST', '/auth/sign-in', {
+            'email': 'new{}-{}@example.com'.format(self.signed_in, self.rng.random()),
+            'first_name': 'New',
+            'password': PASSWORD,
+            'confirm_password': PASSWORD,
+        })
+
+    def login(self):
+        return self.request('POST', '/auth/login', {'email': self.rng.choice(self.emails), 'password': PASSWORD})
+
+    def review_post(self):
+        return self.request('POST', '/review/reviews', {
+            'rating': self.rng.randint(1, 5),
+            'title': sentence(self.rng, 5)[:64],
+            'summary': sentence(self.rng, self.rng.randint(10, 300)),
+            'company': {
+                'name': 'Company {}'.format(self.rng.randint(0, 99)),
+                'company_id': self.rng.randint(0, 99),
+            },
+        }, email=self.rng.choice(self.emails))
+
+    def review_get(self):
+        email = self.rng.choice(self.emails)
+        path = self.next_pages.pop(email, None) or '/review/reviews'
+        sample, body = self.request('GET', path, email=email, return_body=True)
+        if body and self.rng.random() < 0.3:
+            next_page = json.loads(body.decode()).get('next')
+            if next_page:
+                self.next_pages[email] = next_page.split('://localhost', 1)[-1]
+        return sample
+
+    def request(self, method, path, data=None, email=None, return_body=False):
+        path, _, query_string = path.partition('?')
+        body = json.dumps(data).encode() if data is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': 'localhost',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        if email is not None:
+            environ['HTTP_AUTHORIZATION'] = 'JWT {}'.format(self.token(email))
+        setup_testing_defaults(environ)
+
+        status = []
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            chunks = self.application(environ, lambda code, headers, exc_info=None: status.append(code))
+            content = b''.join(chunks)
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            latency = perf_counter() - started
+        sample = (latency, len(queries), int(status[0].split()[0]) < 400)
+        return (sample, content) if return_body else sample
+
+    def token(self, email):
+        # called before the timer starts, so token creation is not measured
+        if email not in self.tokens:
+            user = User.objects.get(email=email)
+            payload = api_settings.JWT_PAYLOAD_HANDLER(user)
+            self.tokens[email] = api_settings.JWT_ENCODE_HANDLER(payload)
+        return self.tokens[email]
+
+    def report(self, samples, elapsed):
+        operations = {}
+        all_latencies, all_queries = [], []
+        for operation, operation_samples in samples.items():
+            latencies = [sample[0] for sample in operation_samples]
+            queries = [sample[1] for sample in operation_samples]
+            all_latencies += latencies
+            all_queries += queries
+            operations[operation] = summarize(latencies, queries, elapsed)
+            operations[operation]['errors'] = sum(1 for sample in operation_samples if not sample[2])
+        return {
+            'operations': operations,
+            'total': summarize(all_latencies, all_queries, elapsed),
+        }
+
+
+def summarize(latencies, queries, elapsed):
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
@@ -1,6 +1,47 @@
 from django.contrib import admin
+from django.db.models import Q
+
+from reviews_api.admin import EstimatedCountPaginator
 
 from .models import Review, Company
+from .search import filter_by_search, parse_id
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'rating', 'company', 'reviewer', 'submission_date')
+    list_select_related = ('company', 'reviewer')
+    autocomplete_fields = ('company', 'reviewer')
+    # searched with the full-text index, or by id, in get_search_results
+    search_fields = ('title', 'summary')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if parse_id(search_term) is not None:
+            return queryset.filter(pk=parse_id(search_term)), False
+        return filter_by_search(queryset, search_term), False
+
+
+@admin.register(Company)
+class CompanyAdmin(admin.ModelAdmin):
+    list_display = ('company_id', 'name', 'website')
+    # searched by company_id or name prefix, in get_search_results
+    search_fields = ('company_id', 'name')
+    ordering = ('company_id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-admin.site.register(Review)
-admin.site.register(Company)
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # UPPER(name) LIKE 'TERM%', backed by review_company_upper_name_idx on Postgres
+        matches = Q(name__istartswith=search_term)
+        if parse_id(search_term) is not None:
+            matches |= Q(company_id=parse_id(search_term))
+        return queryset.filter(matches), False
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ReviewConfig(AppConfig):
     name = 'review'
+
+    def ready(self):
+        from reviews_api import caches  # noqa: F401
+
+        from . import signals  # noqa: F401
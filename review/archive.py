@@ -0,0 +1,78 @@
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .cache import bump_review_list_version
+from .models import ArchivedReview, Review, ReviewTombstone
+from .partitions import is_partitioned, partitions_before
+
+COLUMNS = ('id', 'rating', 'title', 'summary', 'ip_address', 'submission_date', 'company_id', 'reviewer_id')
+ARCHIVE_BATCH_SIZE = 10000
+
+
+def archive_reviews(before, using='default', batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move the reviews submitted before the given date to the archive table, in
+    a transaction per range of `batch_size` ids, and return how many were
+    moved. On a partitioned table the partitions left empty are dropped.
+
+    The rows are moved with SQL, without signals, so the company stats still
+    count the archived reviews. Tombstones are written for them, as for
+    deleted reviews.
+    """
+    connection = connections[using]
+    reviews = Review.objects.using(using).filter(submission_date__lt=before).order_by('id')
+    archived, last_id = 0, 0
+    while True:
+        with transaction.atomic(using=using):
+            # locked, so an update made while the batch is copied isn't lost with the delete
+            ids = list(reviews.filter(id__gt=last_id).select_for_update().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            archived += _archive_range(connection, ids[0], ids[-1], before)
+        last_id = ids[-1]
+
+    if is_partitioned(connection):
+        qn = connection.ops.quote_name
+        for partition in partitions_before(connection, before):
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                # not empty when older reviews were imported meanwhile, the next run archives them
+                cursor.execute('SELECT 1 FROM {} LIMIT 1'.format(qn(partition)))
+                if cursor.fetchone() is None:
+                    cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+                        qn(Review._meta.db_table), qn(partition)
+                    ))
+                    cursor.execute('DROP TABLE {}'.format(qn(partition)))
+    return archived
+
+
+def _archive_range(connection, first, last, before):
+    """Move the reviews with ids from `first` through `last` submitted before `before`."""
+    using = connection.alias
+    qn = connection.ops.quote_name
+    where = '{} BETWEEN %s AND %s AND {} < %s'.format(qn('id'), qn('submission_date'))
+    params = [first, last, before]
+    columns = ', '.join(qn(column) for column in COLUMNS)
+    reviewer_ids = list(
+        Review.objects.using(using).filter(id__range=(first, last), submission_date__lt=before)
+        .order_by().values_list('reviewer_id', flat=True).distinct()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO {archive} ({columns}) SELECT {columns} FROM {table} WHERE {where}'.format(
+            archive=qn(ArchivedReview._meta.db_table), table=qn(Review._meta.db_table),
+            columns=columns, where=where,
+        ), params)
+        archived = cursor.rowcount
+        # the list doesn't show archived reviews, clients syncing it must drop them too
+        cursor.execute(
+            'INSERT INTO {tombstone} ({review_id}, {reviewer_id}, {deleted_at}) '
+            'SELECT {id}, {reviewer_id}, %s FROM {table} WHERE {where}'.format(
+                tombstone=qn(ReviewTombstone._meta.db_table), table=qn(Review._meta.db_table),
+                review_id=qn('review_id'), reviewer_id=qn('reviewer_id'), deleted_at=qn('deleted_at'),
+                id=qn('id'), where=where,
+            ), [timezone.now()] + params
+        )
+        cursor.execute('DELETE FROM {} WHERE {}'.format(qn(Review._meta.db_table), where), params)
+
+    for reviewer_id in reviewer_ids:
+        transaction.on_commit(lambda reviewer_id=reviewer_id: bump_review_list_version(reviewer_id), using=using)
+    return archived
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class CompanyCache:
+    """
+    Bounded, thread-safe LRU of company_id to the pk, name and website of the
+    company row, so reviews for known companies with unchanged details don't
+    need to query the company table.
+
+    The cache is local to the process: entries expire after `ttl` seconds to
+    bound how stale they can get when another process edits a company, and
+    the pk of an entry is only used once the row is known to still exist.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._company_ids = {}
+        self._lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, company_id, **fields):
+        """
+        Return the cached column values of the company if the given fields
+        match the cached ones, None otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is not None and entry[0] < monotonic():
+                self._remove(company_id)
+                entry = None
+            if entry is None or any(entry[2].get(field) != value for field, value in fields.items()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(company_id)
+            self.hits += 1
+            return dict(entry[2], id=entry[1], company_id=company_id)
+
+    def set(self, company):
+        with self._lock:
+            self._remove(company.company_id)
+            # the pk may be cached under a previous company_id
+            self._remove(self._company_ids.get(company.pk))
+            fields = {'name': company.name, 'website': company.website}
+            self._entries[company.company_id] = (monotonic() + self.ttl, company.pk, fields)
+            self._company_ids[company.pk] = company.company_id
+            while len(self._entries) > self.maxsize:
+                company_id, (_expires, pk, _fields) = self._entries.popitem(last=False)
+                del self._company_ids[pk]
+                self.evictions += 1
+
+    def invalidate(self, company):
+        with self._lock:
+            self._remove(company.company_id)
+            self._remove(self._company_ids.get(company.pk))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._company_ids.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def _remove(self, company_id):
+        entry = self._entries.pop(company_id, None)
+        if entry is not None:
+            self._company_ids.pop(entry[1], None)
+
+
+company_cache = CompanyCache(
+    maxsize=settings.REVIEW_COMPANY_CACHE_SIZE,
+    ttl=settings.REVIEW_COMPANY_CACHE_TTL
+)
+
+
+REVIEW_LIST_VERSION_KEY = 'review-list:version:{}'
+COMPANIES_VERSION_KEY = 'review-list:companies-version'
+COMPANY_VERSION_KEY = 'review-list:company-version:{}'
+REVIEW_LIST_PAGE_KEY = 'review-list:page:{}'
+REVIEW_LIST_BODY_KEY = 'review-list:body:{}'
+
+
+def review_list_cache():
+    return caches[settings.REVIEW_LIST_CACHE]
+
+
+def get_review_list_version(user_id):
+    """
+    Return a token that changes on every write to the reviews listed for the
+    user, but not to their companies, and the timestamp of the last change.
+    """
+    key = REVIEW_LIST_VERSION_KEY.format(user_id)
+    return _get_versions([key])[key]
+
+
+def get_companies_version():
+    """Return a token that changes on every creation, update or deletion of a company."""
+    return _get_versions([COMPANIES_VERSION_KEY])[COMPANIES_VERSION_KEY][0]
+
+
+def get_company_versions(pks):
+    """
+    Return the companies version and the versions of the given companies,
+    which change on every update or deletion of the company, with one read.
+    """
+    keys = [COMPANY_VERSION_KEY.format(pk) for pk in pks]
+    versions = _get_versions([COMPANIES_VERSION_KEY] + keys)
+    return versions[COMPANIES_VERSION_KEY][0], [versions[key] for key in keys]
+
+
+def get_review_list_page(page):
+    """Return the pks of the companies listed in a rendered review list page, None if unknown."""
+    return review_list_cache().get(REVIEW_LIST_PAGE_KEY.format(page))
+
+
+def set_review_list_page(page, company_pks):
+    review_list_cache().set(REVIEW_LIST_PAGE_KEY.format(page), company_pks, settings.REVIEW_LIST_CACHE_TIMEOUT)
+
+
+def _get_versions(keys):
+    cache = review_list_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key) or version
+            versions[key] = version
+    return versions
+
+
+def bump_review_list_version(user_id):
+    review_list_cache().set(REVIEW_LIST_VERSION_KEY.format(user_id), _new_version(), None)
+
+
+def bump_companies_version():
+    review_list_cache().set(COMPANIES_VERSION_KEY, _new_version(), None)
+
+
+def bump_company_versions(pks):
+    versions = {COMPANY_VERSION_KEY.format(pk): _new_version() for pk in pks}
+    versions[COMPANIES_VERSION_KEY] = _new_version()
+    review_list_cache().set_many(versions, None)
+
+
+def _new_version():
+    # random tokens, so a version dropped by the cache can't come back with an old value
+    return uuid4().hex, int(time())
@@ -0,0 +1,163 @@
+"""
+Export of the reviews, joined with their company, for analytics.
+
+The table is walked in ranges of ids, each written to its own part file by
+one worker, so ranges can be exported by several processes at once. A range
+is read in keyset batches of `batch_size` rows, which bounds the memory of
+a worker whatever the size of the table. Part files are written under a
+temporary name and renamed when complete, and a manifest lists them with
+the last id exported, to start the next incremental export from.
+
+Formats are gzipped CSV and Parquet, which needs the optional pyarrow
+package.
+"""
+import csv
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+from django.utils import timezone
+
+from .models import Review
+
+# column name to the field read for it
+COLUMNS = (
+    ('id', 'id'),
+    ('rating', 'rating'),
+    ('title', 'title'),
+    ('summary', 'summary'),
+    ('ip_address', 'ip_address'),
+    ('submission_date', 'submission_date'),
+    ('updated_at', 'updated_at'),
+    ('reviewer_id', 'reviewer_id'),
+    ('company_id', 'company__company_id'),
+    ('company_name', 'company__name'),
+    ('company_website', 'company__website'),
+)
+FORMATS = ('csv', 'parquet')
+EXTENSIONS = {'csv': 'csv.gz', 'parquet': 'parquet'}
+MANIFEST = 'manifest.json'
+# gzip's default of 9 takes twice as long as 6 for files barely smaller
+CSV_COMPRESS_LEVEL = 6
+
+
+class ExportUnavailable(Exception):
+    """A format needs a package that isn't installed."""
+
+
+def check_format(file_format):
+    if file_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable('The parquet format needs pyarrow, install it with `pip install pyarrow`.')
+
+
+def export_queryset(after_id=None, updated_since=None):
+    queryset = Review.objects.all()
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    return queryset
+
+
+def plan_ranges(after_id=None, updated_since=None, range_size=100000):
+    """Split the ids to export into [start, end] ranges of at most `range_size` ids."""
+    queryset = export_queryset(after_id, updated_since).order_by()
+    bounds = queryset.values_list('id', flat=True)
+    first, last = bounds.order_by('id').first(), bounds.order_by('-id').first()
+    if first is None:
+        return []
+    return [(start, min(start + range_size - 1, last)) for start in range(first, last + 1, range_size)]
+
+
+def export_range(task):
+    """
+    Write the reviews of an id range to a part file and return its entry of
+    the manifest. Takes a single tuple, so it can be mapped by a pool.
+    """
+    directory, file_format, (start, end), after_id, updated_since, batch_size = task
+    check_format(file_format)
+    path = os.path.join(directory, 'reviews-{:012d}-{:012d}.{}'.format(start, end, EXTENSIONS[file_format]))
+    writer = (CSVPartWriter if file_format == 'csv' else ParquetPartWriter)(path + '.tmp')
+    queryset = export_queryset(after_id, updated_since).filter(id__range=(start, end)).order_by('id')
+    fields = [field for name, field in COLUMNS]
+    rows, last_id = 0, start - 1
+    try:
+        while True:
+            batch = list(queryset.filter(id__gt=last_id).values_list(*fields)[:batch_size])
+            if not batch:
+                break
+            writer.write(batch)
+            rows += len(batch)
+            last_id = batch[-1][0]
+    finally:
+        writer.close()
+    os.replace(path + '.tmp', path)
+    return {'file': os.path.basename(path), 'start': start, 'end': end, 'rows': rows}
+
+
+class CSVPartWriter:
+
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wt', compresslevel=CSV_COMPRESS_LEVEL, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, field in COLUMNS])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPartWriter:
+    """Writes every batch as a row group, so only one batch is held in memory."""
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ('id', pyarrow.int64()),
+            ('rating', pyarrow.int16()),
+            ('title', pyarrow.string()),
+            ('summary', pyarrow.string()),
+            ('ip_address', pyarrow.string()),
+            ('submission_date', pyarrow.date32()),
+            ('updated_at', pyarrow.timestamp('us', tz='UTC')),
+            ('reviewer_id', pyarrow.int64()),
+            ('company_id', pyarrow.int64()),
+            ('company_name', pyarrow.string()),
+            ('company_website', pyarrow.string()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='snappy')
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        arrays = [
+            self.pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)
+        ]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def write_manifest(directory, file_format, parts, after_id, updated_since):
+    manifest = {
+        'format': file_format,
+        'exported_at': timezone.now().isoformat(),
+        'after_id': after_id,
+        'updated_since': updated_since.isoformat() if isinstance(updated_since, (date, datetime)) else None,
+        'rows': sum(part['rows'] for part in parts),
+        # the after_id of the next incremental export
+        'last_id': max((part['end'] for part in parts if part['rows']), default=after_id),
+        'parts': parts,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as output:
+        json.dump(manifest, output, indent=2)
+    return manifest
@@ -0,0 +1,66 @@
+import zlib
+from base64 import b64decode, b64encode
+
+from django.db import models
+
+# marks compressed values, legacy rows without it are read as they are
+COMPRESSED_HEADER = '\x01zlib:'
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField stored zlib compressed, base64 encoded behind a header, when
+    the value is at least `threshold` characters long and compressing makes
+    it shorter. Values are decompressed when read, so the model, forms and
+    serializers only see the text.
+
+    The stored text is what the database sees: lookups other than exact
+    matches, and database functions, don't work on compressed values.
+
+    On Postgres values are stored as they are, as TOAST already compresses
+    large text and the search trigger reads it. Only text starting with the
+    header is compressed there, so it isn't read as compressed data.
+    """
+
+    def __init__(self, *args, threshold=1000, level=6, **kwargs):
+        self.threshold = threshold
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != 1000:
+            kwargs['threshold'] = self.threshold
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def compress(self, value):
+        # text starting with the header is always compressed, so it can't be mistaken for compressed data
+        if len(value) < self.threshold and not value.startswith(COMPRESSED_HEADER):
+            return value
+        compressed = COMPRESSED_HEADER + b64encode(zlib.compress(value.encode('utf-8'), self.level)).decode('ascii')
+        if len(compressed) < len(value) or value.startswith(COMPRESSED_HEADER):
+            return compressed
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return value
+        if connection.vendor == 'postgresql' and not value.startswith(COMPRESSED_HEADER):
+            return value
+        return self.compress(value)
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+
+def decompress(value):
+    if value is None or not value.startswith(COMPRESSED_HEADER):
+        return value
+    return zlib.decompress(b64decode(value[len(COMPRESSED_HEADER):])).decode('utf-8')
+
+
+def is_compressed(value):
+    return value is not None and value.startswith(COMPRESSED_HEADER)
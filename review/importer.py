@@ -0,0 +1,275 @@
+"""
+Bulk import of historical reviews from CSV or JSONL files.
+
+Rows are read as a stream and validated with the rules of the Review and
+Company model fields, without a query per row. Each batch upserts its
+companies with one read and one bulk insert, inserts its reviews with COPY
+on Postgres, or one executemany INSERT elsewhere, updates the company stats
+and saves the ReviewImport checkpoint in a single transaction. An import
+started again with the same name resumes after the last batch written,
+reading the file from the byte offset where the batch ended.
+
+Rows are flat: rating, title, summary, ip_address, submission_date (today
+when missing), company_id, company_name, company_website and
+reviewer_email, the email of an existing user. JSONL rows may nest the
+company as {"company": {"company_id", "name", "website"}} instead, as the
+API does.
+"""
+import csv
+import json
+from datetime import date
+from io import StringIO
+from time import perf_counter
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxLengthValidator
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from authentication.models import User
+
+from .cache import bump_review_list_version
+from .models import Company, CompanyStats, Review, ReviewImport
+
+REVIEW_FIELDS = ('rating', 'title', 'summary', 'ip_address', 'submission_date')
+COMPANY_FIELDS = {'company_id': 'company_id', 'company_name': 'name', 'company_website': 'website'}
+# columns written, in the order of the COPY/INSERT statement
+COLUMNS = ('rating', 'title', 'summary', 'ip_address', 'submission_date', 'updated_at', 'company', 'reviewer')
+
+
+def read_csv(path, offset=0):
+    """
+    Yield the rows of a CSV file as dicts, and rows that can't be decoded or
+    parsed as {'__error__': message}, so they fail alone and the same row
+    numbers are read again on resume. Each row comes with the byte offset
+    where it ends; reading from `offset` starts after the header there.
+    """
+    undecodable = []
+    with open(path, 'rb') as source:
+        reader = csv.DictReader(decode_lines(source, undecodable))
+        if offset:
+            # the header is still read from the start of the file
+            reader.fieldnames
+            source.seek(offset)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                undecodable.clear()
+                yield source.tell(), {'__error__': str(error)}
+                continue
+            if undecodable:
+                yield source.tell(), {'__error__': undecodable[0]}
+                undecodable.clear()
+            else:
+                yield source.tell(), row
+
+
+def read_jsonl(path, offset=0):
+    undecodable = []
+    with open(path, 'rb') as source:
+        source.seek(offset)
+        for line in decode_lines(source, undecodable):
+            if undecodable:
+                yield source.tell(), {'__error__': undecodable.pop()}
+                continue
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as error:
+                yield source.tell(), {'__error__': str(error)}
+                continue
+            company = data.pop('company', None) if isinstance(data, dict) else None
+            if isinstance(company, dict):
+                data.update({column: company.get(name) for column, name in COMPANY_FIELDS.items()})
+            yield source.tell(), data
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def decode_lines(source, undecodable):
+    """
+    Decode the lines of a binary file as UTF-8, one at a time, so an invalid
+    byte only spoils its line. Undecodable lines are yielded with the
+    invalid bytes replaced, and their error appended to `undecodable`.
+    """
+    for line in source:
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError as error:
+            undecodable.append('Line is not valid UTF-8: {}'.format(error))
+            yield line.decode('utf-8', 'replace')
+
+
+def clean(model, name, value):
+    """Validate a value with the rules of the model field, as full_clean does."""
+    field = model._meta.get_field(name)
+    if value == '' and field.null:
+        value = None
+    value = field.clean(value, None)
+    # model validation only checks max_length of CharFields, the API checks it on text too
+    if isinstance(field, models.TextField) and field.max_length is not None:
+        MaxLengthValidator(field.max_length)(value)
+    return value
+
+
+def clean_row(data):
+    """Return the review and company values of a row, or raise ValidationError with the errors by column."""
+    if not isinstance(data, dict) or '__error__' in data:
+        raise ValidationError({'row': [data.get('__error__') if isinstance(data, dict) else 'Not an object.']})
+    review, company, errors = {}, {}, {}
+    for name in REVIEW_FIELDS:
+        value = data.get(name)
+        if name == 'submission_date' and value in (None, ''):
+            value = date.today()
+        try:
+            review[name] = clean(Review, name, value)
+        except ValidationError as error:
+            errors[name] = error.messages
+    for column, name in COMPANY_FIELDS.items():
+        try:
+            company[name] = clean(Company, name, data.get(column))
+        except ValidationError as error:
+            errors[column] = error.messages
+    email = data.get('reviewer_email')
+    if not email:
+        errors['reviewer_email'] = ['This field cannot be blank.']
+    if errors:
+        raise ValidationError(errors)
+    review['reviewer_email'] = User.objects.normalize_email(email)
+    return review, company
+
+
+class ReviewImporter:
+    """
+    Import the rows of `reader` in batches of `batch_size`, recording the
+    progress as the ReviewImport named `name`. `reader` is called with the
+    byte offset to read from and yields (offset where the row ends, row)
+    pairs, as the READERS do. Invalid rows are written to
+    `errors`, a file object, as JSON lines with the row number, the errors
+    and the row, before their batch commits: a batch that fails to commit
+    may have its invalid rows written again when the import resumes.
+    `progress` is called after each batch with the checkpoint and the rows
+    per second since the import started.
+    """
+
+    def __init__(self, name, reader, errors, batch_size=5000, progress=None, using='default'):
+        self.checkpoint, _ = ReviewImport.objects.using(using).get_or_create(name=name)
+        self.reader = reader
+        self.errors = errors
+        self.batch_size = batch_size
+        self.progress = progress
+        self.using = using
+        self.connection = connections[using]
+
+    def run(self):
+        started, rows = perf_counter(), 0
+        batch, end = [], None
+        skip, offset = self.checkpoint.rows, self.checkpoint.offset
+        # checkpoints saved without an offset are resumed by reading the rows again
+        first = skip + 1 if offset else 1
+        for number, (end, data) in enumerate(self.reader(offset), first):
+            if number <= skip:
+                continue
+            batch.append((number, data))
+            if len(batch) == self.batch_size:
+                rows += self._import_batch(batch, end)
+                batch = []
+                self._report(rows, started)
+        if batch:
+            rows += self._import_batch(batch, end)
+            self._report(rows, started)
+        return self.checkpoint
+
+    def _report(self, rows, started):
+        if self.progress is not None:
+            self.progress(self.checkpoint, rows / max(perf_counter() - started, 1e-9))
+
+    def _import_batch(self, batch, offset):
+        valid, failed = [], []
+        for number, data in batch:
+            try:
+                valid.append((number, data) + clean_row(data))
+            except ValidationError as error:
+                failed.append((number, data, error.message_dict))
+
+        emails = {review['reviewer_email'] for number, data, review, company in valid}
+        reviewers = dict(User.objects.using(self.using).filter(email__in=emails).values_list('email', 'pk'))
+        rows = []
+        for number, data, review, company in valid:
+            reviewer_id = reviewers.get(review.pop('reviewer_email'))
+            if reviewer_id is None:
+                failed.append((number, data, {'reviewer_email': ['No user with this email.']}))
+            else:
+                rows.append((review, company, reviewer_id))
+
+        with transaction.atomic(using=self.using):
+            companies = Company.objects.db_manager(self.using).upsert_many(
+                company for review, company, reviewer_id in rows
+            )
+            reviews = [
+                Review(company_id=companies[company['company_id']].pk, reviewer_id=reviewer_id, **review)
+                for review, company, reviewer_id in rows
+            ]
+            self._insert(reviews)
+            CompanyStats.objects.db_manager(self.using).add_reviews(reviews)
+            self.checkpoint.rows = batch[-1][0]
+            self.checkpoint.offset = offset
+            self.checkpoint.imported += len(reviews)
+            self.checkpoint.failed += len(failed)
+            self.checkpoint.save(using=self.using)
+            for reviewer_id in {review.reviewer_id for review in reviews}:
+                transaction.on_commit(
+                    lambda reviewer_id=reviewer_id: bump_review_list_version(reviewer_id), using=self.using
+                )
+            # written before the checkpoint commits, so a crash can't skip them on resume
+            for number, data, errors in sorted(failed, key=lambda failure: failure[0]):
+                self.errors.write(json.dumps({'row': number, 'errors': errors, 'data': data}, default=str) + '\n')
+            self.errors.flush()
+        return len(batch)
+
+    def _insert(self, reviews):
+        if not reviews:
+            return
+        fields = [Review._meta.get_field(name) for name in COLUMNS]
+        now = timezone.now()
+        for review in reviews:
+            review.updated_at = now
+        if self.connection.vendor == 'postgresql':
+            self._copy(reviews, fields)
+        else:
+            values = [[field.get_db_prep_save(getattr(review, field.attname), self.connection) for field in fields]
+                      for review in reviews]
+            sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                self.connection.ops.quote_name(Review._meta.db_table),
+                ', '.join(self.connection.ops.quote_name(field.column) for field in fields),
+                ', '.join(['%s'] * len(fields)),
+            )
+            with self.connection.cursor() as cursor:
+                cursor.executemany(sql, values)
+
+    def _copy(self, reviews, fields):
+        qn = self.connection.ops.quote_name
+        table = Review._meta.db_table
+        with self.connection.cursor() as cursor:
+            # ids taken ahead, COPY can't return them
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, len(reviews)]
+            )
+            for review, (pk,) in zip(reviews, cursor.fetchall()):
+                review.pk = pk
+
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            fields = [Review._meta.pk] + fields
+            for review in reviews:
+                writer.writerow([field.get_db_prep_save(getattr(review, field.attname), self.connection)
+                                 for field in fields])
+            buffer.seek(0)
+            cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                qn(table), ', '.join(qn(field.column) for field in fields)
+            ), buffer)
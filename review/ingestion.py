@@ -0,0 +1,175 @@
+"""
+Write-behind ingestion of submitted reviews.
+
+With REVIEW_WRITE_BEHIND on, a validated review is appended to a journal, a
+SQLite file on local disk, and the request is answered with a receipt without
+touching the database. `manage.py drain_review_journal` moves the journaled
+reviews into the database in batches, so submissions keep being accepted at
+the same latency while the database is slow or unavailable, and survive
+restarts of both the web and the worker processes.
+
+Each review is written along with a ReviewReceipt in the same transaction, so
+a batch drained again after a crash doesn't insert its reviews twice.
+"""
+import json
+import sqlite3
+import threading
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection, transaction
+
+from authentication.models import User
+from reviews_api.routers import use_primary
+
+from .models import ReviewReceipt
+
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entry (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        receipt TEXT NOT NULL UNIQUE,
+        reviewer_id INTEGER NOT NULL,
+        ip_address TEXT NOT NULL,
+        data TEXT NOT NULL,
+        status TEXT NOT NULL,
+        review_id INTEGER,
+        error TEXT,
+        created REAL NOT NULL,
+        processed REAL
+    );
+    CREATE INDEX IF NOT EXISTS entry_status_id ON entry (status, id);
+"""
+
+
+class ReviewJournal:
+    """Durable FIFO of submitted reviews, shared by the processes of one host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # sqlite3 connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            # fsync every commit, an accepted review must survive a power loss
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def append(self, reviewer_id, ip_address, data):
+        """Journal a validated review and return its receipt."""
+        receipt = uuid4().hex
+        self.connection.execute(
+            'INSERT INTO entry (receipt, reviewer_id, ip_address, data, status, created) VALUES (?, ?, ?, ?, ?, ?)',
+            (receipt, reviewer_id, ip_address, json.dumps(data), PENDING, time())
+        )
+        return receipt
+
+    def status(self, receipt):
+        row = self.connection.execute(
+            'SELECT receipt, reviewer_id, status, review_id, error FROM entry WHERE receipt = ?', (receipt,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def pending(self, limit):
+        return self.connection.execute(
+            'SELECT id, receipt, reviewer_id, ip_address, data FROM entry WHERE status = ? ORDER BY id LIMIT ?',
+            (PENDING, limit)
+        ).fetchall()
+
+    def mark(self, results):
+        """Record the outcome of drained entries, given as (receipt, status, review_id, error)."""
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'UPDATE entry SET status = ?, review_id = ?, error = ?, processed = ? WHERE receipt = ?',
+                [(status, review_id, error, time(), receipt) for receipt, status, review_id, error in results]
+            )
+
+    def purge(self, older_than):
+        """
+        Delete the entries processed more than `older_than` seconds ago, and
+        the receipts as old. Only purge when no entry is pending, a pending
+        entry may have its review written already.
+        """
+        ReviewReceipt.objects.purge(older_than)
+        return self.connection.execute(
+            'DELETE FROM entry WHERE status != ? AND processed < ?', (PENDING, time() - older_than)
+        ).rowcount
+
+    def drain(self, batch_size):
+        """Write up to `batch_size` pending reviews to the database; return how many were processed."""
+        entries = self.pending(batch_size)
+        if entries:
+            # the receipts already written must be read from the primary
+            with use_primary():
+                self.mark(self._write(entries))
+        return len(entries)
+
+    def _write(self, entries):
+        from .serializers import ReviewSerializer
+
+        done = ReviewReceipt.objects.in_bulk([entry['receipt'] for entry in entries])
+        results = [(receipt, DONE, done[receipt].review_id, None) for receipt in done]
+        entries = [entry for entry in entries if entry['receipt'] not in done]
+        reviewers = User.objects.in_bulk({entry['reviewer_id'] for entry in entries})
+
+        valid = []
+        for entry in entries:
+            if entry['reviewer_id'] in reviewers:
+                valid.append(entry)
+            else:
+                results.append((entry['receipt'], FAILED, None, 'The reviewer no longer exists.'))
+
+        def write(batch):
+            validated_data = [
+                dict(json.loads(entry['data']), reviewer=reviewers[entry['reviewer_id']],
+                     ip_address=entry['ip_address'])
+                for entry in batch
+            ]
+            with transaction.atomic():
+                if connection.features.can_return_ids_from_bulk_insert:
+                    reviews = ReviewSerializer(many=True).create(validated_data)
+                else:
+                    # the receipts need the ids of the reviews
+                    reviews = [ReviewSerializer().create(attrs) for attrs in validated_data]
+                ReviewReceipt.objects.bulk_create(
+                    ReviewReceipt(receipt=entry['receipt'], review_id=review.pk) for entry, review in zip(batch, reviews)
+                )
+            return [(entry['receipt'], DONE, review.pk, None) for entry, review in zip(batch, reviews)]
+
+        if not valid:
+            return results
+        try:
+            return results + write(valid)
+        except (DataError, IntegrityError):
+            pass
+        # isolate the entries that can't be written, so they don't hold back the rest. Other
+        # database errors, like the database being unavailable, leave the batch pending.
+        for entry in valid:
+            try:
+                results += write([entry])
+            except (DataError, IntegrityError) as error:
+                results.append((entry['receipt'], FAILED, None, str(error)))
+        return results
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_review_journal():
+    path = settings.REVIEW_JOURNAL_PATH
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = ReviewJournal(path)
+        return _journals[path]
@@ -0,0 +1,67 @@
+"""
+Company typeahead: companies by name prefix or company_id, most reviewed
+first.
+
+Name prefixes are matched as UPPER(name) LIKE 'PREFIX%', backed by the
+review_company_upper_name_idx expression index on Postgres, and company_ids
+by the unique index. Ranking by review count has no index: short prefixes,
+which match the most companies, rely on the results being cached for
+REVIEW_COMPANY_LOOKUP_CACHE_TIMEOUT seconds, so they are ranked once per
+timeout at most. The cache key has the companies version stamp, so created,
+updated or deleted companies show right away. The stamp lives in
+REVIEW_LIST_CACHE, and with a process-local one other processes wouldn't see
+it change, so results aren't cached then.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from reviews_api.caches import is_process_local
+
+from .cache import get_companies_version
+from .models import Company
+from .search import parse_id
+
+COMPANY_LOOKUP_KEY = 'company-lookup:{}:{}:{}'
+
+
+def company_lookup_cache():
+    return caches[settings.REVIEW_COMPANY_LOOKUP_CACHE]
+
+
+def lookup_companies(query, limit):
+    """
+    Return up to `limit` companies whose name starts with `query`, case
+    insensitively, or whose company_id is `query`, as dicts of company_id,
+    name, website and review_count. A company_id match comes first, then the
+    most reviewed companies.
+    """
+    query = query.strip()
+    if is_process_local(settings.REVIEW_LIST_CACHE):
+        return _lookup(query, limit)
+    cache = company_lookup_cache()
+    key = COMPANY_LOOKUP_KEY.format(
+        get_companies_version(), limit, md5(query.upper().encode('utf-8')).hexdigest()
+    )
+    companies = cache.get(key)
+    if companies is None:
+        companies = _lookup(query, limit)
+        cache.set(key, companies, settings.REVIEW_COMPANY_LOOKUP_CACHE_TIMEOUT)
+    return companies
+
+
+def _lookup(query, limit):
+    matches = Q(name__istartswith=query)
+    ordering = [F('stats__review_count').desc(nulls_last=True), 'name', 'company_id']
+    company_id = parse_id(query)
+    if company_id is not None:
+        matches |= Q(company_id=company_id)
+        exact = Case(When(company_id=company_id, then=Value(0)), default=Value(1), output_field=IntegerField())
+        ordering.insert(0, exact)
+    rows = Company.objects.filter(matches).order_by(*ordering).values(
+        'company_id', 'name', 'website', review_count=Coalesce('stats__review_count', 0)
+    )
+    return list(rows[:limit])
@@ -0,0 +1,36 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from review.archive import ARCHIVE_BATCH_SIZE, archive_reviews
+from review.partitions import create_partitions, is_partitioned, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Move reviews older than REVIEW_ARCHIVE_AFTER_MONTHS months to the archive table, '
+        'and create the upcoming monthly partitions on Postgres'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.REVIEW_ARCHIVE_AFTER_MONTHS,
+                            help='months of reviews to keep, counting the current one')
+        parser.add_argument('--before', help='archive the reviews submitted before this date (YYYY-MM-DD) instead')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='reviews moved per transaction')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--before must be a date in the YYYY-MM-DD format')
+        else:
+            before = month_start(date.today(), 1 - options['months'])
+
+        if is_partitioned(connection):
+            create_partitions(connection, month_start(date.today()),
+                              month_start(date.today(), settings.REVIEW_PARTITIONS_AHEAD))
+        archived = archive_reviews(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Archived {} reviews submitted before {}'.format(archived, before)))
@@ -0,0 +1,45 @@
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from review.ingestion import get_review_journal
+
+
+class Command(BaseCommand):
+    help = 'Write the reviews submitted with write-behind ingestion to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--forever', action='store_true', help='keep draining new submissions')
+        parser.add_argument('--interval', type=float, default=1.0, help='seconds to wait when the journal is empty')
+        parser.add_argument('--max-backoff', type=float, default=60.0,
+                            help='longest wait, in seconds, between retries while the database fails')
+
+    def handle(self, *args, **options):
+        journal = get_review_journal()
+        processed = 0
+        backoff = options['interval']
+        while True:
+            try:
+                count = journal.drain(options['batch_size'])
+                if not count:
+                    journal.purge(settings.REVIEW_JOURNAL_RETENTION)
+            except DatabaseError as error:
+                if not options['forever']:
+                    raise
+                # the entries stay pending, retry once the database is back
+                self.stderr.write('Draining failed, retrying in {:g}s: {}'.format(backoff, error))
+                close_old_connections()
+                sleep(backoff)
+                backoff = min(backoff * 2, options['max_backoff'])
+                continue
+            backoff = options['interval']
+            processed += count
+            if count:
+                continue
+            if not options['forever']:
+                break
+            sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Processed {} journaled reviews'.format(processed)))
@@ -0,0 +1,75 @@
+import os
+from datetime import datetime, time
+from multiprocessing import Pool
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from review.exporter import FORMATS, ExportUnavailable, check_format, export_range, plan_ranges, write_manifest
+
+
+def parse_since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = 'Export the reviews joined with their company, as gzipped CSV or Parquet part files of id ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='directory of the export, with a subdirectory per format')
+        parser.add_argument('--format', nargs='+', choices=FORMATS, default=['csv'], dest='formats')
+        parser.add_argument('--after-id', type=int, help='export the reviews with a greater id only')
+        parser.add_argument('--since', help='export the reviews updated at or after this date or datetime only')
+        parser.add_argument('--range-size', type=int, default=100000, help='ids per part file')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows read per query')
+        parser.add_argument('--workers', type=int, default=1, help='processes exporting ranges in parallel')
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError:
+            raise CommandError('Invalid --since {!r}, use YYYY-MM-DD or an ISO datetime'.format(options['since']))
+        for file_format in options['formats']:
+            try:
+                check_format(file_format)
+            except ExportUnavailable as error:
+                raise CommandError(str(error))
+
+        ranges = plan_ranges(options['after_id'], since, options['range_size'])
+        self.stdout.write('Exporting {} ranges of {} ids'.format(len(ranges), options['range_size']))
+        for file_format in options['formats']:
+            directory = os.path.join(options['output'], file_format)
+            os.makedirs(directory, exist_ok=True)
+            tasks = [
+                (directory, file_format, bounds, options['after_id'], since, options['batch_size'])
+                for bounds in ranges
+            ]
+            started = perf_counter()
+            parts = self._run(tasks, options['workers'])
+            manifest = write_manifest(directory, file_format, parts, options['after_id'], since)
+            self.stdout.write(self.style.SUCCESS('Exported {} reviews to {} in {:.1f}s, last id {}'.format(
+                manifest['rows'], directory, perf_counter() - started, manifest['last_id']
+            )))
+
+    def _run(self, tasks, workers):
+        if workers <= 1 or len(tasks) <= 1:
+            return [self._report(export_range(task)) for task in tasks]
+        # forked workers must not share the connection of this process, each opens its own
+        connections.close_all()
+        with Pool(min(workers, len(tasks))) as pool:
+            return [self._report(part) for part in pool.imap(export_range, tasks)]
+
+    def _report(self, part):
+        self.stdout.write('{file}: {rows} rows'.format(**part))
+        return part
@@ -0,0 +1,48 @@
+import os
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from review.importer import READERS, ReviewImporter
+from review.models import ReviewImport
+
+
+class Command(BaseCommand):
+    help = 'Import reviews and their companies from a CSV or JSONL file, resuming an interrupted import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS), help='read from the file extension by default')
+        parser.add_argument('--name', help='name of the import to resume, the file name by default')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--errors', help='file of the invalid rows, <path>.errors.jsonl by default')
+        parser.add_argument('--restart', action='store_true', help='import from the first row again')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError('Unknown format {!r}, use --format {}'.format(file_format, ' or '.join(sorted(READERS))))
+        if not os.path.exists(path):
+            raise CommandError('{} does not exist'.format(path))
+        name = options['name'] or os.path.basename(path)
+        if options['restart']:
+            ReviewImport.objects.filter(name=name).delete()
+
+        def progress(checkpoint, rate):
+            self.stdout.write('{} rows read, {} imported, {} failed, {:.0f} rows/s'.format(
+                checkpoint.rows, checkpoint.imported, checkpoint.failed, rate
+            ))
+
+        errors_path = options['errors'] or '{}.errors.jsonl'.format(path)
+        with open(errors_path, 'w' if options['restart'] else 'a', encoding='utf-8') as errors:
+            importer = ReviewImporter(
+                name, partial(READERS[file_format], path), errors, batch_size=options['batch_size'], progress=progress
+            )
+            if importer.checkpoint.rows:
+                self.stdout.write('Resuming {} after row {}'.format(name, importer.checkpoint.rows))
+            checkpoint = importer.run()
+
+        self.stdout.write(self.style.SUCCESS('Imported {} reviews, {} rows failed (see {})'.format(
+            checkpoint.imported, checkpoint.failed, errors_path
+        )))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from review.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete the Idempotency-Key records older than REVIEW_IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        purged = IdempotencyKey.objects.purge()
+        self.stdout.write(self.style.SUCCESS('Purged {} idempotency keys'.format(purged)))
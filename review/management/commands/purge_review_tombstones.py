@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from review.models import ReviewTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of reviews deleted longer than REVIEW_TOMBSTONE_RETENTION ago'
+
+    def handle(self, *args, **options):
+        purged = ReviewTombstone.objects.purge()
+        self.stdout.write(self.style.SUCCESS('Purged {} review tombstones'.format(purged)))
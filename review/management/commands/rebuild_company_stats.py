@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from review.models import CompanyStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating aggregates of every company from its reviews'
+
+    def handle(self, *args, **options):
+        CompanyStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt the stats of {} companies'.format(CompanyStats.objects.count())
+        ))
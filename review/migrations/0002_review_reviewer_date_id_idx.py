@@ -0,0 +1,17 @@
+# Generated by Django 2.0.4 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewer', 'submission_date', 'id'], name='review_reviewer_date_id_idx'),
+        ),
+    ]
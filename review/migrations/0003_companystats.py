@@ -0,0 +1,39 @@
+# Generated by Django 2.0.4 on 2026-10-18 08:47
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def populate_company_stats(apps, schema_editor):
+    Review = apps.get_model('review', 'Review')
+    CompanyStats = apps.get_model('review', 'CompanyStats')
+    aggregates = {'rating_{}'.format(rating): Count('pk', filter=Q(rating=rating)) for rating in range(1, 6)}
+    rows = Review.objects.using(schema_editor.connection.alias).order_by().values('company_id').annotate(
+        review_count=Count('pk'), rating_sum=Sum('rating'), **aggregates
+    )
+    CompanyStats.objects.using(schema_editor.connection.alias).bulk_create(CompanyStats(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0002_review_reviewer_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyStats',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='review.Company')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_company_stats, migrations.RunPython.noop),
+    ]
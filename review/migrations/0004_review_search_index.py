@@ -0,0 +1,97 @@
+from django.db import migrations
+
+# the SQL as of this migration, later changes to search go in new migrations
+POSTGRES_INDEX = [
+    'ALTER TABLE review_review ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION review_review_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.summary, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER review_review_search_vector BEFORE INSERT OR UPDATE OF title, summary
+    ON review_review FOR EACH ROW EXECUTE PROCEDURE review_review_search_vector()
+    """,
+    # fires the trigger to index the existing reviews
+    'UPDATE review_review SET title = title',
+    'CREATE INDEX review_review_search_vector_idx ON review_review USING GIN (search_vector)',
+]
+
+POSTGRES_DROP_INDEX = [
+    'DROP TRIGGER review_review_search_vector ON review_review',
+    'DROP FUNCTION review_review_search_vector()',
+    'ALTER TABLE review_review DROP COLUMN search_vector',
+]
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS review_review_fts
+    USING fts5(title, summary, content='review_review', content_rowid='id')
+    """,
+    "INSERT INTO review_review_fts(review_review_fts) VALUES ('rebuild')",
+]
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_insert AFTER INSERT ON review_review BEGIN
+        INSERT INTO review_review_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_delete AFTER DELETE ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, old.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_update AFTER UPDATE OF title, summary ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, old.summary);
+        INSERT INTO review_review_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+    END
+    """,
+]
+
+SQLITE_DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS review_review_fts_insert',
+    'DROP TRIGGER IF EXISTS review_review_fts_delete',
+    'DROP TRIGGER IF EXISTS review_review_fts_update',
+    'DROP TABLE IF EXISTS review_review_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_INDEX)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_INDEX + SQLITE_TRIGGERS)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_DROP_INDEX)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_DROP_INDEX)
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0003_companystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.0.4 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0004_review_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewReceipt',
+            fields=[
+                ('receipt', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('review_id', models.IntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.0.4 on 2026-10-18 09:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+import review.partitions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('review', '0005_reviewreceipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReview',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('rating', models.PositiveSmallIntegerField()),
+                ('title', models.CharField(max_length=64)),
+                ('summary', models.TextField(max_length=10000)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('submission_date', models.DateField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews', to='review.Company')),
+                ('reviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_reviews', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedreview',
+            index=models.Index(fields=['reviewer', 'submission_date', 'id'], name='archived_reviewer_date_id_idx'),
+        ),
+        # Postgres only, and not reverted: the partitioned table works the same for older code
+        migrations.RunPython(review.partitions.partition_review_table, migrations.RunPython.noop),
+    ]
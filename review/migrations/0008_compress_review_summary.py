@@ -0,0 +1,128 @@
+# Generated by Django 2.0.4 on 2026-10-18 09:15
+
+from django.db import migrations
+import review.fields
+
+# the SQL as of this migration, later changes to search go in new migrations
+
+# the trigger function with compressed summaries left out
+POSTGRES_SEARCH_VECTOR = """
+    CREATE OR REPLACE FUNCTION review_review_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', CASE
+                WHEN left(NEW.summary, 6) = chr(1) || 'zlib:' THEN ''
+                ELSE coalesce(NEW.summary, '')
+            END), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+SQLITE_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS review_review_fts_insert',
+    'DROP TRIGGER IF EXISTS review_review_fts_delete',
+    'DROP TRIGGER IF EXISTS review_review_fts_update',
+]
+
+# the triggers of 0004, reading the summaries as stored
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_insert AFTER INSERT ON review_review BEGIN
+        INSERT INTO review_review_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_delete AFTER DELETE ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, old.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_update AFTER UPDATE OF title, summary ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, old.summary);
+        INSERT INTO review_review_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+    END
+    """,
+]
+
+# 'rebuild' would read the summaries as stored, compressed ones included
+SQLITE_REINDEX = [
+    "INSERT INTO review_review_fts(review_review_fts) VALUES ('delete-all')",
+    """
+    INSERT INTO review_review_fts(rowid, title, summary)
+    SELECT id, title, review_summary_text(summary) FROM review_review
+    """,
+]
+
+# review_summary_text is registered on every SQLite connection by review.signals
+SQLITE_SUMMARY_TEXT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_insert AFTER INSERT ON review_review BEGIN
+        INSERT INTO review_review_fts(rowid, title, summary)
+        VALUES (new.id, new.title, review_summary_text(new.summary));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_delete AFTER DELETE ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, review_summary_text(old.summary));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_update AFTER UPDATE OF title, summary ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, review_summary_text(old.summary));
+        INSERT INTO review_review_fts(rowid, title, summary)
+        VALUES (new.id, new.title, review_summary_text(new.summary));
+    END
+    """,
+]
+
+
+def create_search_triggers(apps, schema_editor):
+    # rebuilding review_review drops them
+    if schema_editor.connection.vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_TRIGGERS)
+
+
+def index_compressed_summaries(apps, schema_editor):
+    """
+    Replace the search triggers with ones that handle compressed summaries
+    and reindex the reviews with them.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_SEARCH_VECTOR)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_DROP_TRIGGERS + SQLITE_REINDEX + SQLITE_SUMMARY_TEXT_TRIGGERS)
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        # rebuilding review_review on SQLite drops its triggers, both ways
+        migrations.RunPython(migrations.RunPython.noop, create_search_triggers),
+        migrations.AlterField(
+            model_name='archivedreview',
+            name='summary',
+            field=review.fields.CompressedTextField(max_length=10000),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='summary',
+            field=review.fields.CompressedTextField(max_length=10000),
+        ),
+        migrations.RunPython(index_compressed_summaries, migrations.RunPython.noop),
+    ]
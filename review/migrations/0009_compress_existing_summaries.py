@@ -0,0 +1,58 @@
+from django.db import migrations, transaction
+
+from review.fields import decompress
+
+BATCH_SIZE = 1000
+TABLES = ('review_review', 'review_archivedreview')
+
+
+def rewrite_summaries(schema_editor, table, encode):
+    """
+    Rewrite the summaries of `table` with `encode` in batches of ids, each
+    in its own transaction, so large tables aren't locked or held in memory
+    at once.
+    """
+    connection = schema_editor.connection
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id, summary FROM {} WHERE id > %s ORDER BY id LIMIT %s'.format(table),
+                [last_id, BATCH_SIZE]
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            changed = []
+            for pk, summary in rows:
+                encoded = encode(summary)
+                if encoded != summary:
+                    changed.append((encoded, pk))
+            cursor.executemany('UPDATE {} SET summary = %s WHERE id = %s'.format(table), changed)
+
+
+def compress_summaries(apps, schema_editor):
+    Review = apps.get_model('review', 'Review')
+    compress = Review._meta.get_field('summary').compress
+    # the Postgres search trigger leaves them out until 0015 makes it decompress them
+    for table in TABLES:
+        rewrite_summaries(schema_editor, table, compress)
+
+
+def decompress_summaries(apps, schema_editor):
+    for table in TABLES:
+        rewrite_summaries(schema_editor, table, decompress)
+
+
+class Migration(migrations.Migration):
+    # every batch is committed on its own
+    atomic = False
+
+    dependencies = [
+        ('review', '0008_compress_review_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_summaries, decompress_summaries),
+    ]
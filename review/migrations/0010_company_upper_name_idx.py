@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# case insensitive name prefix searches of the admin, Postgres only
+CREATE_INDEX = 'CREATE INDEX review_company_upper_name_idx ON review_company (UPPER(name::text) text_pattern_ops)'
+DROP_INDEX = 'DROP INDEX IF EXISTS review_company_upper_name_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0009_compress_existing_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
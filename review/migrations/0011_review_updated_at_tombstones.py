@@ -0,0 +1,70 @@
+# Generated by Django 2.0.4 on 2026-10-18 09:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# the SQL as of this migration, review_summary_text is registered on every SQLite connection by review.signals
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_insert AFTER INSERT ON review_review BEGIN
+        INSERT INTO review_review_fts(rowid, title, summary)
+        VALUES (new.id, new.title, review_summary_text(new.summary));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_delete AFTER DELETE ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, review_summary_text(old.summary));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_review_fts_update AFTER UPDATE OF title, summary ON review_review BEGIN
+        INSERT INTO review_review_fts(review_review_fts, rowid, title, summary)
+        VALUES ('delete', old.id, old.title, review_summary_text(old.summary));
+        INSERT INTO review_review_fts(rowid, title, summary)
+        VALUES (new.id, new.title, review_summary_text(new.summary));
+    END
+    """,
+]
+
+
+def create_search_triggers(apps, schema_editor):
+    # rebuilding review_review drops them
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0010_company_upper_name_idx'),
+    ]
+
+    operations = [
+        # rebuilding review_review on SQLite drops its triggers, both ways
+        migrations.RunPython(migrations.RunPython.noop, create_search_triggers),
+        migrations.CreateModel(
+            name='ReviewTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_id', models.IntegerField()),
+                ('reviewer_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewer', 'updated_at', 'id'], name='review_reviewer_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewtombstone',
+            index=models.Index(fields=['reviewer_id', 'deleted_at', 'review_id'], name='tombstone_reviewer_deleted_idx'),
+        ),
+        migrations.RunPython(create_search_triggers, migrations.RunPython.noop),
+    ]
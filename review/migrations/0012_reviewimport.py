@@ -0,0 +1,24 @@
+# Generated by Django 2.0.4 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0011_review_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewImport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('imported', models.BigIntegerField(default=0)),
+                ('failed', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
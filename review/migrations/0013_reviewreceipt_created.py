@@ -0,0 +1,19 @@
+# Generated by Django 2.0.4 on 2026-10-18 09:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0012_reviewimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewreceipt',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.0.4 on 2026-10-18 10:00
+
+import django.core.validators
+from django.db import migrations, models
+
+import review.partitions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0013_reviewreceipt_created'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedreview',
+            name='rating',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        # Postgres only, ids unique across the partitions of review_review
+        migrations.RunPython(review.partitions.enforce_unique_ids, review.partitions.allow_duplicate_ids),
+    ]
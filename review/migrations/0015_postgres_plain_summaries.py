@@ -0,0 +1,59 @@
+# Generated by Django 2.0.4 on 2026-10-18 11:00
+
+import zlib
+from base64 import b64decode
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+TABLES = ('review_review', 'review_archivedreview')
+HEADER = '\x01zlib:'
+
+
+def decompress(value):
+    return zlib.decompress(b64decode(value[len(HEADER):])).decode('utf-8')
+
+
+def store_plain_summaries(apps, schema_editor):
+    """
+    Decompress the summaries stored on Postgres, which TOAST compresses
+    itself, in batches of ids, each in its own transaction. Rewriting them
+    fires the search trigger, which indexes the text. Text starting with the
+    header stays compressed, so it isn't read as compressed data.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        last_id = 0
+        while True:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT id, summary FROM {} WHERE id > %s ORDER BY id LIMIT %s'.format(table),
+                    [last_id, BATCH_SIZE]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                changed = []
+                for pk, summary in rows:
+                    if summary is not None and summary.startswith(HEADER):
+                        text = decompress(summary)
+                        if not text.startswith(HEADER):
+                            changed.append((text, pk))
+                cursor.executemany('UPDATE {} SET summary = %s WHERE id = %s'.format(table), changed)
+
+
+class Migration(migrations.Migration):
+    # every batch is committed on its own
+    atomic = False
+
+    dependencies = [
+        ('review', '0014_archivedreview_rating_review_ids'),
+    ]
+
+    operations = [
+        # compressed and plain summaries are both read, nothing to undo
+        migrations.RunPython(store_plain_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.0.4 on 2026-10-18 12:30
+
+import datetime
+
+from django.db import migrations, models
+from django.utils.timezone import utc
+
+# older than any review, existing companies don't show up as changes in syncs
+DEFAULT = datetime.datetime(2000, 1, 1, tzinfo=utc)
+SQLITE_ADD_COLUMN = "ALTER TABLE review_company ADD COLUMN updated_at datetime NOT NULL DEFAULT '2000-01-01 00:00:00'"
+SQLITE_DROP_COLUMN = 'ALTER TABLE review_company DROP COLUMN updated_at'
+
+
+def updated_at():
+    field = models.DateTimeField(auto_now=True, default=DEFAULT)
+    field.set_attributes_from_name('updated_at')
+    return field
+
+
+def add_updated_at(apps, schema_editor):
+    # SQLite would rebuild review_company, which the review tables reference
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_ADD_COLUMN)
+    else:
+        schema_editor.add_field(apps.get_model('review', 'Company'), updated_at())
+
+
+def remove_updated_at(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP_COLUMN)
+    else:
+        schema_editor.remove_field(apps.get_model('review', 'Company'), updated_at())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0015_postgres_plain_summaries'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_updated_at, remove_updated_at),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='company',
+                    name='updated_at',
+                    field=models.DateTimeField(auto_now=True, default=DEFAULT),
+                    preserve_default=False,
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.4 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0016_company_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewimport',
+            name='offset',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
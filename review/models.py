@@ -1,6 +1,16 @@
-from django.db import models
+from collections import Counter, defaultdict
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
 
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from .cache import bump_companies_version, bump_company_versions, company_cache
+from .fields import CompressedTextField
 
 
 class Review(models.Model):
@@ -8,14 +18,386 @@ class Review(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(5)]
     )
     title = models.CharField(max_length=64)
-    summary = models.TextField(max_length=10000)
+    summary = CompressedTextField(max_length=10000)
     ip_address = models.GenericIPAddressField()
     submission_date = models.DateField(auto_now_add=True)
+    # not set by queryset.update(), which must set it for the change to be synced
+    updated_at = models.DateTimeField(auto_now=True)
     company = models.ForeignKey('review.Company', on_delete=models.CASCADE)
     reviewer = models.ForeignKey('authentication.User', on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # backs the keyset pagination of the user's review list
+            models.Index(fields=['reviewer', 'submission_date', 'id'], name='review_reviewer_date_id_idx'),
+            # backs the changes of the user's reviews since a watermark
+            models.Index(fields=['reviewer', 'updated_at', 'id'], name='review_reviewer_updated_id_idx'),
+        ]
+
+
+class ArchivedReview(models.Model):
+    """
+    Review moved out of review_review by `manage.py archive_reviews`, with
+    the same id and columns. Only read when archived reviews are asked for.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    rating = models.IntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
+    title = models.CharField(max_length=64)
+    summary = CompressedTextField(max_length=10000)
+    ip_address = models.GenericIPAddressField()
+    submission_date = models.DateField()
+    company = models.ForeignKey('review.Company', on_delete=models.CASCADE, related_name='archived_reviews')
+    reviewer = models.ForeignKey('authentication.User', on_delete=models.CASCADE, related_name='archived_reviews')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewer', 'submission_date', 'id'], name='archived_reviewer_date_id_idx'),
+        ]
+
+
+class ReviewReceiptManager(models.Manager):
+
+    def purge(self, older_than):
+        """Delete the receipts written more than `older_than` seconds ago."""
+        return self.filter(created__lt=timezone.now() - timedelta(seconds=older_than)).delete()[0]
+
+
+class ReviewReceipt(models.Model):
+    """
+    Receipt of a review submitted through the journal, written along with the
+    review so the journal can be drained more than once without duplicates.
+    """
+
+    receipt = models.CharField(max_length=32, primary_key=True)
+    # not a foreign key, which would make rebuilding review_review on SQLite fail
+    review_id = models.IntegerField()
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = ReviewReceiptManager()
+
+
+class ReviewImport(models.Model):
+    """
+    Progress of `manage.py import_reviews` through a source, saved in the
+    transaction of each batch, so an interrupted import resumes after the
+    last batch written.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.BigIntegerField(default=0)
+    # byte offset of the source where the last row written ends
+    offset = models.BigIntegerField(default=0)
+    imported = models.BigIntegerField(default=0)
+    failed = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+
+class ReviewTombstoneManager(models.Manager):
+
+    def purge(self):
+        expired = timezone.now() - timedelta(seconds=settings.REVIEW_TOMBSTONE_RETENTION)
+        return self.filter(deleted_at__lt=expired).delete()[0]
+
+
+class ReviewTombstone(models.Model):
+    """
+    Deleted review, so clients syncing the reviews since a watermark learn
+    about it. Kept for REVIEW_TOMBSTONE_RETENTION; older watermarks can't be
+    synced from.
+    """
+
+    # not foreign keys, the review is gone and its reviewer may be deleted along with it
+    review_id = models.IntegerField()
+    reviewer_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = ReviewTombstoneManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewer_id', 'deleted_at', 'review_id'], name='tombstone_reviewer_deleted_idx'),
+        ]
+
+
+class IdempotencyKeyManager(models.Manager):
+
+    def claim(self, user, key, request_hash):
+        """
+        Return the record of the user's key and whether it was created, as
+        get_or_create does. Expired records are replaced. Call it in the
+        transaction that stores the response: a concurrent request with the
+        same key waits on the unique index until that transaction ends, and
+        then gets the completed record.
+        """
+        expired = timezone.now() - timedelta(seconds=settings.REVIEW_IDEMPOTENCY_KEY_TTL)
+        self.filter(user=user, key=key, created__lt=expired).delete()
+        try:
+            with transaction.atomic(using=self.db):
+                return self.create(user=user, key=key, request_hash=request_hash), True
+        except IntegrityError:
+            return self.get(user=user, key=key), False
+
+    def purge(self):
+        expired = timezone.now() - timedelta(seconds=settings.REVIEW_IDEMPOTENCY_KEY_TTL)
+        return self.filter(created__lt=expired).delete()[0]
+
+
+class IdempotencyKey(models.Model):
+    """Response to a request sent with an Idempotency-Key header, replayed to its retries."""
+
+    user = models.ForeignKey('authentication.User', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # null until the response is stored, in the same transaction
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = IdempotencyKeyManager()
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+
+class CompanyManager(models.Manager):
+
+    def upsert(self, company_id, **fields):
+        """
+        Create or update a company keyed by company_id without taking a row
+        lock, writing only when the given fields differ from the stored ones.
+        Companies known to be unchanged are served from the company cache,
+        reading only their pk.
+        """
+        cached = company_cache.get(company_id, **fields)
+        if cached is not None:
+            # another process may have deleted the company since, and its reviews would fail the foreign key
+            if self.filter(pk=cached['id'], company_id=company_id).exists():
+                # updated_at is left deferred
+                field_names = ['id', 'name', 'company_id', 'website']
+                return self.model.from_db(self.db, field_names, [cached[name] for name in field_names])
+            company_cache.invalidate(self.model(pk=cached['id'], company_id=company_id))
+
+        try:
+            company = self.get(company_id=company_id)
+        except self.model.DoesNotExist:
+            company = None
+        else:
+            if all(getattr(company, field) == value for field, value in fields.items()):
+                return self._cache_on_commit(company)
+
+        if connections[self.db].vendor == 'postgresql':
+            upserted = self._upsert_on_conflict(company_id, fields)
+            if company is not None:
+                self.mark_changed([company.pk])
+            else:
+                transaction.on_commit(bump_companies_version, using=self.db)
+            return self._cache_on_commit(upserted)
+
+        if company is None:
+            try:
+                with transaction.atomic(using=self.db):
+                    return self._cache_on_commit(self.create(company_id=company_id, **fields))
+            except IntegrityError:
+                company = self.get(company_id=company_id)
+        self.filter(pk=company.pk).update(updated_at=timezone.now(), **fields)
+        company_cache.invalidate(company)
+        self.mark_changed([company.pk])
+        for field, value in fields.items():
+            setattr(company, field, value)
+        return self._cache_on_commit(company)
+
+    def mark_changed(self, pks):
+        """
+        Record a change of the name or website of the companies, after writing
+        it with their updated_at, which ?since= syncs pick up. The companies
+        version and the version of each company, that review list pages
+        listing it are validated against, change once the transaction commits.
+        Their reviews aren't touched, a company can have any number of them.
+        """
+        transaction.on_commit(lambda: bump_company_versions(pks), using=self.db)
+
+    def _cache_on_commit(self, company):
+        # Rows written or read inside a transaction that rolls back must not be cached
+        transaction.on_commit(lambda: company_cache.set(company), using=self.db)
+        return company
+
+    def _upsert_on_conflict(self, company_id, fields):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        columns = ['company_id'] + list(fields) + ['updated_at']
+        field_names = ['id', 'name', 'company_id', 'website']
+        if fields:
+            conflict = 'DO UPDATE SET {updates} WHERE ({current}) IS DISTINCT FROM ({excluded})'.format(
+                updates=', '.join('{0} = EXCLUDED.{0}'.format(qn(column)) for column in columns[1:]),
+                current=', '.join('{}.{}'.format(table, qn(field)) for field in fields),
+                excluded=', '.join('EXCLUDED.{}'.format(qn(field)) for field in fields),
+            )
+        else:
+            conflict = 'DO NOTHING'
+        sql = (
+            'INSERT INTO {table} ({columns}) VALUES ({values}) '
+            'ON CONFLICT ({company_id}) {conflict} RETURNING {returning}'
+        ).format(
+            table=table,
+            columns=', '.join(qn(column) for column in columns),
+            values=', '.join(['%s'] * len(columns)),
+            company_id=qn('company_id'),
+            conflict=conflict,
+            returning=', '.join(qn(field) for field in field_names),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [company_id] + list(fields.values()) + [timezone.now()])
+            row = cursor.fetchone()
+        if row is None:
+            # A concurrent request already wrote the same values
+            return self.get(company_id=company_id)
+        return self.model.from_db(self.db, field_names, row)
+
+    def upsert_many(self, companies_data):
+        """
+        Create or update the given companies, keyed by company_id, with one
+        query to read the existing rows and one bulk insert for the new ones.
+        Return a dict of company_id to Company.
+        """
+        incoming = {data['company_id']: data for data in companies_data}
+        companies = self.in_bulk(list(incoming), field_name='company_id')
+
+        changed = []
+        for company_id, company in companies.items():
+            changes = {
+                field: value for field, value in incoming[company_id].items()
+                if getattr(company, field) != value
+            }
+            if changes:
+                self.filter(pk=company.pk).update(updated_at=timezone.now(), **changes)
+                company_cache.invalidate(company)
+                changed.append(company.pk)
+                for field, value in changes.items():
+                    setattr(company, field, value)
+        if changed:
+            self.mark_changed(changed)
+
+        new = [self.model(**data) for company_id, data in incoming.items() if company_id not in companies]
+        if new:
+            try:
+                with transaction.atomic(using=self.db):
+                    self.bulk_create(new)
+            except IntegrityError:
+                # Another request inserted some of these companies meanwhile
+                for company in new:
+                    self.upsert(**incoming[company.company_id])
+            else:
+                # bulk_create doesn't send post_save
+                transaction.on_commit(bump_companies_version, using=self.db)
+            companies.update({company.company_id: company for company in new if company.pk})
+            # Only some backends set the primary keys on bulk insert
+            missing = [company.company_id for company in new if not company.pk]
+            companies.update(self.in_bulk(missing, field_name='company_id'))
+        return companies
+
 
 class Company(models.Model):
     name = models.CharField(max_length=64)
     company_id = models.IntegerField(unique=True)
     website = models.URLField(null=True, blank=True)
+    # not set by queryset.update(), which must set it for the change to be synced
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CompanyManager()
+
+
+RATINGS = range(1, 6)
+
+
+class CompanyStatsManager(models.Manager):
+    # companies updated by one statement, bounded by the backend's max query params
+    update_batch_size = 100
+
+    def add_reviews(self, reviews, sign=1):
+        """
+        Add the ratings of the given reviews to the stats of their companies
+        (or remove them, with sign=-1). Existing rows are changed by one UPDATE
+        with F-expressions, so concurrent reviews don't overwrite each other,
+        and missing rows are inserted in bulk.
+        """
+        deltas = defaultdict(Counter)
+        for review in reviews:
+            delta = deltas[review.company_id]
+            delta['review_count'] += sign
+            delta['rating_sum'] += sign * review.rating
+            delta['rating_{}'.format(review.rating)] += sign
+
+        company_ids = list(deltas)
+        for start in range(0, len(company_ids), self.update_batch_size):
+            batch = {company_id: deltas[company_id] for company_id in company_ids[start:start + self.update_batch_size]}
+            updated = self.filter(company_id__in=batch).update(**self._updates(batch))
+            if updated < len(batch) and sign > 0:
+                self._create_missing(batch)
+
+    def _updates(self, deltas):
+        fields = set().union(*deltas.values())
+        updates = {}
+        for field in fields:
+            # one branch per distinct delta, few since most companies get one or two reviews
+            company_ids = defaultdict(list)
+            for company_id, delta in deltas.items():
+                if delta[field]:
+                    company_ids[delta[field]].append(company_id)
+            updates[field] = F(field) + Case(
+                *[When(company_id__in=ids, then=Value(value)) for value, ids in company_ids.items()],
+                default=Value(0), output_field=models.IntegerField()
+            )
+        return updates
+
+    def _create_missing(self, deltas):
+        existing = set(self.filter(company_id__in=deltas).values_list('company_id', flat=True))
+        missing = {company_id: delta for company_id, delta in deltas.items() if company_id not in existing}
+        try:
+            with transaction.atomic(using=self.db):
+                self.bulk_create(self.model(company_id=company_id, **delta) for company_id, delta in missing.items())
+        except IntegrityError:
+            # Some were created by concurrent reviews meanwhile
+            for company_id, delta in missing.items():
+                if not self.filter(company_id=company_id).update(**self._updates({company_id: delta})):
+                    self.create(company_id=company_id, **delta)
+
+    def rebuild(self):
+        """Recompute the stats of every company from its reviews."""
+        aggregates = {'rating_{}'.format(rating): Count('pk', filter=Q(rating=rating)) for rating in RATINGS}
+        rows = Review.objects.order_by().values('company_id').annotate(
+            review_count=Count('pk'), rating_sum=Sum('rating'), **aggregates
+        )
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.bulk_create(self.model(**row) for row in rows.iterator())
+
+
+class CompanyStats(models.Model):
+    """Rating aggregates of a company, kept up to date on review writes."""
+
+    company = models.OneToOneField(
+        'review.Company', on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    objects = CompanyStatsManager()
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    @property
+    def histogram(self):
+        return {str(rating): getattr(self, 'rating_{}'.format(rating)) for rating in RATINGS}
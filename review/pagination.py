@@ -0,0 +1,132 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ReviewCursorPagination(BasePagination):
+    """
+    Keyset pagination over (submission_date, id), newest first.
+
+    The cursor carries the position of the last row of the current page, so
+    the next page is a range scan over the (reviewer, submission_date, id)
+    index instead of an OFFSET that gets slower the deeper the client pages.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        # Fetch one extra row to know whether there is a next page.
+        results = self.get_rows(queryset, position, self.page_size + 1)
+        archived = view.get_archived_queryset() if hasattr(view, 'get_archived_queryset') else None
+        if archived is not None:
+            results = sorted(
+                results + self.get_rows(archived, position, self.page_size + 1),
+                key=self.get_position, reverse=True
+            )[:self.page_size + 1]
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_rows(self, queryset, position, limit):
+        queryset = queryset.order_by('-submission_date', '-id')
+        if position is not None:
+            submission_date, pk = position
+            queryset = queryset.filter(
+                Q(submission_date__lt=submission_date) |
+                Q(submission_date=submission_date, id__lt=pk)
+            )
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(*self.get_position(self.page[-1]))
+        )
+
+    def get_position(self, item):
+        # pages may hold model instances or .values() rows
+        if isinstance(item, dict):
+            return item['submission_date'], item['id']
+        return item.submission_date, item.id
+
+    def encode_cursor(self, submission_date, pk):
+        position = '{}|{}'.format(submission_date.isoformat(), pk)
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            submission_date, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.strptime(submission_date, '%Y-%m-%d').date(), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ReviewSearchPagination(ReviewCursorPagination):
+    """
+    Page number pagination for ranked search results, which have no stable
+    position to build a cursor from. No total count is computed.
+    """
+
+    page_query_param = 'page'
+    page_size = 20
+    max_page_size = 100
+    invalid_page_message = _('Invalid page')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * self.page_size
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
@@ -0,0 +1,191 @@
+"""
+Monthly partitioning of review_review by submission_date, on Postgres 11+.
+
+`partition_review_table` rebuilds the table as a partitioned one, keeping its
+columns, sequence, indexes, foreign keys and search trigger. The partitions
+are named review_review_pYYYYMM, and a default partition holds the rows of
+months without their own. Other databases keep a plain table, which
+`archive_reviews` handles with deletes instead of dropping partitions.
+
+The primary key of a partitioned table must include the partition key, so it
+is (id, submission_date) and only makes ids unique within a partition. Ids
+come from the review_review_id_seq sequence, and `enforce_unique_ids` keeps
+the id of every row in review_review_id, whose primary key rejects an id
+already used by another partition.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+PARENT = 'review_review'
+PARTITION = 'review_review_p{:%Y%m}'
+DEFAULT_PARTITION = 'review_review_default'
+UNIQUE_IDS = [
+    'CREATE TABLE review_review_id (id integer PRIMARY KEY)',
+    'INSERT INTO review_review_id SELECT id FROM review_review',
+    """
+    CREATE FUNCTION review_review_unique_id() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM review_review_id WHERE id = OLD.id;
+        ELSE
+            INSERT INTO review_review_id (id) VALUES (NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # on the partitioned table, so Postgres adds it to every partition, future ones included. A row
+    # moved to another partition by an update is deleted and inserted, and fires both.
+    """
+    CREATE TRIGGER review_review_unique_id AFTER INSERT OR DELETE ON review_review
+    FOR EACH ROW EXECUTE PROCEDURE review_review_unique_id()
+    """,
+    # updating an id would bypass the check
+    """
+    CREATE FUNCTION review_review_keep_id() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'review ids can''t be changed';
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER review_review_keep_id AFTER UPDATE OF id ON review_review
+    FOR EACH ROW WHEN (OLD.id IS DISTINCT FROM NEW.id) EXECUTE PROCEDURE review_review_keep_id()
+    """,
+]
+DROP_UNIQUE_IDS = [
+    'DROP TRIGGER review_review_keep_id ON review_review',
+    'DROP FUNCTION review_review_keep_id()',
+    'DROP TRIGGER review_review_unique_id ON review_review',
+    'DROP FUNCTION review_review_unique_id()',
+    'DROP TABLE review_review_id',
+]
+SEARCH_TRIGGER = """
+    CREATE TRIGGER review_review_search_vector BEFORE INSERT OR UPDATE OF title, summary
+    ON {} FOR EACH ROW EXECUTE PROCEDURE review_review_search_vector()
+"""
+
+
+def supports_partitioning(connection):
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+
+def is_partitioned(connection):
+    if not supports_partitioning(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [PARENT])
+        return cursor.fetchone() is not None
+
+
+def month_start(day, months=0):
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_review_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not supports_partitioning(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE review_review RENAME TO review_review_old')
+        cursor.execute("""
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = 'review_review_old' AND indexname != 'review_review_pkey'
+        """)
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = 'review_review_old'::regclass AND contype = 'f'
+        """)
+        foreign_keys = cursor.fetchall()
+        cursor.execute('SELECT min(submission_date) FROM review_review_old')
+        oldest = cursor.fetchone()[0] or date.today()
+
+        cursor.execute("""
+            CREATE TABLE review_review (LIKE review_review_old INCLUDING DEFAULTS)
+            PARTITION BY RANGE (submission_date)
+        """)
+        cursor.execute('ALTER SEQUENCE review_review_id_seq OWNED BY review_review.id')
+        create_partitions(connection, month_start(oldest), month_start(date.today(), settings.REVIEW_PARTITIONS_AHEAD))
+        cursor.execute('INSERT INTO review_review SELECT * FROM review_review_old')
+        cursor.execute('DROP TABLE review_review_old')
+
+        # partitioned tables need the partition key in the primary key
+        cursor.execute('ALTER TABLE review_review ADD PRIMARY KEY (id, submission_date)')
+        for indexdef in indexes:
+            cursor.execute(indexdef.replace(' ON public.review_review_old ', ' ON review_review ')
+                                   .replace(' ON review_review_old ', ' ON review_review '))
+        for name, definition in foreign_keys:
+            cursor.execute('ALTER TABLE review_review ADD CONSTRAINT {} {}'.format(name, definition))
+
+
+def enforce_unique_ids(apps, schema_editor):
+    if is_partitioned(schema_editor.connection):
+        with schema_editor.connection.cursor() as cursor:
+            for statement in UNIQUE_IDS:
+                cursor.execute(statement)
+
+
+def allow_duplicate_ids(apps, schema_editor):
+    if is_partitioned(schema_editor.connection):
+        with schema_editor.connection.cursor() as cursor:
+            for statement in DROP_UNIQUE_IDS:
+                cursor.execute(statement)
+
+
+def create_partitions(connection, start, end):
+    """
+    Create the missing monthly partitions from the month of `start` through
+    the month of `end`, moving the rows of their months out of the default
+    partition.
+    """
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [DEFAULT_PARTITION])
+        if cursor.fetchone() is None:
+            _create_partition(cursor, DEFAULT_PARTITION, 'DEFAULT')
+        month = month_start(start)
+        while month <= end:
+            name = PARTITION.format(month)
+            cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [name])
+            if cursor.fetchone() is None:
+                _create_month_partition(cursor, name, month, month_start(month, 1))
+            month = month_start(month, 1)
+
+
+def _create_month_partition(cursor, name, start, end):
+    # a partition can't be created while the default partition holds rows of its range
+    in_range = 'submission_date >= %s AND submission_date < %s'
+    cursor.execute('SELECT 1 FROM {} WHERE {} LIMIT 1'.format(DEFAULT_PARTITION, in_range), [start, end])
+    moved = cursor.fetchone() is not None
+    if moved:
+        cursor.execute('CREATE TEMPORARY TABLE review_review_moved (LIKE {})'.format(PARENT))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM {} WHERE {} RETURNING *) '
+            'INSERT INTO review_review_moved SELECT * FROM moved'.format(DEFAULT_PARTITION, in_range),
+            [start, end]
+        )
+    _create_partition(cursor, name, "FOR VALUES FROM ('{}') TO ('{}')".format(start, end))
+    if moved:
+        cursor.execute('INSERT INTO {} SELECT * FROM review_review_moved'.format(PARENT))
+        cursor.execute('DROP TABLE review_review_moved')
+
+
+def _create_partition(cursor, name, bounds):
+    # Postgres < 13 has no row triggers on partitioned tables, each partition gets the search trigger
+    cursor.execute('CREATE TABLE {} PARTITION OF {} {}'.format(name, PARENT, bounds))
+    cursor.execute(SEARCH_TRIGGER.format(name))
+
+
+def partitions_before(connection, cutoff):
+    """Names of the monthly partitions holding only rows older than `cutoff`."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass AND child.relname != %s
+        """, [PARENT, DEFAULT_PARTITION])
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(name for name in names if name < PARTITION.format(month_start(cutoff)))
@@ -0,0 +1,15 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Newline-delimited JSON, one compact document per line.
+
+    Error responses are a single document, so they are still valid NDJSON.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_lines(self, rows):
+        return b''.join(self.render(row) + b'\n' for row in rows)
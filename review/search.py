@@ -0,0 +1,107 @@
+"""
+Full-text search over review title and summary.
+
+On Postgres the reviews have a weighted `search_vector` tsvector column with
+a GIN index; on SQLite an FTS5 table indexes them. Both are kept current by
+triggers on review_review, created by the review migrations.
+
+Long summaries are stored compressed on SQLite (see `review.fields`), and its
+triggers decompress them with the `review_summary_text` SQL function
+registered on each connection. Postgres stores them as text, so its trigger
+reads them as they are.
+"""
+from django.db import connections
+
+from .fields import decompress
+from .models import Review
+
+
+def register_search_functions(connection):
+    """Register the SQL functions the SQLite search triggers use."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('review_summary_text', 1, decompress)
+
+
+POSTGRES_SEARCH = """
+    SELECT review.id FROM review_review review, plainto_tsquery('english', %s) query
+    WHERE review.reviewer_id = %s AND review.search_vector @@ query
+    ORDER BY ts_rank(review.search_vector, query) DESC, review.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+SQLITE_SEARCH = """
+    SELECT review.id FROM review_review_fts fts JOIN review_review review ON review.id = fts.rowid
+    WHERE review_review_fts MATCH %s AND review.reviewer_id = %s
+    ORDER BY fts.rank, review.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+class ReviewSearch:
+    """
+    Reviews of a reviewer matching a search query, best matches first.
+
+    Slicing it runs the ranked search for that page only, so it can be
+    paginated like a queryset.
+    """
+
+    def __init__(self, reviewer, query, using='default', only=None):
+        self.reviewer = reviewer
+        self.query = query
+        self.using = using
+        # columns to load, all of them by default
+        self.only = only
+
+    def __getitem__(self, page):
+        assert isinstance(page, slice) and page.step is None, 'ReviewSearch only supports slicing'
+        offset = page.start or 0
+        ids = self._search(offset, page.stop - offset)
+        reviews = self._queryset().in_bulk(ids)
+        return [reviews[pk] for pk in ids if pk in reviews]
+
+    def _queryset(self):
+        queryset = Review.objects.using(self.using)
+        if self.only is None:
+            return queryset.select_related('company', 'reviewer')
+        relations = {column.split('__')[0] for column in self.only if '__' in column}
+        return queryset.select_related(*relations).only(*self.only, *relations)
+
+    def _search(self, offset, limit):
+        connection = connections[self.using]
+        if connection.vendor == 'postgresql':
+            sql, query = POSTGRES_SEARCH, self.query
+        else:
+            sql, query = SQLITE_SEARCH, fts_query(self.query)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [query, self.reviewer.pk, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+# larger ids can't be compared with integer columns
+MAX_ID = 2 ** 31 - 1
+
+
+def parse_id(term):
+    """Return the search term as an id, None when it can't be one."""
+    if term.isdigit() and int(term) <= MAX_ID:
+        return int(term)
+    return None
+
+
+def fts_query(query):
+    # every term quoted, so the user input isn't parsed as FTS5 query syntax
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+def filter_by_search(queryset, query):
+    """
+    Filter a Review queryset to the reviews matching a search query, of
+    every reviewer, with the full-text index. The matches keep the order of
+    the queryset instead of being ranked.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        where = "review_review.search_vector @@ plainto_tsquery('english', %s)"
+    else:
+        where = 'review_review.id IN (SELECT rowid FROM review_review_fts WHERE review_review_fts MATCH %s)'
+        query = fts_query(query)
+    return queryset.extra(where=[where], params=[query])
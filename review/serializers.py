@@ -1,6 +1,16 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from reviews_api.metrics import SerializationMetricsMixin, measure_serialization
 
-from review.models import Review, Company
+from review.cache import bump_review_list_version
+from review.models import Review, Company, CompanyStats
 
 
 class ReviewCompanySerializer(serializers.ModelSerializer):
@@ -11,10 +21,49 @@ class ReviewCompanySerializer(serializers.ModelSerializer):
         fields = ('name', 'company_id', 'website')
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewBatchSerializer(SerializationMetricsMixin, serializers.ListSerializer):
+    default_error_messages = {
+        'max_length': _('Ensure this list has no more than {max_length} items.'),
+    }
+
+    def to_internal_value(self, data):
+        # checked before validating each item, so oversized batches are cheap to reject
+        max_length = settings.REVIEW_BATCH_MAX_SIZE
+        if isinstance(data, list) and len(data) > max_length:
+            message = self.error_messages['max_length'].format(max_length=max_length)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            companies = Company.objects.upsert_many(attrs['company'] for attrs in validated_data)
+            reviews = []
+            for attrs in validated_data:
+                company_data = attrs.pop('company')
+                reviews.append(Review(company=companies[company_data['company_id']], **attrs))
+            Review.objects.bulk_create(reviews)
+            # bulk_create doesn't send post_save
+            CompanyStats.objects.add_reviews(reviews)
+            for reviewer_id in {review.reviewer_id for review in reviews}:
+                transaction.on_commit(lambda reviewer_id=reviewer_id: bump_review_list_version(reviewer_id))
+        return reviews
+
+
+class ReviewSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
     reviewer = serializers.StringRelatedField(read_only=True)
     company = ReviewCompanySerializer()
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """`fields` limits the output to the given fields, as parsed by `parse_fields`."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+            if 'company' in fields:
+                company = self.fields['company']
+                for name in set(company.fields) - set(fields['company']):
+                    company.fields.pop(name)
+
     class Meta:
         model = Review
         fields = (
@@ -22,12 +71,135 @@ class ReviewSerializer(serializers.ModelSerializer):
             'company', 'reviewer'
         )
         read_only_fields = ('ip_address', 'reviewer', 'submission_date')
+        list_serializer_class = ReviewBatchSerializer
 
     def create(self, validated_data):
         company_data = validated_data.pop('company')
-        company, _ = Company.objects.update_or_create(
-            company_id=company_data.pop('company_id'),
-            defaults=company_data
-        )
-        review = Review.objects.create(company=company, **validated_data)
+        # the company stats are updated along with the review, on post_save
+        with transaction.atomic():
+            company = Company.objects.upsert(**company_data)
+            review = Review.objects.create(company=company, **validated_data)
         return review
+
+
+class ReviewValuesSerializer:
+    """
+    Read-only fast path of ReviewSerializer for rows fetched with
+    `queryset.values(*serializer.get_values())`. It gives the same
+    representation without building model instances or serializer fields.
+    """
+
+    values = (
+        'id', 'rating', 'title', 'summary', 'ip_address', 'submission_date',
+        'company__name', 'company__company_id', 'company__website',
+        'reviewer__first_name', 'reviewer__last_name',
+    )
+    # columns read for each field, the company ones per company field
+    field_values = {
+        'rating': ('rating',),
+        'title': ('title',),
+        'summary': ('summary',),
+        'ip_address': ('ip_address',),
+        'submission_date': ('submission_date',),
+        'company': {field: 'company__{}'.format(field) for field in ReviewCompanySerializer.Meta.fields},
+        'reviewer': ('reviewer__first_name', 'reviewer__last_name'),
+    }
+    error_messages = {
+        'unknown_fields': _('Unknown fields: {}.'),
+        'no_fields': _('Select at least one field.'),
+    }
+
+    def __init__(self, fields=None):
+        """`fields` limits the output to the given fields, as parsed by `parse_fields`."""
+        self.fields = fields
+
+    @classmethod
+    def parse_fields(cls, value):
+        """
+        Parse a comma separated list of review fields, where `company.<field>`
+        selects a field of the company and `company` all of them, into a dict
+        of field name to the company fields (None for the others), in the
+        order of the serializer fields. None selects every field.
+        """
+        if value is None:
+            return None
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        company_fields = ReviewCompanySerializer.Meta.fields
+        known = set(ReviewSerializer.Meta.fields) | {'company.{}'.format(field) for field in company_fields}
+        unknown = requested - known
+        if unknown:
+            message = cls.error_messages['unknown_fields'].format(', '.join(sorted(unknown)))
+            raise serializers.ValidationError({'fields': [message]})
+        if not requested:
+            raise serializers.ValidationError({'fields': [cls.error_messages['no_fields']]})
+
+        fields = OrderedDict()
+        for name in ReviewSerializer.Meta.fields:
+            if name == 'company':
+                selected = tuple(field for field in company_fields
+                                 if 'company' in requested or 'company.{}'.format(field) in requested)
+                if selected:
+                    fields[name] = selected
+            elif name in requested:
+                fields[name] = None
+        return fields
+
+    def get_values(self):
+        """Columns to read for the selected fields, with the ones the pagination needs."""
+        if self.fields is None:
+            return self.values
+        values = ['id', 'submission_date']
+        for name, company_fields in self.fields.items():
+            if name == 'company':
+                values += [self.field_values['company'][field] for field in company_fields]
+            else:
+                values += [value for value in self.field_values[name] if value not in values]
+        return tuple(values)
+
+    def to_representation(self, row):
+        if self.fields is not None:
+            return self.to_sparse_representation(row)
+        submission_date = row['submission_date']
+        return {
+            'rating': row['rating'],
+            'title': row['title'],
+            'summary': row['summary'],
+            'ip_address': row['ip_address'],
+            'submission_date': submission_date.isoformat() if submission_date else None,
+            'company': {
+                'name': row['company__name'],
+                'company_id': row['company__company_id'],
+                'website': row['company__website'],
+            },
+            # same as User.get_full_name
+            'reviewer': '{} {}'.format(row['reviewer__first_name'], row['reviewer__last_name']).strip(),
+        }
+
+    def to_sparse_representation(self, row):
+        data = {}
+        for name, company_fields in self.fields.items():
+            if name == 'company':
+                data['company'] = {field: row['company__{}'.format(field)] for field in company_fields}
+            elif name == 'submission_date':
+                data[name] = row[name].isoformat() if row[name] else None
+            elif name == 'reviewer':
+                data[name] = '{} {}'.format(row['reviewer__first_name'], row['reviewer__last_name']).strip()
+            else:
+                data[name] = row[name]
+        return data
+
+    def to_representations(self, rows):
+        to_representation = self.to_representation
+        with measure_serialization():
+            return [to_representation(row) for row in rows]
+
+
+class CompanyStatsSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
+    company_id = serializers.IntegerField(source='company.company_id')
+    name = serializers.CharField(source='company.name')
+    average_rating = serializers.FloatField()
+    histogram = serializers.DictField(child=serializers.IntegerField())
+
+    class Meta:
+        model = CompanyStats
+        fields = ('company_id', 'name', 'review_count', 'average_rating', 'histogram')
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_companies_version, bump_review_list_version, company_cache
+from .models import Company, CompanyStats, Review, ReviewTombstone
+from .search import register_search_functions
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_cached_company(sender, instance, created=False, using='default', **kwargs):
+    company_cache.invalidate(instance)
+    # a new company isn't in anyone's review list yet, only in the lookup
+    if created:
+        transaction.on_commit(bump_companies_version, using=using)
+    else:
+        Company.objects.db_manager(using).mark_changed([instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_list(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_review_list_version(instance.reviewer_id))
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_reviewer_name(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._reviewer_name = None
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    if instance.pk and not raw:
+        instance._reviewer_name = type(instance).objects.filter(pk=instance.pk).values_list(
+            'first_name', 'last_name'
+        ).first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_reviewer_name(sender, instance, using='default', **kwargs):
+    # reviews are listed with the reviewer name
+    transaction.on_commit(lambda: bump_review_list_version(instance.pk))
+    previous = getattr(instance, '_reviewer_name', None)
+    if previous and previous != (instance.first_name, instance.last_name):
+        # and synced with it
+        Review.objects.using(using).filter(reviewer_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Review)
+def remember_rated_company(sender, instance, raw=False, **kwargs):
+    instance._rated_company = None
+    if instance.pk and not raw:
+        instance._rated_company = Review.objects.filter(pk=instance.pk).values_list('company_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def add_to_company_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rated_company', None)
+    if previous and previous != (instance.company_id, instance.rating):
+        company_id, rating = previous
+        CompanyStats.objects.add_reviews([Review(company_id=company_id, rating=rating)], sign=-1)
+    if created or (previous and previous != (instance.company_id, instance.rating)):
+        CompanyStats.objects.add_reviews([instance])
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_company_stats(sender, instance, **kwargs):
+    CompanyStats.objects.add_reviews([instance], sign=-1)
+
+
+@receiver(post_delete, sender=Review)
+def add_tombstone(sender, instance, using='default', **kwargs):
+    ReviewTombstone.objects.using(using).create(review_id=instance.pk, reviewer_id=instance.reviewer_id)
+
+
+@receiver(connection_created)
+def register_sql_functions(sender, connection, **kwargs):
+    register_search_functions(connection)
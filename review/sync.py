@@ -0,0 +1,96 @@
+"""
+Changes of a user's reviews since a watermark, for clients keeping a local
+copy of them.
+
+Changes are ordered by (changed_at, id) for changed reviews, where changed_at
+is the latest updated_at of the review and of its company, and by
+(deleted_at, review_id) for deleted ones, and the watermark is the position
+of the last change a client got. Only changes older than REVIEW_SYNC_DELAY
+are returned: a transaction that is still open when its change is that old
+could commit it behind a watermark already handed out.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import APIException, ValidationError
+
+
+class WatermarkExpired(APIException):
+    status_code = 410
+    default_detail = _('Deletions older than this watermark are forgotten, sync again from an empty watermark.')
+    default_code = 'watermark_expired'
+
+
+invalid_watermark_message = _('Invalid watermark.')
+
+
+def encode_watermark(changed_at, pk):
+    position = '{}|{}'.format(changed_at.isoformat(), pk)
+    return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+
+def decode_watermark(value):
+    """Return the (changed_at, id) position of a watermark, None for an empty one."""
+    if not value:
+        return None
+    try:
+        changed_at, pk = urlsafe_b64decode(value.encode('ascii')).decode('ascii').split('|')
+        position = parse_datetime(changed_at), int(pk)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValidationError({'since': [invalid_watermark_message]})
+    if position[0] is None or timezone.is_naive(position[0]):
+        raise ValidationError({'since': [invalid_watermark_message]})
+    return position
+
+
+def changes_since(reviews, tombstones, since, limit):
+    """
+    Return the first `limit` changes after the `since` position, as the
+    changed rows of `reviews`, a values() queryset with id and changed_at,
+    the ids of the reviews deleted from `tombstones`, the watermark to sync
+    from next and whether more changes follow it.
+    """
+    now = timezone.now()
+    if since is not None and since[0] < now - timedelta(seconds=settings.REVIEW_TOMBSTONE_RETENTION):
+        raise WatermarkExpired()
+    horizon = now - timedelta(seconds=settings.REVIEW_SYNC_DELAY)
+
+    changes = [
+        ((row['changed_at'], row['id']), row)
+        for row in _after(reviews, 'changed_at', 'id', since, horizon, limit + 1)
+    ]
+    # a client syncing from the start has none of the deleted reviews
+    if since is not None:
+        changes += [
+            ((deleted_at, review_id), None)
+            for deleted_at, review_id in _after(
+                tombstones.values_list('deleted_at', 'review_id'), 'deleted_at', 'review_id', since, horizon, limit + 1
+            )
+        ]
+    changes.sort(key=lambda change: change[0])
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    rows = [row for position, row in changes if row is not None]
+    deleted = [position[1] for position, row in changes if row is None]
+    positions = [position for position in (since, changes and changes[-1][0]) if position]
+    if not more:
+        # everything up to the horizon was returned, so clients without changes don't fall behind
+        positions.append((horizon, 0))
+    return rows, deleted, encode_watermark(*max(positions)), more
+
+
+def _after(queryset, changed_at, pk, since, horizon, limit):
+    queryset = queryset.filter(**{'{}__lte'.format(changed_at): horizon}).order_by(changed_at, pk)
+    if since is not None:
+        queryset = queryset.filter(
+            Q(**{'{}__gt'.format(changed_at): since[0]}) |
+            Q(**{changed_at: since[0], '{}__gt'.format(pk): since[1]})
+        )
+    return list(queryset[:limit])
@@ -1,5 +1,22 @@
-from datetime import date
+import csv
+import gzip
+import json
+import os
+import sys
+import tempfile
 
+from base64 import b64encode
+from datetime import date, timedelta
+from io import StringIO
+from operator import itemgetter
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from parameterized import parameterized
@@ -9,8 +26,22 @@ from rest_framework.reverse import reverse_lazy
 
 from reviews_api.tests import BaseTestCase, generate_string_with_size
 
-from review.serializers import ReviewSerializer
-from review.models import Company, Review
+from review.cache import CompanyCache, company_cache
+from review.fields import COMPRESSED_HEADER, is_compressed
+from review.importer import ReviewImporter, decode_lines
+from review.archive import archive_reviews
+from review.ingestion import ReviewJournal, get_review_journal
+from review.partitions import (
+    DEFAULT_PARTITION, PARTITION, _create_month_partition, create_partitions, is_partitioned, month_start,
+    partitions_before, supports_partitioning
+)
+from review.pagination import ReviewCursorPagination
+from review.serializers import ReviewSerializer, ReviewValuesSerializer
+from review.sync import encode_watermark
+from review.models import (
+    ArchivedReview, Company, CompanyStats, IdempotencyKey, Review, ReviewImport, ReviewReceipt, ReviewTombstone
+)
+from review.views import ReviewExportView
 
 
 class ReviewTestCase(BaseTestCase):
@@ -200,7 +231,7 @@ class ReviewTestCase(BaseTestCase):
         response = self.client.get(self.URL)
         self.assertEquals(
             ReviewSerializer(review).to_representation(review),
-            response.json()[0]
+            response.json()['results'][0]
         )
 
     def test_user_only_can_see_his_reviews(self):
@@ -211,7 +242,7 @@ class ReviewTestCase(BaseTestCase):
         self._review_recipe.make(reviewer=another_user)
         response = self.client.get(self.URL)
         self.assertEquals(
-            len(response.json()),
+            len(response.json()['results']),
             2
         )
 
@@ -248,3 +279,1635 @@ class ReviewTestCase(BaseTestCase):
         data = self._default_review_data()
         response = self.client.post(self.URL, data, format='json')
         self.assertEquals(401, response.status_code)
+
+
+class ReviewPaginationTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def _walk_pages(self, page_size):
+        titles = []
+        url = '{}?page_size={}'.format(self.URL, page_size)
+        while url:
+            response = self.client.get(url).json()
+            titles.extend(item['title'] for item in response['results'])
+            url = response['next']
+        return titles
+
+    def test_list_is_paginated(self):
+        self.authenticate()
+        self._review_recipe.make(_quantity=3)
+        response = self.client.get(self.URL, {'page_size': 2}).json()
+        self.assertEquals(len(response['results']), 2)
+        self.assertTrue(response['next'])
+
+    def test_last_page_has_no_next_link(self):
+        self.authenticate()
+        self._review_recipe.make(_quantity=2)
+        response = self.client.get(self.URL, {'page_size': 2}).json()
+        self.assertIsNone(response['next'])
+
+    def test_pages_are_ordered_newest_first_without_gaps_or_repeats(self):
+        self.authenticate()
+        reviews = self._review_recipe.make(_quantity=7)
+        old = reviews[0]
+        Review.objects.filter(pk=old.pk).update(submission_date=date(2018, 1, 1))
+        titles = self._walk_pages(page_size=3)
+        expected = [r.title for r in sorted(reviews[1:], key=lambda r: r.id, reverse=True)] + [old.title]
+        self.assertEquals(titles, expected)
+
+    def test_page_size_is_capped(self):
+        self.authenticate()
+        self._review_recipe.make(_quantity=3)
+        with mock.patch.object(ReviewCursorPagination, 'max_page_size', 2):
+            response = self.client.get(self.URL, {'page_size': 100000})
+        self.assertEquals(len(response.json()['results']), 2)
+
+    def test_invalid_cursor_returns_404(self):
+        self.authenticate()
+        response = self.client.get(self.URL, {'cursor': 'invalid'})
+        self.assertEquals(404, response.status_code)
+
+
+class ReviewQueryBudgetTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def _default_review_data(self):
+        return {
+            "rating": 5,
+            "title": self.faker.sentence()[:64],
+            "summary": self.faker.paragraph(),
+            "company": {
+                "name": self.faker.company(),
+                "company_id": self.faker.numerify(),
+            }
+        }
+
+    @parameterized.expand([
+        (1,),
+        (20,),
+    ])
+    def test_list_runs_a_constant_number_of_queries(self, quantity):
+        self.authenticate()
+        self._review_recipe.make(_quantity=quantity)
+        with self.assertNumQueries(1):
+            self.client.get(self.URL)
+
+    def test_create_query_budget(self):
+        self.authenticate()
+        # savepoint, select company, savepoint, insert company, release, insert review,
+        # update company stats, select company stats, savepoint, insert company stats,
+        # release, release
+        with self.assertNumQueries(12):
+            self.client.post(self.URL, self._default_review_data(), format='json')
+
+    def test_create_doesnt_write_unchanged_company(self):
+        self.authenticate()
+        data = self._default_review_data()
+        company = self._company_recipe.make(website=None, **data['company'])
+        CompanyStats.objects.create(company=company)
+        # savepoint, select company, insert review, update company stats, release
+        with self.assertNumQueries(5):
+            self.client.post(self.URL, data, format='json')
+        self.assertEquals(Company.objects.get(pk=company.pk).name, company.name)
+
+
+class ReviewBatchTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews_batch')
+
+    def _default_review_data(self, company_id=None, **kwargs):
+        return {
+            "rating": kwargs.pop('rating', 5),
+            "title": self.faker.sentence()[:64],
+            "summary": self.faker.paragraph(),
+            "company": {
+                "name": kwargs.pop('company__name', self.faker.company()),
+                "company_id": company_id or self.faker.numerify(),
+            }
+        }
+
+    def test_create_reviews_in_batch(self):
+        self.authenticate()
+        data = [self._default_review_data() for _ in range(3)]
+        response = self.client.post(self.URL, data, format='json')
+        self.assertEquals(201, response.status_code)
+        self.assertEquals(Review.objects.filter(reviewer=self.auth_user).count(), 3)
+
+    def test_batch_returns_created_reviews(self):
+        self.authenticate()
+        data = [self._default_review_data() for _ in range(2)]
+        response = self.client.post(self.URL, data, format='json')
+        self.assertEquals(
+            [review['title'] for review in response.json()],
+            [review['title'] for review in data]
+        )
+
+    def test_each_company_is_created_once(self):
+        self.authenticate()
+        data = [self._default_review_data(company_id=1) for _ in range(3)]
+        self.client.post(self.URL, data, format='json')
+        self.assertEquals(Company.objects.count(), 1)
+        self.assertEquals(Review.objects.filter(company__company_id=1).count(), 3)
+
+    def test_existing_company_is_updated(self):
+        self.authenticate()
+        company = self._company_recipe.make()
+        data = [self._default_review_data(company_id=company.company_id, company__name='new name')]
+        self.client.post(self.URL, data, format='json')
+        company.refresh_from_db()
+        self.assertEquals(company.name, 'new name')
+
+    def test_batch_runs_a_constant_number_of_queries(self):
+        self.authenticate()
+        existing = self._company_recipe.make()
+        data = [self._default_review_data(company_id=existing.company_id, company__name=existing.name)]
+        data += [self._default_review_data(company_id=1000 + i) for i in range(20)]
+        # savepoint, select companies, savepoint, insert companies, release,
+        # select inserted companies, insert reviews, update company stats,
+        # select company stats, savepoint, insert company stats, release, release
+        with self.assertNumQueries(13):
+            self.client.post(self.URL, data, format='json')
+
+    def test_per_item_errors_are_returned(self):
+        self.authenticate()
+        data = [self._default_review_data(), self._default_review_data(rating=6)]
+        response = self.client.post(self.URL, data, format='json')
+        self.assertEquals(400, response.status_code)
+        self.assertEquals(response.json()[0], {})
+        self.assertTrue(
+            _('Ensure this value is less than or equal to 5.') in response.json()[1]['rating']
+        )
+        self.assertEquals(Review.objects.count(), 0)
+
+    def test_batch_size_is_limited(self):
+        self.authenticate()
+        data = [self._default_review_data() for _ in range(3)]
+        with self.settings(REVIEW_BATCH_MAX_SIZE=2):
+            response = self.client.post(self.URL, data, format='json')
+        self.assertEquals(400, response.status_code)
+        self.assertTrue(
+            'Ensure this list has no more than 2 items.' in response.json()['non_field_errors']
+        )
+
+
+class ReviewExportTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews_export')
+
+    def _export(self):
+        response = self.client.get(self.URL)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_export_is_streamed_as_ndjson(self):
+        self.authenticate()
+        response, _content = self._export()
+        self.assertTrue(response.streaming)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+
+    def test_other_formats_are_not_acceptable(self):
+        self.authenticate()
+        self.assertEquals(406, self.client.get(self.URL, HTTP_ACCEPT='application/json').status_code)
+        self.assertEquals(200, self.client.get(self.URL, HTTP_ACCEPT='application/*').status_code)
+
+    def test_export_has_one_line_per_review(self):
+        self.authenticate()
+        reviews = self._review_recipe.make(_quantity=3)
+        _response, content = self._export()
+        lines = content.splitlines()
+        self.assertEquals(
+            [json.loads(line) for line in lines],
+            [ReviewSerializer(review).data for review in reviews]
+        )
+
+    def test_export_only_has_user_reviews(self):
+        self.authenticate()
+        self._review_recipe.make()
+        self._review_recipe.make(reviewer=self._user_recipe.make())
+        _response, content = self._export()
+        self.assertEquals(len(content.splitlines()), 1)
+
+    def test_export_is_written_in_chunks(self):
+        self.authenticate()
+        self._review_recipe.make(_quantity=5)
+        with mock.patch.object(ReviewExportView, 'lines_per_write', 2):
+            response = self.client.get(self.URL)
+            chunks = list(response.streaming_content)
+        self.assertEquals([len(chunk.splitlines()) for chunk in chunks], [2, 2, 1])
+
+    def test_user_must_be_autenticated(self):
+        response = self.client.get(self.URL)
+        self.assertEquals(401, response.status_code)
+
+
+class CompanyUpsertTestCase(BaseTestCase):
+
+    def test_upsert_creates_company(self):
+        company = Company.objects.upsert(company_id=1, name='name', website=None)
+        self.assertEquals(Company.objects.get(company_id=1).pk, company.pk)
+
+    def test_upsert_updates_changed_fields(self):
+        company = self._company_recipe.make()
+        Company.objects.upsert(company_id=company.company_id, name='new name')
+        company.refresh_from_db()
+        self.assertEquals(company.name, 'new name')
+
+    def test_upsert_keeps_fields_not_given(self):
+        company = self._company_recipe.make()
+        Company.objects.upsert(company_id=company.company_id, name='new name')
+        self.assertEquals(Company.objects.get(pk=company.pk).website, company.website)
+
+    def test_upsert_only_reads_unchanged_company(self):
+        company = self._company_recipe.make()
+        with self.assertNumQueries(1):
+            result = Company.objects.upsert(
+                company_id=company.company_id, name=company.name, website=company.website
+            )
+        self.assertEquals(result.pk, company.pk)
+
+
+class CompanyCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CompanyCache(maxsize=2, ttl=60)
+        company_cache.clear()
+
+    def tearDown(self):
+        company_cache.clear()
+
+    def test_cached_company_is_returned_when_fields_match(self):
+        company = self._company_recipe.make()
+        self.cache.set(company)
+        self.assertEquals(
+            self.cache.get(company.company_id, name=company.name)['id'],
+            company.pk
+        )
+
+    def test_changed_fields_are_a_miss(self):
+        company = self._company_recipe.make()
+        self.cache.set(company)
+        self.assertIsNone(self.cache.get(company.company_id, name='new name'))
+        self.assertEquals(self.cache.stats()['misses'], 1)
+
+    def test_least_recently_used_company_is_evicted(self):
+        first, second, third = self._company_recipe.make(_quantity=3)
+        self.cache.set(first)
+        self.cache.set(second)
+        self.cache.get(first.company_id)
+        self.cache.set(third)
+        self.assertIsNone(self.cache.get(second.company_id))
+        self.assertTrue(self.cache.get(first.company_id))
+        self.assertEquals(self.cache.stats()['evictions'], 1)
+
+    def test_expired_company_is_a_miss(self):
+        company = self._company_recipe.make()
+        self.cache.ttl = -1
+        self.cache.set(company)
+        self.assertIsNone(self.cache.get(company.company_id))
+
+    def test_saving_company_invalidates_it(self):
+        company = self._company_recipe.make()
+        company_cache.set(company)
+        company.name = 'new name'
+        company.save()
+        self.assertIsNone(company_cache.get(company.company_id))
+
+    def test_upsert_of_cached_unchanged_company_only_reads_its_pk(self):
+        company = self._company_recipe.make()
+        company_cache.set(company)
+        with self.assertNumQueries(1):
+            result = Company.objects.upsert(
+                company_id=company.company_id, name=company.name, website=company.website
+            )
+        self.assertEquals(result.pk, company.pk)
+
+    def test_review_of_a_company_deleted_by_another_process_is_created(self):
+        self.authenticate()
+        company = self._company_recipe.make()
+        Company.objects.filter(pk=company.pk).delete()
+        # still cached by the process that didn't delete it
+        company_cache.set(company)
+        data = {
+            'rating': 5,
+            'title': self.faker.sentence()[:64],
+            'summary': self.faker.paragraph(),
+            'company': {'name': company.name, 'company_id': company.company_id, 'website': company.website},
+        }
+        response = self.client.post(reverse_lazy('reviews'), data, format='json')
+        self.assertEquals(201, response.status_code)
+        self.assertNotEquals(company.pk, Review.objects.get().company_id)
+        self.assertEquals(1, Company.objects.count())
+
+    def test_stats_are_only_visible_to_staff(self):
+        self.authenticate()
+        response = self.client.get(reverse_lazy('company_cache_stats'))
+        self.assertEquals(403, response.status_code)
+        self.auth_user.is_staff = True
+        self.auth_user.save()
+        response = self.client.get(reverse_lazy('company_cache_stats'))
+        self.assertEquals(response.json()['maxsize'], company_cache.maxsize)
+
+
+class ReviewListConditionalTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self._review_recipe.make()
+
+    def test_list_has_etag_and_last_modified(self):
+        response = self.client.get(self.URL)
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+
+    def test_matching_etag_returns_304_without_queries(self):
+        etag = self.client.get(self.URL)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(304, response.status_code)
+
+    def test_rendered_list_is_served_from_cache(self):
+        content = self.client.get(self.URL).content
+        with self.assertNumQueries(0):
+            response = self.client.get(self.URL)
+        self.assertEquals(response.content, content)
+
+    def test_etag_depends_on_query_string(self):
+        self.assertNotEquals(
+            self.client.get(self.URL)['ETag'],
+            self.client.get(self.URL, {'page_size': 1})['ETag']
+        )
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get(self.URL)['ETag']
+        self.client.force_authenticate(self._user_recipe.make())
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(200, response.status_code)
+
+    @mock.patch('review.signals.transaction.on_commit', lambda callback, using=None: callback())
+    def test_new_review_changes_etag(self):
+        etag = self.client.get(self.URL)['ETag']
+        self._review_recipe.make()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(200, response.status_code)
+        self.assertEquals(len(response.json()['results']), 2)
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_company_change_changes_etag(self):
+        etag = self.client.get(self.URL)['ETag']
+        company = Company.objects.get()
+        company.name = 'new name'
+        company.save()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.json()['results'][0]['company']['name'], 'new name')
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_imported_company_change_changes_etag(self):
+        etag = self.client.get(self.URL)['ETag']
+        company = Company.objects.get()
+        Company.objects.upsert_many([{'company_id': company.company_id, 'name': 'new name'}])
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(200, response.status_code)
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_change_of_a_company_not_reviewed_keeps_etag(self):
+        etag = self.client.get(self.URL)['ETag']
+        company = self._company_recipe.make()
+        company.name = 'new name'
+        company.save()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(304, response.status_code)
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_company_change_keeps_etag_of_pages_without_companies(self):
+        etag = self.client.get(self.URL, {'fields': 'rating'})['ETag']
+        company = Company.objects.get()
+        company.name = 'new name'
+        company.save()
+        response = self.client.get(self.URL, {'fields': 'rating'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(304, response.status_code)
+
+    def test_company_change_doesnt_write_its_reviews(self):
+        review = Review.objects.get()
+        company = review.company
+        company.name = 'new name'
+        with self.assertNumQueries(1):
+            company.save()
+        self.assertEquals(review.updated_at, Review.objects.get().updated_at)
+
+    def test_no_etag_when_a_company_changes_while_the_page_is_read(self):
+        with mock.patch('review.views.get_companies_version', return_value='before'):
+            response = self.client.get(self.URL)
+        self.assertFalse(response.has_header('ETag'))
+
+    @override_settings(REVIEW_LIST_CACHE='default')
+    def test_no_etag_with_a_process_local_cache(self):
+        self.assertFalse(self.client.get(self.URL).has_header('ETag'))
+        with self.assertNumQueries(1):
+            self.client.get(self.URL)
+
+    @mock.patch('review.serializers.transaction.on_commit', lambda callback, using=None: callback())
+    def test_batch_creation_changes_etag(self):
+        etag = self.client.get(self.URL)['ETag']
+        data = [{
+            "rating": 5,
+            "title": self.faker.sentence()[:64],
+            "summary": self.faker.paragraph(),
+            "company": {"name": self.faker.company(), "company_id": 1}
+        }]
+        self.client.post(reverse_lazy('reviews_batch'), data, format='json')
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(200, response.status_code)
+
+
+class CompanyStatsTestCase(BaseTestCase):
+
+    def _stats_url(self, company):
+        return reverse_lazy('company_stats', kwargs={'company_id': company.company_id})
+
+    def _make_reviews(self, company, ratings):
+        for rating in ratings:
+            self._review_recipe.make(company=company, rating=rating)
+
+    def test_stats_are_updated_on_review_creation(self):
+        company = self._company_recipe.make()
+        self._make_reviews(company, [5, 4, 4])
+        stats = CompanyStats.objects.get(company=company)
+        self.assertEquals(stats.review_count, 3)
+        self.assertEquals(stats.average_rating, 13 / 3)
+        self.assertEquals(stats.histogram, {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+
+    def test_stats_are_updated_on_batch_creation(self):
+        self.authenticate()
+        data = [{
+            "rating": rating,
+            "title": self.faker.sentence()[:64],
+            "summary": self.faker.paragraph(),
+            "company": {"name": self.faker.company(), "company_id": 1}
+        } for rating in (1, 3)]
+        self.client.post(reverse_lazy('reviews_batch'), data, format='json')
+        stats = CompanyStats.objects.get(company__company_id=1)
+        self.assertEquals((stats.review_count, stats.rating_sum), (2, 4))
+
+    def test_stats_are_updated_on_review_deletion(self):
+        company = self._company_recipe.make()
+        self._make_reviews(company, [5, 1])
+        Review.objects.get(rating=1).delete()
+        stats = CompanyStats.objects.get(company=company)
+        self.assertEquals((stats.review_count, stats.rating_sum, stats.rating_1), (1, 5, 0))
+
+    def test_stats_are_moved_when_review_rating_changes(self):
+        company = self._company_recipe.make()
+        self._make_reviews(company, [5])
+        review = Review.objects.get()
+        review.rating = 2
+        review.save()
+        stats = CompanyStats.objects.get(company=company)
+        self.assertEquals((stats.review_count, stats.rating_5, stats.rating_2), (1, 0, 1))
+
+    def test_rebuild_command(self):
+        company = self._company_recipe.make()
+        self._make_reviews(company, [5, 3])
+        CompanyStats.objects.all().update(review_count=0, rating_sum=0)
+        call_command('rebuild_company_stats', stdout=StringIO())
+        stats = CompanyStats.objects.get(company=company)
+        self.assertEquals((stats.review_count, stats.rating_sum, stats.rating_3), (2, 8, 1))
+
+    def test_stats_endpoint(self):
+        self.authenticate()
+        company = self._company_recipe.make()
+        self._make_reviews(company, [5, 4])
+        with self.assertNumQueries(1):
+            response = self.client.get(self._stats_url(company))
+        self.assertEquals(response.json(), {
+            'company_id': company.company_id,
+            'name': company.name,
+            'review_count': 2,
+            'average_rating': 4.5,
+            'histogram': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1},
+        })
+
+    def test_stats_of_company_without_reviews(self):
+        self.authenticate()
+        company = self._company_recipe.make()
+        response = self.client.get(self._stats_url(company))
+        self.assertEquals(response.json()['review_count'], 0)
+        self.assertIsNone(response.json()['average_rating'])
+
+    def test_stats_of_unknown_company_returns_404(self):
+        self.authenticate()
+        response = self.client.get(reverse_lazy('company_stats', kwargs={'company_id': 1}))
+        self.assertEquals(404, response.status_code)
+
+
+class ReviewSearchTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews_search')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def _search(self, query, **params):
+        params['q'] = query
+        return self.client.get(self.URL, params)
+
+    def test_search_matches_title_and_summary(self):
+        by_title = self._review_recipe.make(title='Great coffee')
+        by_summary = self._review_recipe.make(summary='The coffee was cold')
+        self._review_recipe.make(title='Nice place', summary='Friendly staff')
+        response = self._search('coffee')
+        self.assertEquals(
+            sorted(review['title'] for review in response.json()['results']),
+            sorted([by_title.title, by_summary.title])
+        )
+
+    def test_search_requires_all_terms(self):
+        self._review_recipe.make(summary='hot coffee')
+        self._review_recipe.make(summary='cold coffee')
+        response = self._search('cold coffee')
+        self.assertEquals(len(response.json()['results']), 1)
+
+    def test_search_only_returns_user_reviews(self):
+        self._review_recipe.make(summary='coffee')
+        self._review_recipe.make(summary='coffee', reviewer=self._user_recipe.make())
+        response = self._search('coffee')
+        self.assertEquals(len(response.json()['results']), 1)
+
+    def test_search_index_follows_updates_and_deletes(self):
+        review = self._review_recipe.make(summary='coffee')
+        review.summary = 'tea'
+        review.save()
+        self.assertEquals(self._search('coffee').json()['results'], [])
+        self.assertEquals(len(self._search('tea').json()['results']), 1)
+        review.delete()
+        self.assertEquals(self._search('tea').json()['results'], [])
+
+    def test_search_results_are_ranked(self):
+        self._review_recipe.make(title='Lunch', summary='Good coffee and a long wait for the food to arrive')
+        best = self._review_recipe.make(title='Coffee', summary='coffee coffee')
+        response = self._search('coffee')
+        self.assertEquals(response.json()['results'][0]['title'], best.title)
+
+    def test_search_is_paginated(self):
+        self._review_recipe.make(summary='coffee', _quantity=3)
+        first = self._search('coffee', page_size=2).json()
+        second = self.client.get(first['next']).json()
+        self.assertEquals(len(first['results']), 2)
+        self.assertEquals(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self._review_recipe.make(summary='coffee')
+        response = self._search('coffee AND "(')
+        self.assertEquals(200, response.status_code)
+
+    def test_query_is_required(self):
+        response = self._search('')
+        self.assertEquals(400, response.status_code)
+
+
+class ReviewValuesSerializerTestCase(BaseTestCase):
+
+    def _representations(self):
+        rows = Review.objects.order_by('id').values(*ReviewValuesSerializer.values)
+        return ReviewValuesSerializer().to_representations(rows)
+
+    def test_representation_is_the_same_of_review_serializer(self):
+        reviews = self._review_recipe.make(_quantity=2)
+        self.assertEquals(
+            self._representations(),
+            [ReviewSerializer(review).data for review in reviews]
+        )
+
+    @parameterized.expand([
+        ('website', None),
+        ('website', ''),
+    ])
+    def test_company_optional_fields(self, field, value):
+        review = self._review_recipe.make(company=self._company_recipe.make(**{field: value}))
+        self.assertEquals(self._representations(), [ReviewSerializer(review).data])
+
+    def test_reviewer_with_last_name(self):
+        review = self._review_recipe.make(reviewer=self._user_recipe.make(last_name='Silva'))
+        self.assertEquals(self._representations()[0]['reviewer'], str(review.reviewer))
+
+
+class ReviewWriteBehindTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal_path = os.path.join(directory.name, 'journal.sqlite3')
+        settings = override_settings(REVIEW_WRITE_BEHIND=True, REVIEW_JOURNAL_PATH=self.journal_path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.authenticate()
+
+    def _review_data(self, company_id=1, rating=5):
+        return {
+            "rating": rating,
+            "title": self.faker.sentence()[:64],
+            "summary": self.faker.paragraph(),
+            "company": {"name": 'Company', "company_id": company_id}
+        }
+
+    def _submit(self, **kwargs):
+        response = self.client.post(self.URL, self._review_data(**kwargs), format='json')
+        self.assertEquals(202, response.status_code)
+        return response.json()['receipt']
+
+    def _status(self, receipt):
+        return self.client.get(reverse_lazy('review_receipt', kwargs={'receipt': receipt}))
+
+    def test_submission_is_journaled_without_touching_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(self.URL, self._review_data(), format='json')
+        self.assertEquals(202, response.status_code)
+        receipt = response.json()['receipt']
+        self.assertEquals(response['Location'], response.json()['url'])
+        self.assertFalse(Review.objects.exists())
+        self.assertEquals('pending', self._status(receipt).json()['status'])
+
+    def test_invalid_submission_isnt_journaled(self):
+        data = self._review_data()
+        del data['title']
+        response = self.client.post(self.URL, data, format='json')
+        self.assertEquals(400, response.status_code)
+        self.assertEquals([], get_review_journal().pending(10))
+
+    def test_drain_writes_the_journaled_reviews(self):
+        receipts = [self._submit(rating=rating) for rating in (3, 5)]
+        with mock.patch('review.signals.transaction.on_commit', lambda callback, using=None: callback()):
+            self.assertEquals(2, get_review_journal().drain(10))
+        reviews = Review.objects.filter(reviewer=self.auth_user, company__company_id=1)
+        self.assertEquals(2, reviews.count())
+        self.assertTrue(all(review.ip_address == '127.0.0.1' for review in reviews))
+        self.assertEquals(8, CompanyStats.objects.get(company__company_id=1).rating_sum)
+        for receipt in receipts:
+            status = self._status(receipt).json()
+            self.assertEquals('done', status['status'])
+            self.assertTrue(reviews.filter(pk=status['review_id']).exists())
+        self.assertEquals(2, len(self.client.get(self.URL).json()['results']))
+
+    def test_journal_survives_restarts(self):
+        receipt = self._submit()
+        self.assertEquals([receipt], [entry['receipt'] for entry in ReviewJournal(self.journal_path).pending(10)])
+
+    def test_drained_entries_arent_written_twice(self):
+        self._submit()
+        journal = get_review_journal()
+        # written to the database, but the worker stopped before marking the entries done
+        journal._write(journal.pending(10))
+        journal.drain(10)
+        self.assertEquals(1, Review.objects.count())
+        self.assertEquals(1, ReviewReceipt.objects.count())
+        self.assertEquals([], journal.pending(10))
+
+    def test_entries_that_cant_be_written_dont_hold_back_the_others(self):
+        failed = self._submit()
+        other_user = self._user_recipe.make()
+        self.client.force_authenticate(other_user)
+        done = self._submit()
+        self.auth_user.delete()
+        get_review_journal().drain(10)
+        self.assertEquals('done', self._status(done).json()['status'])
+        self.assertEquals('failed', get_review_journal().status(failed)['status'])
+
+    def test_receipt_of_other_user_isnt_found(self):
+        receipt = self._submit()
+        self.client.force_authenticate(self._user_recipe.make())
+        self.assertEquals(404, self._status(receipt).status_code)
+
+    def test_drain_command(self):
+        self._submit()
+        self._submit()
+        out = StringIO()
+        call_command('drain_review_journal', batch_size=1, stdout=out)
+        self.assertIn('Processed 2 journaled reviews', out.getvalue())
+        self.assertEquals(2, Review.objects.count())
+
+    def test_drain_forever_survives_database_errors(self):
+        self._submit()
+        drain = ReviewJournal.drain
+        calls = []
+
+        def failing_drain(journal, batch_size):
+            calls.append(batch_size)
+            if len(calls) == 1:
+                raise OperationalError('the database is down')
+            return drain(journal, batch_size)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(ReviewJournal, 'drain', failing_drain), \
+                mock.patch('review.management.commands.drain_review_journal.sleep',
+                           side_effect=[None, KeyboardInterrupt]) as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('drain_review_journal', forever=True, interval=0.5, stdout=out, stderr=err)
+        self.assertIn('Draining failed, retrying in 0.5s: the database is down', err.getvalue())
+        self.assertEquals([mock.call(0.5), mock.call(0.5)], sleep.call_args_list)
+        self.assertEquals(1, Review.objects.count())
+
+    def test_drain_without_forever_raises_database_errors(self):
+        with mock.patch.object(ReviewJournal, 'drain', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                call_command('drain_review_journal', stdout=StringIO())
+
+    def test_purge_drops_old_receipts(self):
+        self._submit()
+        get_review_journal().drain(10)
+        ReviewReceipt.objects.update(created=timezone.now() - timedelta(days=30))
+        self._submit()
+        get_review_journal().drain(10)
+        get_review_journal().purge(settings.REVIEW_JOURNAL_RETENTION)
+        self.assertEquals(1, ReviewReceipt.objects.count())
+
+
+class ReviewArchiveTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def _make_reviews(self, days_ago, quantity=1, **kwargs):
+        reviews = self._review_recipe.make(_quantity=quantity, **kwargs)
+        Review.objects.filter(pk__in=[review.pk for review in reviews]).update(
+            submission_date=date.today() - timedelta(days=days_ago)
+        )
+        return reviews
+
+    def _archive(self, **options):
+        out = StringIO()
+        call_command('archive_reviews', stdout=out, **options)
+        return out.getvalue()
+
+    def _list(self, **params):
+        return self.client.get(self.URL, params).json()
+
+    def test_old_reviews_are_moved_to_the_archive(self):
+        old = self._make_reviews(days_ago=1000, quantity=2)
+        recent = self._make_reviews(days_ago=10)
+        output = self._archive(months=24)
+        self.assertIn('Archived 2 reviews', output)
+        self.assertEquals([recent[0].pk], list(Review.objects.values_list('pk', flat=True)))
+        archived = ArchivedReview.objects.order_by('pk')
+        self.assertEquals([review.pk for review in old], [review.pk for review in archived])
+        self.assertEquals(old[0].title, archived[0].title)
+        self.assertEquals(old[0].company_id, archived[0].company_id)
+
+    def test_archive_moves_the_reviews_in_batches(self):
+        old = self._make_reviews(days_ago=1000, quantity=3)
+        recent = self._make_reviews(days_ago=10)
+        with CaptureQueriesContext(connection) as queries:
+            output = self._archive(months=24, batch_size=2)
+        self.assertIn('Archived 3 reviews', output)
+        self.assertEquals(2, len([query for query in queries if query['sql'].startswith('DELETE')]))
+        archived = ArchivedReview.objects.order_by('pk').values_list('pk', flat=True)
+        self.assertEquals([review.pk for review in old], list(archived))
+        self.assertEquals([recent[0].pk], list(Review.objects.values_list('pk', flat=True)))
+
+    def test_archive_keeps_the_company_stats(self):
+        company = self._company_recipe.make()
+        self._make_reviews(days_ago=1000, company=company)
+        self._archive(months=24)
+        self.assertEquals(1, CompanyStats.objects.get(company=company).review_count)
+
+    def test_archive_before_date(self):
+        self._make_reviews(days_ago=20)
+        self._make_reviews(days_ago=5)
+        self._archive(before=(date.today() - timedelta(days=10)).isoformat())
+        self.assertEquals(1, ArchivedReview.objects.count())
+        self.assertEquals(1, Review.objects.count())
+
+    def test_invalid_before_date(self):
+        with self.assertRaises(CommandError):
+            self._archive(before='yesterday')
+
+    def test_archived_reviews_are_only_listed_when_asked_for(self):
+        self.authenticate()
+        self._make_reviews(days_ago=1000)
+        recent = self._make_reviews(days_ago=1)
+        self._archive(months=24)
+        self.assertEquals(1, len(self._list()['results']))
+        results = self._list(include_archived='true')['results']
+        self.assertEquals(2, len(results))
+        self.assertEquals(recent[0].title, results[0]['title'])
+
+    def test_pages_continue_into_the_archived_reviews(self):
+        self.authenticate()
+        old = self._make_reviews(days_ago=1000, quantity=2)
+        recent = self._make_reviews(days_ago=1, quantity=2)
+        self._archive(months=24)
+        titles = []
+        page = self._list(include_archived='true', page_size=1)
+        while True:
+            titles += [review['title'] for review in page['results']]
+            if not page['next']:
+                break
+            page = self.client.get(page['next']).json()
+        self.assertEquals([review.title for review in recent[::-1] + old[::-1]], titles)
+
+    def test_export_includes_archived_reviews_when_asked_for(self):
+        self.authenticate()
+        self._make_reviews(days_ago=1000)
+        self._make_reviews(days_ago=1)
+        self._archive(months=24)
+        response = self.client.get(reverse_lazy('reviews_export'), {'include_archived': 'true'})
+        self.assertEquals(2, len(b''.join(response.streaming_content).splitlines()))
+
+
+class PartitionStatementsTestCase(BaseTestCase):
+    """The partition DDL as sent to the cursor, as it only runs on Postgres."""
+
+    def _statements(self, default_rows):
+        cursor = mock.Mock()
+        cursor.fetchone.return_value = (1,) if default_rows else None
+        _create_month_partition(cursor, 'review_review_p202601', date(2026, 1, 1), date(2026, 2, 1))
+        return [call[0][0] for call in cursor.execute.call_args_list]
+
+    def test_new_partitions_get_the_search_trigger(self):
+        statements = self._statements(default_rows=False)
+        self.assertIn("CREATE TABLE review_review_p202601 PARTITION OF review_review FOR VALUES FROM ('2026-01-01') "
+                      "TO ('2026-02-01')", statements)
+        self.assertTrue(any('CREATE TRIGGER review_review_search_vector' in statement
+                            and 'ON review_review_p202601' in statement for statement in statements))
+
+    def test_rows_of_the_month_are_moved_out_of_the_default_partition(self):
+        statements = self._statements(default_rows=True)
+        create = statements.index("CREATE TABLE review_review_p202601 PARTITION OF review_review FOR VALUES FROM "
+                                  "('2026-01-01') TO ('2026-02-01')")
+        moved = [index for index, statement in enumerate(statements)
+                 if 'DELETE FROM review_review_default' in statement]
+        reinserted = statements.index('INSERT INTO review_review SELECT * FROM review_review_moved')
+        self.assertEquals(1, len(moved))
+        self.assertLess(moved[0], create)
+        self.assertLess(create, reinserted)
+
+
+@skipUnless(supports_partitioning(connection), 'review_review is only partitioned on Postgres 11+')
+class ReviewPartitionsTestCase(BaseTestCase):
+
+    def _partition_of(self, review):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM review_review WHERE id = %s', [review.pk])
+            return cursor.fetchone()[0]
+
+    def _make_review(self, submission_date):
+        review = self._review_recipe.make()
+        Review.objects.filter(pk=review.pk).update(submission_date=submission_date)
+        return review
+
+    def test_review_table_is_partitioned(self):
+        self.assertTrue(is_partitioned(connection))
+        review = self._review_recipe.make()
+        self.assertEquals(PARTITION.format(month_start(review.submission_date)), self._partition_of(review))
+
+    def test_ids_are_unique_across_partitions(self):
+        review = self._review_recipe.make()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO review_review (id, rating, title, summary, ip_address, submission_date, updated_at,
+                                               company_id, reviewer_id)
+                    SELECT id, rating, title, summary, ip_address, submission_date - 400, updated_at,
+                           company_id, reviewer_id
+                    FROM review_review WHERE id = %s
+                """, [review.pk])
+
+    def test_new_partition_takes_its_rows_from_the_default_partition(self):
+        month = month_start(date.today(), 24)
+        review = self._make_review(month)
+        self.assertEquals(DEFAULT_PARTITION, self._partition_of(review))
+        create_partitions(connection, month, month)
+        self.assertEquals(PARTITION.format(month), self._partition_of(review))
+        self.assertEquals(review.title, Review.objects.get(pk=review.pk).title)
+
+    def test_archive_drops_the_emptied_partitions(self):
+        month = month_start(date.today(), -36)
+        create_partitions(connection, month, month)
+        self._make_review(month)
+        self._make_review(month + timedelta(days=1))
+        self.assertEquals(2, archive_reviews(month_start(month, 1), batch_size=1))
+        self.assertNotIn(PARTITION.format(month), partitions_before(connection, date.today()))
+        self.assertEquals(2, ArchivedReview.objects.count())
+
+
+class IdempotencyKeyTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def _review_data(self, title='Title'):
+        return {
+            "rating": 4,
+            "title": title,
+            "summary": self.faker.paragraph(),
+            "company": {"name": 'Company', "company_id": 1}
+        }
+
+    def _post(self, data, key='key-1', url=URL):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_original_response(self):
+        data = self._review_data()
+        first = self._post(data)
+        retry = self._post(data)
+        self.assertEquals(201, retry.status_code)
+        self.assertEquals(first.json(), retry.json())
+        self.assertEquals('true', retry['Idempotent-Replayed'])
+        self.assertEquals(1, Review.objects.count())
+        self.assertEquals(1, CompanyStats.objects.get(company__company_id=1).review_count)
+
+    def test_retry_doesnt_create_again(self):
+        data = self._review_data()
+        self._post(data)
+        with mock.patch('review.serializers.ReviewSerializer.create') as create:
+            self._post(data)
+        create.assert_not_called()
+
+    def test_key_reused_with_a_different_request(self):
+        self._post(self._review_data(title='First'))
+        response = self._post(self._review_data(title='Second'))
+        self.assertEquals(422, response.status_code)
+        self.assertEquals(1, Review.objects.count())
+
+    def test_keys_are_per_user(self):
+        data = self._review_data()
+        self._post(data)
+        self.client.force_authenticate(self._user_recipe.make())
+        self.assertEquals(201, self._post(data).status_code)
+        self.assertEquals(2, Review.objects.count())
+
+    def test_failed_requests_arent_stored(self):
+        data = self._review_data()
+        del data['title']
+        self.assertEquals(400, self._post(data).status_code)
+        self.assertEquals(201, self._post(self._review_data()).status_code)
+
+    def test_requests_without_key_arent_stored(self):
+        self.client.post(self.URL, self._review_data(), format='json')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_too_long_key(self):
+        self.assertEquals(400, self._post(self._review_data(), key='k' * 256).status_code)
+
+    @override_settings(REVIEW_IDEMPOTENCY_KEY_TTL=0)
+    def test_expired_key_creates_again(self):
+        data = self._review_data()
+        self._post(data)
+        self.assertEquals(201, self._post(data).status_code)
+        self.assertEquals(2, Review.objects.count())
+        self.assertEquals(1, IdempotencyKey.objects.count())
+
+    def test_claim_of_an_existing_key_returns_it(self):
+        record, created = IdempotencyKey.objects.claim(self.auth_user, 'key-1', 'hash')
+        self.assertTrue(created)
+        self.assertEquals((record, False), IdempotencyKey.objects.claim(self.auth_user, 'key-1', 'hash'))
+
+    def test_batch_retry_replays_the_original_response(self):
+        data = [self._review_data(), self._review_data(title='Other')]
+        first = self._post(data, url=reverse_lazy('reviews_batch'))
+        retry = self._post(data, url=reverse_lazy('reviews_batch'))
+        self.assertEquals(first.json(), retry.json())
+        self.assertEquals(2, Review.objects.count())
+
+    def test_purge_command(self):
+        self._post(self._review_data())
+        out = StringIO()
+        with override_settings(REVIEW_IDEMPOTENCY_KEY_TTL=0):
+            call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Purged 1 idempotency keys', out.getvalue())
+
+
+class SparseFieldsTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def _list(self, fields, **params):
+        return self.client.get(self.URL, dict(params, fields=fields))
+
+    def test_only_the_requested_fields_are_returned(self):
+        review = self._review_recipe.make()
+        results = self._list('rating,title,submission_date,company.name').json()['results']
+        self.assertEquals([{
+            'rating': review.rating,
+            'title': review.title,
+            'submission_date': review.submission_date.isoformat(),
+            'company': {'name': review.company.name},
+        }], results)
+
+    def test_company_selects_every_company_field(self):
+        review = self._review_recipe.make()
+        results = self._list('company').json()['results']
+        self.assertEquals([{'company': ReviewSerializer(review).data['company']}], results)
+
+    def test_reviewer_field(self):
+        self._review_recipe.make()
+        self.assertEquals([{'reviewer': str(self.auth_user)}], self._list('reviewer').json()['results'])
+
+    def test_unselected_columns_arent_read(self):
+        self._review_recipe.make()
+        with CaptureQueriesContext(connection) as queries:
+            self._list('rating,title')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('summary', sql)
+        self.assertNotIn('review_company', sql)
+
+    @parameterized.expand([
+        ('rating,password',),
+        ('company.owner',),
+        (',',),
+    ])
+    def test_invalid_fields(self, fields):
+        response = self._list(fields)
+        self.assertEquals(400, response.status_code)
+        self.assertIn('fields', response.json())
+
+    def test_payload_without_summary_is_much_smaller(self):
+        self._review_recipe.make(_quantity=10, summary=generate_string_with_size(5000))
+        full = self.client.get(self.URL).content
+        sparse = self._list('rating,title,submission_date,company.name').content
+        self.assertLess(len(sparse) * 10, len(full))
+
+    def test_pages_with_sparse_fields(self):
+        self._review_recipe.make(_quantity=3)
+        page = self._list('rating', page_size=2).json()
+        self.assertEquals(2, len(page['results']))
+        self.assertEquals(1, len(self.client.get(page['next']).json()['results']))
+
+    def test_search_with_sparse_fields(self):
+        self._review_recipe.make(title='Great coffee')
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'coffee', 'fields': 'title,company.name'})
+        self.assertEquals(['company', 'title'], sorted(response.json()['results'][0]))
+        self.assertEquals(['name'], list(response.json()['results'][0]['company']))
+
+    def test_export_with_sparse_fields(self):
+        review = self._review_recipe.make()
+        response = self.client.get(reverse_lazy('reviews_export'), {'fields': 'title'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals([{'title': review.title}], [json.loads(line) for line in lines])
+
+
+class CompressedSummaryTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.long_summary = 'The coffee was great and the staff friendly. ' * 50
+
+    def _stored_summary(self, review, table='review_review'):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT summary FROM {} WHERE id = %s'.format(table), [review.pk])
+            return cursor.fetchone()[0]
+
+    def test_long_summaries_are_stored_compressed(self):
+        review = self._review_recipe.make(summary=self.long_summary)
+        stored = self._stored_summary(review)
+        self.assertTrue(is_compressed(stored))
+        self.assertLess(len(stored), len(self.long_summary))
+        self.assertEquals(self.long_summary, Review.objects.get(pk=review.pk).summary)
+
+    def test_short_summaries_are_stored_as_they_are(self):
+        review = self._review_recipe.make(summary='Short and sweet')
+        self.assertEquals('Short and sweet', self._stored_summary(review))
+
+    def test_incompressible_summaries_are_stored_as_they_are(self):
+        summary = b64encode(os.urandom(1500)).decode('ascii')
+        review = self._review_recipe.make(summary=summary)
+        self.assertEquals(summary, self._stored_summary(review))
+
+    def test_text_starting_with_the_header_is_compressed(self):
+        summary = COMPRESSED_HEADER + 'not compressed'
+        review = self._review_recipe.make(summary=summary)
+        self.assertNotEqual(summary, self._stored_summary(review))
+        self.assertEquals(summary, Review.objects.get(pk=review.pk).summary)
+
+    def test_uncompressed_legacy_rows_are_read(self):
+        review = self._review_recipe.make(summary='Short')
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE review_review SET summary = %s WHERE id = %s', [self.long_summary, review.pk])
+        self.assertEquals(self.long_summary, Review.objects.get(pk=review.pk).summary)
+
+    def test_list_and_sparse_fields_return_the_text(self):
+        self._review_recipe.make(summary=self.long_summary)
+        self.assertEquals(self.long_summary, self.client.get(self.URL).json()['results'][0]['summary'])
+        results = self.client.get(self.URL, {'fields': 'summary'}).json()['results']
+        self.assertEquals([{'summary': self.long_summary}], results)
+
+    def test_compressed_summaries_are_searchable(self):
+        review = self._review_recipe.make(summary=self.long_summary)
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'friendly'})
+        self.assertEquals([review.title], [result['title'] for result in response.json()['results']])
+        review.summary = 'Tea ' * 500
+        review.save()
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'friendly'})
+        self.assertEquals([], response.json()['results'])
+        review.delete()
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'tea'})
+        self.assertEquals([], response.json()['results'])
+
+    def test_summaries_are_decompressed_by_the_database(self):
+        summary = ' '.join('Avaliação {} do café, nota {}.'.format(index, index % 5) for index in range(300))
+        review = self._review_recipe.make(summary=summary)
+        self.assertTrue(is_compressed(self._stored_summary(review)))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT review_summary_text(summary) FROM review_review WHERE id = %s', [review.pk])
+            self.assertEquals(summary, cursor.fetchone()[0])
+
+    def test_summaries_are_stored_as_text_on_postgres(self):
+        field = Review._meta.get_field('summary')
+        postgres = mock.Mock(vendor='postgresql')
+        self.assertEquals(self.long_summary, field.get_db_prep_save(self.long_summary, postgres))
+        summary = COMPRESSED_HEADER + 'not compressed'
+        self.assertTrue(is_compressed(field.get_db_prep_save(summary, postgres)))
+        self.assertNotEqual(summary, field.get_db_prep_save(summary, postgres))
+
+    def test_summaries_written_without_signals_are_searchable(self):
+        review = self._review_recipe.make(summary='Short')
+        Review.objects.filter(pk=review.pk).update(summary='The croissants were fresh. ' * 50)
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'croissants'})
+        self.assertEquals([review.title], [result['title'] for result in response.json()['results']])
+
+    def test_archived_summaries_are_read(self):
+        review = self._review_recipe.make(summary=self.long_summary)
+        Review.objects.filter(pk=review.pk).update(submission_date=date.today() - timedelta(days=1000))
+        call_command('archive_reviews', months=24, stdout=StringIO())
+        self.assertTrue(is_compressed(self._stored_summary(review, 'review_archivedreview')))
+        self.assertEquals(self.long_summary, ArchivedReview.objects.get(pk=review.pk).summary)
+
+
+class ReviewAdminTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self._user_recipe.make(is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+
+    def _changelist(self, model, **params):
+        return self.client.get(reverse_lazy('admin:review_{}_changelist'.format(model)), params)
+
+    def test_review_changelist_queries_dont_grow_with_the_rows(self):
+        self._review_recipe.make(_quantity=2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEquals(200, self._changelist('review').status_code)
+        self._review_recipe.make(_quantity=10)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEquals(200, self._changelist('review').status_code)
+        self.assertEquals(len(few), len(many))
+
+    def test_review_change_form_doesnt_list_every_company(self):
+        review = self._review_recipe.make()
+        other = self._company_recipe.make()
+        response = self.client.get(reverse_lazy('admin:review_review_change', args=[review.pk]))
+        self.assertEquals(200, response.status_code)
+        self.assertNotContains(response, 'value="{}"'.format(other.pk))
+
+    def test_review_search_uses_the_full_text_index(self):
+        review = self._review_recipe.make(summary='The coffee was cold')
+        self._review_recipe.make(summary='Friendly staff', reviewer=self._user_recipe.make())
+        response = self._changelist('review', q='coffee')
+        self.assertEquals([review], list(response.context['cl'].result_list))
+        response = self._changelist('review', q=str(review.pk))
+        self.assertEquals([review], list(response.context['cl'].result_list))
+
+    def test_company_search_by_company_id_or_name_prefix(self):
+        company = self._company_recipe.make(name='Coffee Place', company_id=1234)
+        self._company_recipe.make(name='Best Coffee')
+        self.assertEquals([company], list(self._changelist('company', q='1234').context['cl'].result_list))
+        self.assertEquals([company], list(self._changelist('company', q='coffee').context['cl'].result_list))
+        self.assertEquals([], list(self._changelist('company', q='99999999999').context['cl'].result_list))
+
+
+@override_settings(REVIEW_SYNC_DELAY=0)
+class ReviewSyncTestCase(BaseTestCase):
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def _sync(self, since='', **params):
+        response = self.client.get(self.URL, dict(params, since=since))
+        self.assertEquals(200, response.status_code)
+        return response.json()
+
+    def test_sync_from_the_start_returns_every_review(self):
+        reviews = self._review_recipe.make(_quantity=2)
+        self._review_recipe.make(reviewer=self._user_recipe.make())
+        data = self._sync()
+        self.assertEquals([review.pk for review in reviews], [review['id'] for review in data['results']])
+        self.assertEquals(reviews[0].title, data['results'][0]['title'])
+        self.assertEquals([], data['deleted'])
+        self.assertFalse(data['more'])
+
+    def test_sync_returns_the_changes_since_the_watermark(self):
+        unchanged, updated, deleted = self._review_recipe.make(_quantity=3)
+        watermark = self._sync()['watermark']
+        updated.title = 'Updated'
+        updated.save()
+        deleted_pk = deleted.pk
+        deleted.delete()
+        created = self._review_recipe.make()
+        data = self._sync(watermark)
+        self.assertEquals([updated.pk, created.pk], [review['id'] for review in data['results']])
+        self.assertEquals('Updated', data['results'][0]['title'])
+        self.assertEquals([deleted_pk], data['deleted'])
+        self.assertEquals({'results': [], 'deleted': [], 'more': False}, {
+            key: value for key, value in self._sync(data['watermark']).items() if key != 'watermark'
+        })
+
+    def test_sync_in_pages(self):
+        reviews = self._review_recipe.make(_quantity=5)
+        synced, watermark, more = [], '', True
+        while more:
+            data = self._sync(watermark, page_size=2)
+            synced += [review['id'] for review in data['results']]
+            watermark, more = data['watermark'], data['more']
+        self.assertEquals([review.pk for review in reviews], synced)
+
+    def test_sync_supports_sparse_fields(self):
+        review = self._review_recipe.make()
+        self.assertEquals([{'id': review.pk, 'rating': review.rating}], self._sync(fields='rating')['results'])
+
+    @override_settings(REVIEW_SYNC_DELAY=60)
+    def test_recent_changes_wait_for_the_sync_delay(self):
+        self._review_recipe.make()
+        self.assertEquals([], self._sync()['results'])
+
+    def test_invalid_and_expired_watermarks(self):
+        response = self.client.get(self.URL, {'since': 'invalid'})
+        self.assertEquals(400, response.status_code)
+        expired = encode_watermark(timezone.now() - timedelta(days=365), 1)
+        response = self.client.get(self.URL, {'since': expired})
+        self.assertEquals(410, response.status_code)
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_company_and_reviewer_changes_are_synced(self):
+        company = self._company_recipe.make()
+        review = self._review_recipe.make(company=company)
+        self._review_recipe.make()
+        watermark = self._sync()['watermark']
+        company.name = 'Renamed'
+        company.save()
+        data = self._sync(watermark)
+        self.assertEquals([review.pk], [row['id'] for row in data['results']])
+        self.assertEquals('Renamed', data['results'][0]['company']['name'])
+        Company.objects.upsert_many([{'company_id': company.company_id, 'name': 'Imported'}])
+        data = self._sync(data['watermark'])
+        self.assertEquals('Imported', data['results'][0]['company']['name'])
+        self.auth_user.first_name = 'Renamed'
+        self.auth_user.save()
+        data = self._sync(data['watermark'])
+        self.assertEquals(2, len(data['results']))
+        self.auth_user.save(update_fields=['password'])
+        self.assertEquals([], self._sync(data['watermark'])['results'])
+
+    def test_archived_reviews_are_synced_as_deleted(self):
+        archived, kept = self._review_recipe.make(_quantity=2)
+        watermark = self._sync()['watermark']
+        Review.objects.filter(pk=archived.pk).update(submission_date=date.today() - timedelta(days=1000))
+        call_command('archive_reviews', months=24, stdout=StringIO())
+        data = self._sync(watermark)
+        self.assertEquals([archived.pk], data['deleted'])
+
+    def test_purge_review_tombstones(self):
+        self._review_recipe.make(_quantity=2)
+        Review.objects.all().delete()
+        ReviewTombstone.objects.filter(pk=ReviewTombstone.objects.first().pk).update(
+            deleted_at=timezone.now() - timedelta(days=365)
+        )
+        out = StringIO()
+        call_command('purge_review_tombstones', stdout=out)
+        self.assertIn('Purged 1 review tombstones', out.getvalue())
+        self.assertEquals(1, ReviewTombstone.objects.count())
+
+
+class CompanyLookupTestCase(BaseTestCase):
+    URL = reverse_lazy('companies')
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+
+    def _lookup(self, query, **params):
+        response = self.client.get(self.URL, dict(params, q=query))
+        self.assertEquals(200, response.status_code)
+        return response.json()['results']
+
+    def test_name_prefix_is_case_insensitive(self):
+        company = self._company_recipe.make(name='Coffee Place')
+        self._company_recipe.make(name='Best Coffee')
+        self.assertEquals([{
+            'company_id': company.company_id,
+            'name': company.name,
+            'website': company.website,
+            'review_count': 0,
+        }], self._lookup('cOFf'))
+
+    def test_most_reviewed_companies_first(self):
+        few = self._company_recipe.make(name='Coffee A')
+        many = self._company_recipe.make(name='Coffee B')
+        self._review_recipe.make(company=few)
+        self._review_recipe.make(company=many, _quantity=3)
+        results = self._lookup('coffee')
+        self.assertEquals([many.company_id, few.company_id], [result['company_id'] for result in results])
+        self.assertEquals([3, 1], [result['review_count'] for result in results])
+
+    def test_company_id_match_comes_first(self):
+        by_name = self._company_recipe.make(name='42 Coffee')
+        self._review_recipe.make(company=by_name)
+        by_id = self._company_recipe.make(name='Tea House', company_id=42)
+        results = self._lookup('42')
+        self.assertEquals([by_id.company_id, by_name.company_id], [result['company_id'] for result in results])
+
+    def test_results_are_capped(self):
+        for i in range(30):
+            self._company_recipe.make(name='Coffee {}'.format(i))
+        self.assertEquals(10, len(self._lookup('coffee')))
+        self.assertEquals(3, len(self._lookup('coffee', limit=3)))
+        self.assertEquals(25, len(self._lookup('coffee', limit=1000)))
+
+    def test_query_is_required(self):
+        self.assertEquals(400, self.client.get(self.URL).status_code)
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_updated_companies_are_not_served_from_the_cache(self):
+        company = self._company_recipe.make(name='Coffee Place')
+        self._lookup('coffee')
+        with CaptureQueriesContext(connection) as queries:
+            self._lookup('coffee')
+        self.assertEquals(0, len(queries))
+        company.name = 'Tea Place'
+        company.save()
+        self.assertEquals([], self._lookup('coffee'))
+
+    @mock.patch('django.db.transaction.on_commit', lambda callback, using=None: callback())
+    def test_created_companies_are_not_missing_from_the_cache(self):
+        self.assertEquals([], self._lookup('coffee'))
+        company = self._company_recipe.make(name='Coffee Place')
+        self.assertEquals([company.company_id], [result['company_id'] for result in self._lookup('coffee')])
+        Company.objects.upsert_many([{'company_id': 7001, 'name': 'Coffee Bar', 'website': 'http://bar.com'}])
+        self.assertEquals(2, len(self._lookup('coffee')))
+        Company.objects.upsert(7002, name='Coffee Shop', website='http://shop.com')
+        self.assertEquals(3, len(self._lookup('coffee')))
+
+    @override_settings(REVIEW_LIST_CACHE='default')
+    def test_results_are_not_cached_with_a_process_local_version_stamp(self):
+        self._company_recipe.make(name='Coffee Place')
+        self._lookup('coffee')
+        with CaptureQueriesContext(connection) as queries:
+            self._lookup('coffee')
+        self.assertTrue(any('review_company' in query['sql'] for query in queries))
+
+
+class ImportReviewsTestCase(BaseTestCase):
+    COLUMNS = ('rating', 'title', 'summary', 'ip_address', 'submission_date',
+               'company_id', 'company_name', 'company_website', 'reviewer_email')
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _row(self, **data):
+        row = {
+            'rating': '4', 'title': 'Good coffee', 'summary': 'The coffee was good',
+            'ip_address': '10.0.0.1', 'submission_date': '2015-03-01', 'company_id': '7',
+            'company_name': 'Coffee Place', 'company_website': '', 'reviewer_email': self.auth_user.email,
+        }
+        row.update(data)
+        return row
+
+    def _write_csv(self, rows, name='reviews.csv'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', newline='') as output:
+            writer = csv.DictWriter(output, self.COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def _import(self, path, **options):
+        out = StringIO()
+        call_command('import_reviews', path, stdout=out, **options)
+        return out.getvalue()
+
+    def _errors(self, path):
+        with open(path + '.errors.jsonl') as errors:
+            return [json.loads(line) for line in errors]
+
+    def test_import_csv(self):
+        path = self._write_csv([self._row(), self._row(rating='2', summary='Coffee ' * 300)])
+        output = self._import(path, batch_size=1)
+        self.assertIn('Imported 2 reviews, 0 rows failed', output)
+        self.assertIn('rows/s', output)
+        reviews = Review.objects.order_by('pk')
+        self.assertEquals([4, 2], [review.rating for review in reviews])
+        self.assertEquals(date(2015, 3, 1), reviews[0].submission_date)
+        self.assertEquals('Coffee ' * 300, reviews[1].summary)
+        self.assertEquals(self.auth_user, reviews[0].reviewer)
+        company = Company.objects.get(company_id=7)
+        self.assertEquals(('Coffee Place', None), (company.name, company.website))
+        stats = CompanyStats.objects.get(company=company)
+        self.assertEquals((2, 6), (stats.review_count, stats.rating_sum))
+        self.authenticate()
+        response = self.client.get(reverse_lazy('reviews_search'), {'q': 'coffee'})
+        self.assertEquals(2, len(response.json()['results']))
+
+    def test_import_updates_existing_companies(self):
+        self._company_recipe.make(company_id=7, name='Old name')
+        self._import(self._write_csv([self._row()]))
+        self.assertEquals('Coffee Place', Company.objects.get(company_id=7).name)
+
+    def test_invalid_rows_are_written_to_the_errors_file(self):
+        path = os.path.join(self.directory, 'reviews.jsonl')
+        rows = [
+            self._row(rating='6'),
+            self._row(title='t' * 65),
+            self._row(summary='s' * 10001),
+            self._row(reviewer_email='nobody@example.com'),
+            self._row(),
+        ]
+        with open(path, 'w') as output:
+            for row in rows:
+                company = {'company_id': row.pop('company_id'), 'name': row.pop('company_name')}
+                output.write(json.dumps(dict(row, company=company)) + '\n')
+            output.write('not json\n')
+        output = self._import(path)
+        self.assertIn('Imported 1 reviews, 5 rows failed', output)
+        errors = self._errors(path)
+        self.assertEquals([1, 2, 3, 4, 6], [error['row'] for error in errors])
+        self.assertEquals(['rating'], list(errors[0]['errors']))
+        self.assertEquals(['title'], list(errors[1]['errors']))
+        self.assertEquals(['summary'], list(errors[2]['errors']))
+        self.assertEquals(['reviewer_email'], list(errors[3]['errors']))
+        self.assertEquals(['row'], list(errors[4]['errors']))
+        self.assertEquals(1, Review.objects.count())
+
+    def test_undecodable_and_malformed_csv_rows_fail_alone(self):
+        path = self._write_csv([self._row(title='first'), self._row(title='second'), self._row(title='third')])
+        with open(path, 'rb') as source:
+            content = source.read()
+        content = content.replace(b'second', b'sec\xffond').replace(b'third', b'thi\x00rd')
+        with open(path, 'wb') as output:
+            output.write(content + b'5,Last,fine,10.0.0.1,2015-03-01,7,Coffee Place,,' + self.auth_user.email.encode())
+        output = self._import(path, batch_size=2)
+        self.assertIn('Imported 2 reviews, 2 rows failed', output)
+        self.assertEquals([2, 3], [error['row'] for error in self._errors(path)])
+        self.assertIn('UTF-8', self._errors(path)[0]['errors']['row'][0])
+        self.assertEquals(['first', 'Last'], list(Review.objects.order_by('pk').values_list('title', flat=True)))
+        self.assertIn('Resuming reviews.csv after row 4', self._import(path))
+
+    def test_undecodable_jsonl_lines_fail_alone(self):
+        path = os.path.join(self.directory, 'reviews.jsonl')
+        with open(path, 'wb') as output:
+            output.write(json.dumps(self._row(title='caf\u00e9')).encode('latin-1') + b'\n')
+            output.write(json.dumps(self._row(), ensure_ascii=False).replace('Good', 'Caf\xe9').encode('latin-1'))
+        self.assertIn('Imported 1 reviews, 1 rows failed', self._import(path))
+        self.assertEquals([2], [error['row'] for error in self._errors(path)])
+
+    def test_errors_are_written_before_the_batch_commits(self):
+        path = self._write_csv([self._row(rating='6'), self._row(), self._row(rating='0'), self._row()])
+        with mock.patch('review.importer.json.dumps', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                self._import(path, batch_size=2)
+        self.assertEquals(0, ReviewImport.objects.get(name='reviews.csv').rows)
+        self._import(path, batch_size=2)
+        self.assertEquals([1, 3], [error['row'] for error in self._errors(path)])
+        self.assertEquals(2, Review.objects.count())
+
+    def test_interrupted_import_resumes_after_the_last_batch(self):
+        path = self._write_csv([self._row(title=str(i)) for i in range(5)])
+        with mock.patch.object(ReviewImporter, '_insert', side_effect=[None, None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2)
+        self.assertEquals(4, ReviewImport.objects.get(name='reviews.csv').rows)
+        output = self._import(path, batch_size=2)
+        self.assertIn('Resuming reviews.csv after row 4', output)
+        self.assertEquals(['4'], list(Review.objects.values_list('title', flat=True)))
+        self._import(path, batch_size=2, restart=True)
+        self.assertEquals(6, Review.objects.count())
+
+    def _import_counting_lines(self, path, **options):
+        lines = []
+
+        def counting_decode_lines(source, undecodable):
+            for line in decode_lines(source, undecodable):
+                lines.append(line)
+                yield line
+
+        with mock.patch('review.importer.decode_lines', counting_decode_lines):
+            self._import(path, **options)
+        return len(lines)
+
+    def test_resumed_csv_import_seeks_past_the_rows_written(self):
+        path = self._write_csv([self._row(title=str(i)) for i in range(5)])
+        with mock.patch.object(ReviewImporter, '_insert', side_effect=[None, None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2)
+        # the header and the last row
+        self.assertEquals(2, self._import_counting_lines(path, batch_size=2))
+        self.assertEquals(['4'], list(Review.objects.values_list('title', flat=True)))
+        self.assertEquals(5, ReviewImport.objects.get(name='reviews.csv').rows)
+
+    def test_resumed_jsonl_import_seeks_past_the_rows_written(self):
+        path = os.path.join(self.directory, 'reviews.jsonl')
+        with open(path, 'w') as output:
+            for i in range(3):
+                output.write(json.dumps(self._row(title=str(i))) + '\n')
+        with mock.patch.object(ReviewImporter, '_insert', side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2)
+        self.assertEquals(1, self._import_counting_lines(path, batch_size=2))
+        self.assertEquals(['2'], list(Review.objects.values_list('title', flat=True)))
+
+    def test_checkpoint_without_offset_resumes_by_row(self):
+        path = self._write_csv([self._row(title=str(i)) for i in range(3)])
+        ReviewImport.objects.create(name='reviews.csv', rows=2)
+        self._import(path)
+        self.assertEquals(['2'], list(Review.objects.values_list('title', flat=True)))
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            self._import(os.path.join(self.directory, 'reviews.xml'))
+
+
+class ExportReviewsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.company = self._company_recipe.make(name='Coffee Place', website='http://coffee.example')
+
+    def _export(self, *args, **options):
+        out = StringIO()
+        call_command('export_reviews', self.directory, *args, stdout=out, **options)
+        return out.getvalue()
+
+    def _manifest(self):
+        with open(os.path.join(self.directory, 'csv', 'manifest.json')) as manifest:
+            return json.load(manifest)
+
+    def _rows(self, manifest):
+        rows = []
+        for part in manifest['parts']:
+            with gzip.open(os.path.join(self.directory, 'csv', part['file']), 'rt', newline='') as source:
+                rows += list(csv.DictReader(source))
+        return rows
+
+    def test_export_csv(self):
+        review = self._review_recipe.make(company=self.company, reviewer=self.auth_user, rating=4,
+                                          summary='Coffee ' * 300)
+        output = self._export()
+        self.assertIn('Exported 1 reviews', output)
+        manifest = self._manifest()
+        self.assertEquals((1, review.pk), (manifest['rows'], manifest['last_id']))
+        [row] = self._rows(manifest)
+        self.assertEquals(str(review.pk), row['id'])
+        self.assertEquals('4', row['rating'])
+        self.assertEquals('Coffee ' * 300, row['summary'])
+        self.assertEquals(str(self.auth_user.pk), row['reviewer_id'])
+        self.assertEquals(
+            (str(self.company.company_id), 'Coffee Place', 'http://coffee.example'),
+            (row['company_id'], row['company_name'], row['company_website'])
+        )
+
+    def test_export_is_split_in_id_ranges_read_in_batches(self):
+        reviews = self._review_recipe.make(company=self.company, reviewer=self.auth_user, _quantity=5)
+        self._export(range_size=2, batch_size=1)
+        manifest = self._manifest()
+        self.assertEquals(3, len(manifest['parts']))
+        self.assertEquals(
+            [review.pk for review in reviews], [int(row['id']) for row in self._rows(manifest)]
+        )
+        self.assertEquals([], [name for name in os.listdir(os.path.join(self.directory, 'csv'))
+                               if name.endswith('.tmp')])
+
+    def test_incremental_export_after_id(self):
+        first, second = self._review_recipe.make(company=self.company, reviewer=self.auth_user, _quantity=2)
+        self._export(after_id=first.pk)
+        self.assertEquals([str(second.pk)], [row['id'] for row in self._rows(self._manifest())])
+
+    def test_incremental_export_since_date(self):
+        old, recent = self._review_recipe.make(company=self.company, reviewer=self.auth_user, _quantity=2)
+        Review.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=3))
+        self._export(since=(timezone.now() - timedelta(days=1)).date().isoformat())
+        self.assertEquals([str(recent.pk)], [row['id'] for row in self._rows(self._manifest())])
+
+    def test_export_of_nothing_writes_an_empty_manifest(self):
+        self._export(after_id=1000)
+        self.assertEquals((0, 1000, []), itemgetter('rows', 'last_id', 'parts')(self._manifest()))
+
+    def test_parquet_needs_pyarrow(self):
+        with mock.patch.dict(sys.modules, {'pyarrow': None}):
+            with self.assertRaises(CommandError):
+                self._export(formats=['parquet'])
+
+    def test_invalid_since(self):
+        with self.assertRaises(CommandError):
+            self._export(since='yesterday')
@@ -3,5 +3,12 @@ from django.conf.urls import url
 from . import views
 
 urlpatterns = [
+    url(r'companies/(?P<company_id>\d+)/stats', views.CompanyStatsView.as_view(), name='company_stats'),
+    url(r'companies$', views.CompanyLookupView.as_view(), name='companies'),
+    url(r'company-cache', views.CompanyCacheStatsView.as_view(), name='company_cache_stats'),
+    url(r'reviews/search', views.ReviewSearchView.as_view(), name='reviews_search'),
+    url(r'reviews/export', views.ReviewExportView.as_view(), name='reviews_export'),
+    url(r'reviews/receipts/(?P<receipt>[0-9a-f]{32})', views.ReviewReceiptView.as_view(), name='review_receipt'),
+    url(r'reviews/batch', views.ReviewBatchCreateView.as_view(), name='reviews_batch'),
     url(r'review', views.ReviewListCreateView.as_view(), name='reviews')
 ]
@@ -1,18 +1,131 @@
-from rest_framework.generics import ListCreateAPIView
-from rest_framework.permissions import IsAuthenticated
+import json
+from collections import OrderedDict
+from hashlib import md5, sha256
+from itertools import chain, islice
 
-from .models import Review
-from .serializers import ReviewSerializer
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.functions import Greatest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import ugettext_lazy as _
 
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.generics import (
+    CreateAPIView, ListAPIView, ListCreateAPIView, RetrieveAPIView, get_object_or_404
+)
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
-class ReviewListCreateView(ListCreateAPIView):
-    permission_classes = (IsAuthenticated,)
-    serializer_class = ReviewSerializer
+from reviews_api.caches import is_process_local
+from reviews_api.routers import pin_to_primary, read_from_primary_if_pinned
 
-    def get_queryset(self):
-        return Review.objects.filter(reviewer=self.request.user)
+from .cache import (
+    REVIEW_LIST_BODY_KEY, company_cache, get_companies_version, get_company_versions, get_review_list_page,
+    get_review_list_version, review_list_cache, set_review_list_page
+)
+from .ingestion import get_review_journal
+from .lookup import lookup_companies
+from .models import ArchivedReview, Company, CompanyStats, IdempotencyKey, Review, ReviewTombstone
+from .pagination import ReviewCursorPagination, ReviewSearchPagination
+from .renderers import NDJSONRenderer
+from .search import ReviewSearch
+from .serializers import CompanyStatsSerializer, ReviewSerializer, ReviewValuesSerializer
+from .sync import changes_since, decode_watermark
+
+
+class ReadYourWritesMixin:
+    """Read from the primary database while the user's last write may not be on the replicas yet."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            read_from_primary_if_pinned(request.user.pk)
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=rating,title,company.name limits the reviews to the given fields,
+    and only their columns are read.
+    """
+
+    def get_fields(self):
+        if not hasattr(self, '_fields'):
+            self._fields = ReviewValuesSerializer.parse_fields(self.request.query_params.get('fields'))
+        return self._fields
+
+    def get_values_serializer(self):
+        return ReviewValuesSerializer(fields=self.get_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs['fields'] = self.get_fields()
+        return super().get_serializer(*args, **kwargs)
+
+
+class ArchivedReviewsMixin(SparseFieldsMixin):
+    """Reviews moved to the archive table are only read with ?include_archived=true."""
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true')
+
+    def get_archived_queryset(self):
+        if not self.include_archived():
+            return None
+        # with the company, which the review list pages are validated against
+        return ArchivedReview.objects.filter(reviewer=self.request.user).values(
+            *self.get_values_serializer().get_values(), 'company_id'
+        )
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = 422
+    default_detail = _('This Idempotency-Key was already used with a different request.')
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotentCreateMixin:
+    """
+    The response to a create sent with an Idempotency-Key header is stored,
+    and retries with the same key get it replayed instead of creating again.
+    """
+
+    idempotency_key_max_length = 255
+
+    def post(self, request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key or len(key) > self.idempotency_key_max_length:
+            raise ValidationError({'Idempotency-Key': [
+                _('Ensure this header has no more than {} characters.').format(self.idempotency_key_max_length)
+            ]})
+
+        request_hash = sha256(json.dumps(request.data, sort_keys=True, cls=JSONEncoder).encode()).hexdigest()
+        # a failed create rolls the record back, so the request can be retried
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.claim(request.user, key, request_hash)
+            if created:
+                response = super().post(request, *args, **kwargs)
+                record.status_code = response.status_code
+                record.response = json.dumps(response.data, cls=JSONEncoder)
+                record.save(update_fields=['status_code', 'response'])
+                return response
+
+        if record.request_hash != request_hash:
+            raise IdempotencyKeyReused()
+        return Response(json.loads(record.response), status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+class ReviewerMixin(ReadYourWritesMixin):
 
     def perform_create(self, serializer):
+        pin_to_primary(self.request.user.pk)
         serializer.save(
             reviewer=self.request.user,
             ip_address=self._get_client_ip()
@@ -26,3 +139,244 @@ class ReviewListCreateView(ListCreateAPIView):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+
+
+class ReviewListCreateView(IdempotentCreateMixin, ReviewerMixin, ArchivedReviewsMixin, ListCreateAPIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = ReviewSerializer
+    pagination_class = ReviewCursorPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(
+            reviewer=self.request.user
+        ).select_related('company', 'reviewer')
+
+    def create(self, request, *args, **kwargs):
+        if not settings.REVIEW_WRITE_BEHIND:
+            return super().create(request, *args, **kwargs)
+        # journaled for drain_review_journal to write, so the response doesn't wait on the database
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        receipt = get_review_journal().append(request.user.pk, self._get_client_ip(), serializer.validated_data)
+        url = reverse('review_receipt', kwargs={'receipt': receipt}, request=request)
+        return Response(
+            {'receipt': receipt, 'status': 'pending', 'url': url},
+            status=status.HTTP_202_ACCEPTED, headers={'Location': url}
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Answer conditional requests from the user's review list version stamp
+        and the version stamps of the companies listed in the page, and serve
+        rendered pages from the cache, without reading reviews.
+        """
+        if 'since' in request.query_params:
+            # not cached, the changes returned grow with time without a new version
+            return self._sync(request)
+        if is_process_local(settings.REVIEW_LIST_CACHE):
+            # other processes' writes wouldn't change this process' stamps
+            return self._list_values()[0]
+        version = get_review_list_version(request.user.pk)
+        page = md5('{}:{}:{}'.format(
+            version[0], request.get_full_path(), request.accepted_renderer.format
+        ).encode()).hexdigest()
+
+        companies = get_review_list_page(page)
+        if companies is None:
+            # the companies are only known once the page is read
+            return self._first_list(request, page, version)
+        etag, last_modified = self._page_validators(page, version, get_company_versions(companies)[1])
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is None:
+            response = self._cached_list(etag)
+        return self._add_validators(response, etag, last_modified)
+
+    def _first_list(self, request, page, version):
+        companies_version = get_companies_version()
+        response, rows = self._list_values()
+        fields = self.get_fields()
+        companies = sorted({row['company_id'] for row in rows}) if fields is None or 'company' in fields else []
+        set_review_list_page(page, companies)
+        current_version, company_versions = get_company_versions(companies)
+        if current_version != companies_version:
+            # a company changed while the page was read, its stamp may be newer than the page
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        etag, last_modified = self._page_validators(page, version, company_versions)
+        response.add_post_render_callback(self._cache_rendered(etag))
+        return self._add_validators(response, etag, last_modified)
+
+    def _page_validators(self, page, version, company_versions):
+        versions = [version] + company_versions
+        etag = md5(':'.join([page] + [token for token, changed_at in versions]).encode()).hexdigest()
+        return etag, max(changed_at for token, changed_at in versions)
+
+    def _add_validators(self, response, etag, last_modified):
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def _cached_list(self, etag):
+        cached = review_list_cache().get(REVIEW_LIST_BODY_KEY.format(etag))
+        if cached is not None:
+            content_type, content = cached
+            return HttpResponse(content, content_type=content_type)
+        response = self._list_values()[0]
+        response.add_post_render_callback(self._cache_rendered(etag))
+        return response
+
+    def _cache_rendered(self, etag):
+        def cache_rendered(response):
+            if response.status_code == 200:
+                review_list_cache().set(
+                    REVIEW_LIST_BODY_KEY.format(etag), (response['Content-Type'], response.content),
+                    settings.REVIEW_LIST_CACHE_TIMEOUT
+                )
+        return cache_rendered
+
+    def _list_values(self):
+        # Serializes .values() rows, several times faster than ReviewSerializer
+        serializer = self.get_values_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.get_values(), 'company_id')
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serializer.to_representations(page)), page
+
+    def _sync(self, request):
+        """Reviews changed and deleted since the `since` watermark, empty to start over."""
+        serializer = self.get_values_serializer()
+        since = decode_watermark(request.query_params['since'])
+        rows, deleted, watermark, more = changes_since(
+            self.get_queryset().annotate(
+                # reviews are synced with their company
+                changed_at=Greatest('updated_at', 'company__updated_at')
+            ).values(*serializer.get_values(), 'changed_at'),
+            ReviewTombstone.objects.filter(reviewer_id=request.user.pk),
+            since, self.paginator.get_page_size(request)
+        )
+        results = [
+            OrderedDict([('id', row['id'])] + list(data.items()))
+            for row, data in zip(rows, serializer.to_representations(rows))
+        ]
+        return Response(OrderedDict([
+            ('results', results),
+            ('deleted', deleted),
+            ('watermark', watermark),
+            ('more', more),
+        ]))
+
+
+class ReviewSearchView(ReadYourWritesMixin, SparseFieldsMixin, ListAPIView):
+    """Full-text search over the title and summary of the user's reviews."""
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = ReviewSerializer
+    pagination_class = ReviewSearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': [_('This field is required.')]})
+        only = self.get_values_serializer().get_values() if self.get_fields() is not None else None
+        return ReviewSearch(self.request.user, query, using=router.db_for_read(Review), only=only)
+
+
+class ReviewBatchCreateView(IdempotentCreateMixin, ReviewerMixin, CreateAPIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = ReviewSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
+
+class ReviewExportView(ReadYourWritesMixin, ArchivedReviewsMixin, APIView):
+    """
+    Stream every review of the user as NDJSON, reading them from a server-side
+    cursor so memory use doesn't depend on how many reviews there are.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    # the reviews are only streamed as NDJSON, other Accept types get a 406
+    renderer_classes = (NDJSONRenderer,)
+    chunk_size = 2000
+    lines_per_write = 100
+
+    def get(self, request, *args, **kwargs):
+        reviews = Review.objects.filter(
+            reviewer=request.user
+        ).order_by('id').values(*self.get_values_serializer().get_values())
+        rows = reviews.iterator(chunk_size=self.chunk_size)
+        archived = self.get_archived_queryset()
+        if archived is not None:
+            rows = chain(archived.order_by('id').iterator(chunk_size=self.chunk_size), rows)
+        response = StreamingHttpResponse(
+            self._stream(rows),
+            content_type=NDJSONRenderer.media_type
+        )
+        response['Content-Disposition'] = 'attachment; filename="reviews.ndjson"'
+        return response
+
+    def _stream(self, reviews):
+        serializer = self.get_values_serializer()
+        renderer = NDJSONRenderer()
+        while True:
+            rows = serializer.to_representations(islice(reviews, self.lines_per_write))
+            if not rows:
+                return
+            yield renderer.render_lines(rows)
+
+
+class ReviewReceiptView(APIView):
+    """Status of a review submitted with write-behind ingestion."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        entry = get_review_journal().status(kwargs['receipt'])
+        if entry is None or entry.pop('reviewer_id') != request.user.pk:
+            raise NotFound()
+        return Response(entry)
+
+
+class CompanyCacheStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(company_cache.stats())
+
+
+class CompanyLookupView(APIView):
+    """Company typeahead, by name prefix or company_id, most reviewed first."""
+
+    permission_classes = (IsAuthenticated,)
+    limit_query_param = 'limit'
+    default_limit = 10
+    max_limit = 25
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': [_('This field is required.')]})
+        return Response({'results': lookup_companies(query, self.get_limit(request))})
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+
+class CompanyStatsView(ReadYourWritesMixin, RetrieveAPIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = CompanyStatsSerializer
+
+    def get_object(self):
+        company = get_object_or_404(Company.objects.select_related('stats'), company_id=self.kwargs['company_id'])
+        try:
+            return company.stats
+        except CompanyStats.DoesNotExist:
+            return CompanyStats(company=company)
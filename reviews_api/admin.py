@@ -0,0 +1,44 @@
+"""
+Admin helpers for the tables too large to count on every changelist load.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# reltuples of the table and of its partitions, -1 when not analyzed yet
+POSTGRES_ESTIMATED_COUNT = """
+    SELECT coalesce(sum(greatest(reltuples, 0)), 0)::bigint FROM pg_class
+    WHERE oid = %s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+"""
+
+
+def estimated_count(model, using='default'):
+    """Row count of the model's table from the planner statistics, None when unavailable."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRES_ESTIMATED_COUNT, [table, table])
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts unfiltered querysets from the table statistics
+    instead of a COUNT(*) scanning the whole table, once the table holds at
+    least `estimate_threshold` rows. Filtered querysets are counted exactly.
+    Use it with `show_full_result_count = False`, which skips the second,
+    unfiltered count of the changelist.
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where and not queryset.query.distinct:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
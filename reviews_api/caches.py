@@ -0,0 +1,27 @@
+"""
+Caches whose entries every process must see: version stamps and the rest of
+what one process writes for the others to read. A LocMemCache is separate in
+every gunicorn worker and management command, so they can't use one.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+# settings naming the cache alias of something shared between processes
+SHARED_CACHE_SETTINGS = ('REVIEW_LIST_CACHE', 'AUTH_USER_CACHE', 'DATABASE_REPLICA_PIN_CACHE')
+
+
+def is_process_local(alias):
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [
+        Warning(
+            '{} is the process-local cache {!r}.'.format(name, getattr(settings, name)),
+            hint='Point it to a cache shared by all the processes, in production by setting SHARED_CACHE_URL.',
+            id='reviews_api.W001',
+        )
+        for name in SHARED_CACHE_SETTINGS if is_process_local(getattr(settings, name))
+    ]
@@ -0,0 +1,222 @@
+"""
+Per-view request metrics, exposed in the Prometheus text format.
+
+Every thread records into its own histograms, so requests never contend on a
+lock. The scrape adds up the histograms of all threads. Per request, only a
+few numbers are written into preallocated state of the thread. The histograms
+of threads that ended are folded into one set when a thread starts or on the
+next scrape, so thread churn doesn't grow the registry.
+
+Metrics are per process: each server worker counts the requests it served.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.db import connections
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# name, help, buckets
+METRICS = (
+    ('request_duration_seconds', 'Wall time of the request', SECONDS_BUCKETS),
+    ('db_queries', 'Database queries run by the request', QUERIES_BUCKETS),
+    ('db_duration_seconds', 'Time spent running database queries', SECONDS_BUCKETS),
+    ('serialization_duration_seconds', 'Time spent serializing the response data', SECONDS_BUCKETS),
+    ('render_duration_seconds', 'Time spent rendering the response content', SECONDS_BUCKETS),
+    ('response_size_bytes', 'Size of the response content, streamed responses excluded', BYTES_BUCKETS),
+)
+PREFIX = 'reviews_api_'
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # the last count is of the values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestState:
+    """Measures of the request being served by a thread, reused by its next requests."""
+
+    __slots__ = ('active', 'db_queries', 'db_seconds', 'serialization_seconds', 'render_seconds', 'render_started')
+
+    def __init__(self):
+        self.active = False
+        self.reset()
+
+    def reset(self):
+        self.db_queries = 0
+        self.db_seconds = self.serialization_seconds = self.render_seconds = 0.0
+        self.render_started = None
+
+    def execute(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += perf_counter() - started
+            self.db_queries += 1
+
+    def rendered(self, response):
+        if self.render_started is not None:
+            self.render_seconds += perf_counter() - self.render_started
+
+
+class ThreadMetrics(threading.local):
+
+    def __init__(self):
+        self.request = RequestState()
+        self.views = {}
+        with _registry_lock:
+            _retire_ended_threads()
+            _registry.append((threading.current_thread(), self.views))
+
+
+# (thread, views) of the threads that recorded, and the views of the ones that ended
+_registry = []
+_retired = {}
+_registry_lock = threading.Lock()
+
+
+def _retire_ended_threads():
+    for thread, views in [entry for entry in _registry if not entry[0].is_alive()]:
+        _add(_retired, views)
+        _registry.remove((thread, views))
+
+
+def _add(total_views, views):
+    for view, histograms in list(views.items()):
+        total = total_views.get(view)
+        if total is None:
+            total = total_views[view] = [Histogram(buckets) for _name, _help, buckets in METRICS]
+        for into, histogram in zip(total, histograms):
+            into.counts = [a + b for a, b in zip(into.counts, histogram.counts)]
+            into.sum += histogram.sum
+            into.count += histogram.count
+
+
+_local = ThreadMetrics()
+
+
+def record(view, duration, request):
+    histograms = _local.views.get(view)
+    if histograms is None:
+        histograms = _local.views[view] = [Histogram(buckets) for _name, _help, buckets in METRICS]
+    histograms[0].observe(duration)
+    histograms[1].observe(request.db_queries)
+    histograms[2].observe(request.db_seconds)
+    histograms[3].observe(request.serialization_seconds)
+    histograms[4].observe(request.render_seconds)
+
+
+def record_size(view, size):
+    _local.views[view][5].observe(size)
+
+
+@contextmanager
+def measure_serialization():
+    """Count the time spent in the block as serialization of the current request."""
+    request = _local.request
+    if not request.active:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        request.serialization_seconds += perf_counter() - started
+
+
+def merged():
+    """Return the histograms of each view, added up across threads."""
+    views = {}
+    with _registry_lock:
+        _retire_ended_threads()
+        _add(views, _retired)
+        registry = [thread_views for _thread, thread_views in _registry]
+    for thread_views in registry:
+        _add(views, thread_views)
+    return views
+
+
+def render_prometheus(gauges=()):
+    """
+    Render the histograms, and the given (name, help, type, value) metrics,
+    in the Prometheus text exposition format.
+    """
+    views = merged()
+    lines = []
+    for index, (name, help_text, buckets) in enumerate(METRICS):
+        name = PREFIX + name
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} histogram'.format(name))
+        for view in sorted(views):
+            histogram = views[view][index]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append('{}_bucket{{view="{}",le="{}"}} {}'.format(name, view, bound, cumulative))
+            lines.append('{}_sum{{view="{}"}} {}'.format(name, view, histogram.sum))
+            lines.append('{}_count{{view="{}"}} {}'.format(name, view, histogram.count))
+    for name, help_text, metric_type, value in gauges:
+        lines.append('# HELP {}{} {}'.format(PREFIX, name, help_text))
+        lines.append('# TYPE {}{} {}'.format(PREFIX, name, metric_type))
+        lines.append('{}{} {}'.format(PREFIX, name, value))
+    return '\n'.join(lines) + '\n'
+
+
+class SerializationMetricsMixin:
+    """Count the time spent getting `serializer.data` as serialization time."""
+
+    @property
+    def data(self):
+        with measure_serialization():
+            return super().data
+
+
+class MetricsMiddleware:
+    """Record the wall, database, serialization and render time and the size of each response."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _local.request
+        state.reset()
+        state.active = True
+        # what connection.execute_wrapper() does, for every database
+        databases = connections.all()
+        for connection in databases:
+            connection.execute_wrappers.append(state.execute)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            state.active = False
+            for connection in databases:
+                connection.execute_wrappers.remove(state.execute)
+        view = getattr(request.resolver_match, 'url_name', None) or 'unmatched'
+        record(view, perf_counter() - started, state)
+        if not response.streaming:
+            record_size(view, len(response.content))
+        return response
+
+    def process_template_response(self, request, response):
+        # called right before the response is rendered
+        state = _local.request
+        state.render_started = perf_counter()
+        response.add_post_render_callback(state.rendered)
+        return response
@@ -0,0 +1,79 @@
+"""
+Routing of reads to read replicas.
+
+Writes, and reads inside a transaction, go to the primary (`default`)
+database; other reads go to one of DATABASE_REPLICAS. A user who just wrote
+is pinned to the primary for DATABASE_REPLICA_PIN_SECONDS, which should cover
+the replication lag, so they always read their own writes.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = 'db-pin:{}'
+
+_state = threading.local()
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or getattr(_state, 'primary', False) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pin_to_primary(user_id):
+    """Read from the primary for the rest of the request, and in the user's next requests."""
+    _state.primary = True
+    if settings.DATABASE_REPLICAS:
+        _pin_cache().set(PIN_KEY.format(user_id), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def read_from_primary_if_pinned(user_id):
+    _state.primary = bool(settings.DATABASE_REPLICAS) and _pin_cache().get(PIN_KEY.format(user_id), False)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, for reads that decide what to write."""
+    previous = getattr(_state, 'primary', False)
+    _state.primary = True
+    try:
+        yield
+    finally:
+        _state.primary = previous
+
+
+def reset_routing():
+    _state.primary = False
+
+
+def _pin_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE]
+
+
+class ReplicaRoutingMiddleware:
+    """Forget the pinning of the previous request served by the thread."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_routing()
+        return self.get_response(request)
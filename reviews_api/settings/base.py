@@ -1,6 +1,7 @@
 import environ
 import os
 import raven
+import tempfile
 
 root = environ.Path(__file__) - 3
 env = environ.Env(
@@ -42,7 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its times cover the other middleware too
+    'reviews_api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'reviews_api.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +86,27 @@ DATABASES = {
     }
 }
 
+# Aliases of the read replicas of the default database, and the cache and seconds a user
+# who wrote is kept reading from the primary. The user's next request may be served by another
+# process, so the cache must be shared by all of them.
+DATABASE_ROUTERS = ['reviews_api.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PIN_CACHE = 'default'
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -112,6 +137,10 @@ USE_TZ = True
 
 AUTH_USER_MODEL = 'authentication.User'
 
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.PooledPasswordBackend',
+]
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.0/howto/static-files/
@@ -121,7 +150,7 @@ STATIC_URL = '/static/'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'authentication.authentication.CachedJSONWebTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication'
     ),
@@ -142,3 +171,53 @@ REST_FRAMEWORK = {
 RAVEN_CONFIG = {
     'dsn': '',
 }
+
+# Max reviews accepted by one request to the batch endpoint
+REVIEW_BATCH_MAX_SIZE = 5000
+
+# In-process LRU of companies used to skip reading and writing the company row on review submission
+REVIEW_COMPANY_CACHE_SIZE = 10000
+REVIEW_COMPANY_CACHE_TTL = 300
+
+# Cache alias and timeout of the company typeahead results
+REVIEW_COMPANY_LOOKUP_CACHE = 'default'
+REVIEW_COMPANY_LOOKUP_CACHE_TIMEOUT = 60
+
+# Cache alias and timeout of the version stamps and rendered pages of the review list. Every process
+# writing reviews must see the same stamps, so ETags, 304s and cached pages are off with a process-local
+# cache, as this default one: the list is only cached where the 'shared' cache is set, in production
+# (SHARED_CACHE_URL) and the tests.
+REVIEW_LIST_CACHE = 'default'
+REVIEW_LIST_CACHE_TIMEOUT = 300
+
+# Journal review submissions and answer 202, for manage.py drain_review_journal to write them.
+# The journal is a local file, the web and worker processes must run on the same host.
+REVIEW_WRITE_BEHIND = env.bool('REVIEW_WRITE_BEHIND', default=False)
+REVIEW_JOURNAL_PATH = env('REVIEW_JOURNAL_PATH', default=root('review-journal.sqlite3'))
+# Seconds processed journal entries, and so their receipt status, are kept
+REVIEW_JOURNAL_RETENTION = 7 * 24 * 60 * 60
+
+# Seconds an Idempotency-Key of a review submission is remembered
+REVIEW_IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Months of reviews kept in review_review by manage.py archive_reviews, older ones are moved to the
+# archive table, and months of partitions created ahead on Postgres
+REVIEW_ARCHIVE_AFTER_MONTHS = 24
+REVIEW_PARTITIONS_AHEAD = 3
+
+# Seconds changes wait before being synced with ?since=, longer than a review write transaction, so a
+# change committed after a newer one isn't skipped. Seconds deletions are remembered for syncing.
+REVIEW_SYNC_DELAY = 5
+REVIEW_TOMBSTONE_RETENTION = 30 * 24 * 60 * 60
+
+# Cache alias of the verified JWT payloads and user snapshots, and the longest time they are kept.
+# Users are only cached in a cache shared by all processes, which must all see deactivations.
+AUTH_USER_CACHE = 'default'
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Passwords hashed at the same time on the host, by all its processes, for sign-in and login, the
+# directory of the lock files shared by the processes, and the seconds a request waits for a free slot
+# before getting a 503. With 0 slots hashing isn't limited.
+PASSWORD_HASHING_SLOTS = env.int('PASSWORD_HASHING_SLOTS', default=2)
+PASSWORD_HASHING_LOCK_DIR = env('PASSWORD_HASHING_LOCK_DIR', default=tempfile.gettempdir())
+PASSWORD_HASHING_WAIT = env.float('PASSWORD_HASHING_WAIT', default=1.0)
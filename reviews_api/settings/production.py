@@ -10,6 +10,19 @@ ALLOWED_HOSTS = ['127.0.0.1', '.herokuapp.com']
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Comma separated urls of the read replicas
+for index, replica_url in enumerate(env.list('REPLICA_DATABASE_URLS', default=[])):
+    DATABASES['replica_{}'.format(index)] = dj_database_url.parse(replica_url, conn_max_age=500)
+    DATABASE_REPLICAS.append('replica_{}'.format(index))
+
+# Cache shared by the web and worker processes, memcache://host:11211. Until it is set the shared
+# cache is process-local: review list ETags and cached pages, cached users and replica pins are off,
+# which manage.py check --deploy warns about.
+CACHES['shared'] = env.cache('SHARED_CACHE_URL', default='locmemcache://')
+REVIEW_LIST_CACHE = 'shared'
+AUTH_USER_CACHE = 'shared'
+DATABASE_REPLICA_PIN_CACHE = 'shared'
+
 # Remove browsable API enabled in base
 REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
     'rest_framework.renderers.JSONRenderer',
@@ -17,7 +30,7 @@ REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
 )
 
 REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = (
-    'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+    'authentication.authentication.CachedJSONWebTokenAuthentication',
 )
 
 RAVEN_CONFIG = {
@@ -1,5 +1,7 @@
 from .base import *
 
+import tempfile
+
 TEST = True
 
 DATABASES = {
@@ -7,9 +9,24 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
     },
+    # stands in for a read replica in the database routing tests
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
 }
 
+# stands in for the shared cache of production, which the cross-process features need
+CACHES['shared'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'reviews-api-test-cache'),
+}
+REVIEW_LIST_CACHE = 'shared'
+AUTH_USER_CACHE = 'shared'
+DATABASE_REPLICA_PIN_CACHE = 'shared'
+
 REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
     'rest_framework.renderers.JSONRenderer',
     'rest_framework.renderers.MultiPartRenderer'
 )
+
@@ -0,0 +1,11 @@
+from .test import *
+
+import dj_database_url
+
+# the partitioning, triggers and upserts only run on Postgres
+DATABASES = {
+    'default': dj_database_url.config(default='postgres://postgres@localhost/reviews_api'),
+    'replica': dj_database_url.config(
+        'REPLICA_DATABASE_URL', default='postgres://postgres@localhost/reviews_api_replica'
+    ),
+}
@@ -1,21 +1,35 @@
 import random, string
+import threading
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from faker import Faker
 
 from model_mommy.recipe import Recipe, seq, foreign_key
 
+from rest_framework.reverse import reverse_lazy
 from rest_framework.test import APIClient
 
 from authentication.models import User
+from review.cache import company_cache
 from review.models import Company, Review
+from reviews_api import metrics
+from reviews_api.caches import SHARED_CACHE_SETTINGS, check_shared_caches
+from reviews_api.admin import EstimatedCountPaginator, estimated_count
+from reviews_api.routers import PrimaryReplicaRouter, reset_routing, use_primary
 
 
 class BaseTestCase(TestCase):
     auth_user = None
 
     def setUp(self):
+        # not only the caches already used, the file cache is kept between runs
+        for alias in settings.CACHES:
+            caches[alias].clear()
         self.client = APIClient()
         self.faker = Faker('pt_BR')
         self.init_recipes()
@@ -56,3 +70,162 @@ class BaseTestCase(TestCase):
 
 def generate_string_with_size(size):
     return ''.join(random.choice(string.ascii_lowercase) for x in range(size))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class DatabaseRoutingTestCase(TransactionTestCase):
+    """The replica is a separate database, so rows written to the primary only are 'not replicated yet'."""
+
+    multi_db = True
+    URL = reverse_lazy('reviews')
+
+    def setUp(self):
+        # not only the caches already used, the file cache is kept between runs
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        # filled on commit, which TransactionTestCase does
+        company_cache.clear()
+        self.addCleanup(company_cache.clear)
+        # the requests of other tests may have left the thread pinned
+        reset_routing()
+        self.user = User.objects.create_user('test@test.com', '1234qwert', first_name='Test')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.router = PrimaryReplicaRouter()
+
+    def _review_data(self):
+        return {
+            'rating': 5, 'title': 'Title', 'summary': 'Summary',
+            'company': {'name': 'Company', 'company_id': 1},
+        }
+
+    def _list(self, **params):
+        return self.client.get(self.URL, params).json()['results']
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEquals('replica', self.router.db_for_read(Review))
+        self.assertEquals('default', self.router.db_for_write(Review))
+
+    def test_reads_go_to_the_primary_without_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEquals('default', self.router.db_for_read(Review))
+
+    def test_reads_inside_a_transaction_go_to_the_primary(self):
+        with transaction.atomic():
+            self.assertEquals('default', self.router.db_for_read(Review))
+
+    def test_reads_go_to_the_primary_inside_use_primary(self):
+        with use_primary():
+            self.assertEquals('default', self.router.db_for_read(Review))
+        self.assertEquals('replica', self.router.db_for_read(Review))
+
+    def test_user_reads_their_own_review_after_posting_it(self):
+        self.assertEquals(201, self.client.post(self.URL, self._review_data(), format='json').status_code)
+        self.assertEquals(1, len(self._list()))
+        self.assertEquals(1, Review.objects.using('default').count())
+        self.assertEquals(0, Review.objects.using('replica').count())
+
+    def test_pinning_ends_with_the_window(self):
+        self.client.post(self.URL, self._review_data(), format='json')
+        with override_settings(DATABASE_REPLICA_PIN_SECONDS=0):
+            self.client.force_authenticate(User.objects.create_user('other@test.com', '1234qwert'))
+            self.client.post(self.URL, self._review_data(), format='json')
+        self.assertEquals(0, len(self._list()))
+        self.client.force_authenticate(self.user)
+        self.assertEquals(1, len(self._list(page_size=10)))
+
+    def test_other_users_arent_pinned(self):
+        self.client.post(self.URL, self._review_data(), format='json')
+        Review.objects.using('default').update(reviewer=User.objects.create_user('other@test.com', '1234qwert'))
+        self.client.force_authenticate(User.objects.get(email='other@test.com'))
+        self.assertEquals(0, len(self._list()))
+
+
+class MetricsTestCase(BaseTestCase):
+    URL = reverse_lazy('metrics')
+
+    def _histograms(self, view):
+        # name to (count, sum) of the view's histograms
+        histograms = metrics.merged().get(view, [])
+        return {name: (histogram.count, histogram.sum) for (name, _help, _buckets), histogram in zip(metrics.METRICS, histograms)}
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        self.assertEquals([2, 1, 1], histogram.counts)
+        self.assertEquals((4, 56.5), (histogram.count, histogram.sum))
+
+    def test_requests_are_recorded_per_view(self):
+        self.authenticate()
+        self._review_recipe.make()
+        before = self._histograms('reviews')
+        response = self.client.get(reverse_lazy('reviews'))
+        after = self._histograms('reviews')
+        self.assertEquals(before.get('request_duration_seconds', (0, 0))[0] + 1, after['request_duration_seconds'][0])
+        self.assertEquals(before.get('db_queries', (0, 0))[1] + 1, after['db_queries'][1])
+        self.assertEquals(before.get('response_size_bytes', (0, 0))[1] + len(response.content),
+                          after['response_size_bytes'][1])
+        for name in ('db_duration_seconds', 'serialization_duration_seconds', 'render_duration_seconds'):
+            self.assertGreater(after[name][1], before.get(name, (0, 0))[1])
+
+    def test_ended_threads_are_dropped_from_the_registry_keeping_their_counts(self):
+        def serve():
+            metrics.record('churn', 0.5, metrics.RequestState())
+
+        before = self._histograms('churn').get('request_duration_seconds', (0, 0))[0]
+        for _ in range(5):
+            thread = threading.Thread(target=serve)
+            thread.start()
+            thread.join()
+        self.assertEquals(before + 5, self._histograms('churn')['request_duration_seconds'][0])
+        self.assertTrue(all(thread.is_alive() for thread, _views in metrics._registry))
+
+    def test_unresolved_urls_are_recorded_together(self):
+        self.client.get('/missing')
+        self.assertIn('unmatched', metrics.merged())
+
+    def test_metrics_are_staff_only(self):
+        self.authenticate()
+        self.assertEquals(403, self.client.get(self.URL).status_code)
+
+    def test_metrics_in_prometheus_format(self):
+        self.client.post(reverse_lazy('user_login'), {'email': 'test@test.com', 'password': 'wrong'})
+        self.client.force_authenticate(self._user_recipe.make(is_staff=True))
+        response = self.client.get(self.URL)
+        self.assertEquals(200, response.status_code)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('# TYPE reviews_api_request_duration_seconds histogram', content)
+        self.assertIn('reviews_api_request_duration_seconds_bucket{view="user_login",le="+Inf"}', content)
+        self.assertIn('reviews_api_db_queries_count{view="user_login"}', content)
+        self.assertIn('reviews_api_company_cache_hits_total ', content)
+
+
+class EstimatedCountPaginatorTestCase(BaseTestCase):
+
+    def test_unfiltered_large_tables_are_estimated(self):
+        with mock.patch('reviews_api.admin.estimated_count', return_value=500000):
+            self.assertEquals(500000, EstimatedCountPaginator(User.objects.order_by('pk'), 10).count)
+
+    def test_small_tables_and_filtered_querysets_are_counted(self):
+        with mock.patch('reviews_api.admin.estimated_count', return_value=50):
+            self.assertEquals(1, EstimatedCountPaginator(User.objects.order_by('pk'), 10).count)
+        with mock.patch('reviews_api.admin.estimated_count', return_value=500000) as estimate:
+            self.assertEquals(1, EstimatedCountPaginator(User.objects.filter(is_active=True).order_by('pk'), 10).count)
+        estimate.assert_not_called()
+
+    def test_other_databases_are_counted(self):
+        self.assertIsNone(estimated_count(User))
+        self.assertEquals(1, EstimatedCountPaginator(User.objects.order_by('pk'), 10).count)
+
+
+class SharedCachesCheckTestCase(TestCase):
+
+    def test_process_local_caches_are_reported(self):
+        shared = {name: 'shared' for name in SHARED_CACHE_SETTINGS}
+        with override_settings(**shared):
+            self.assertEquals([], check_shared_caches(None))
+        for name in SHARED_CACHE_SETTINGS:
+            with override_settings(**dict(shared, **{name: 'default'})):
+                self.assertEquals(['reviews_api.W001'], [warning.id for warning in check_shared_caches(None)])
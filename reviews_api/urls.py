@@ -16,8 +16,11 @@ Including another URLconf
 from django.conf.urls import url, include
 from django.contrib import admin
 
+from .views import MetricsView
+
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'auth/', include('authentication.urls')),
     url(r'review/', include('review.urls')),
+    url(r'^metrics$', MetricsView.as_view(), name='metrics'),
 ]
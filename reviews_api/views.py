@@ -0,0 +1,25 @@
+from django.http import HttpResponse
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from review.cache import company_cache
+
+from .metrics import render_prometheus
+
+
+class MetricsView(APIView):
+    """Request metrics and company cache counters in the Prometheus text format."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        cache = company_cache.stats()
+        gauges = [
+            ('company_cache_hits_total', 'Company cache hits', 'counter', cache['hits']),
+            ('company_cache_misses_total', 'Company cache misses', 'counter', cache['misses']),
+            ('company_cache_evictions_total', 'Company cache evictions', 'counter', cache['evictions']),
+            ('company_cache_size', 'Companies in the company cache', 'gauge', cache['size']),
+            ('company_cache_maxsize', 'Size limit of the company cache', 'gauge', cache['maxsize']),
+        ]
+        return HttpResponse(render_prometheus(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')